@@ -0,0 +1,81 @@
+import threading
+import time
+from contextlib import contextmanager
+
+
+class AdmissionController:
+    """Bounds the number of rows being scored concurrently in this worker.
+
+    acquire(rows) admits a request when its rows fit under max_inflight_rows, waiting at most
+    max_wait seconds for capacity to free up; a request larger than the limit on its own is
+    admitted only when nothing else is in flight, so it can't starve. Callers that aren't
+    admitted answer immediately (degraded scores or 503 + Retry-After) instead of queueing
+    behind the model. Only sees concurrency inside one worker, so it needs a threaded worker
+    (gunicorn --threads / gthread) to have anything to shed. max_inflight_rows <= 0 disables it.
+    """
+
+    def __init__(self, max_inflight_rows=2048, max_wait=0.05):
+        self.max_inflight_rows = int(max_inflight_rows)
+        self.max_wait = float(max_wait)
+        self._cond = threading.Condition()
+        self.inflight_rows = 0
+        self.inflight_requests = 0
+        self.peak_inflight_rows = 0
+        self.admitted = 0
+        self.rejected = 0
+
+    @property
+    def enabled(self):
+        return self.max_inflight_rows > 0
+
+    def _fits(self, rows):
+        return self.inflight_rows == 0 or self.inflight_rows + rows <= self.max_inflight_rows
+
+    def acquire(self, rows, timeout=None) -> bool:
+        """Reserve capacity for rows; False if it didn't free up within timeout (default max_wait)."""
+        if not self.enabled:
+            return True
+        timeout = self.max_wait if timeout is None else timeout
+        deadline = time.monotonic() + timeout
+        with self._cond:
+            while not self._fits(rows):
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    self.rejected += 1
+                    return False
+                self._cond.wait(remaining)
+            self.inflight_rows += rows
+            self.inflight_requests += 1
+            self.peak_inflight_rows = max(self.peak_inflight_rows, self.inflight_rows)
+            self.admitted += 1
+            return True
+
+    def release(self, rows):
+        if not self.enabled:
+            return
+        with self._cond:
+            self.inflight_rows -= rows
+            self.inflight_requests -= 1
+            self._cond.notify_all()
+
+    @contextmanager
+    def admit(self, rows, timeout=None):
+        """Context manager yielding whether the rows were admitted; releases them on exit."""
+        ok = self.acquire(rows, timeout)
+        try:
+            yield ok
+        finally:
+            if ok:
+                self.release(rows)
+
+    def stats(self):
+        return {
+            'enabled': self.enabled,
+            'max_inflight_rows': self.max_inflight_rows,
+            'max_wait_ms': self.max_wait * 1000.0,
+            'inflight_rows': self.inflight_rows,
+            'inflight_requests': self.inflight_requests,
+            'peak_inflight_rows': self.peak_inflight_rows,
+            'admitted': self.admitted,
+            'rejected': self.rejected,
+        }
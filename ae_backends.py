@@ -0,0 +1,296 @@
+"""Autoencoder inference backends.
+
+The Keras backend is the model as trained. The NumPy backend runs the same dense stack as
+plain float32 matmuls from weights exported once with:
+
+    python ae_backends.py export [--model phishing_autoencoder_model.keras] [--out phishing_autoencoder_weights.npz]
+
+Export refuses to write the weights file unless the NumPy forward pass matches Keras.
+Reduced-precision variants of those weights (float16, or int8 with per-output-channel
+scales) are written by quantize_autoencoder.py and served with AE_BACKEND=numpy-float16 or
+AE_BACKEND=numpy-int8; they only make the weights file smaller, since kernels are expanded
+to float32 at load. All backends expose predict(x, verbose=0) so app.py can use them
+interchangeably.
+"""
+import argparse
+import os
+import sys
+
+import numpy as np
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_KERAS_PATH = os.path.join(HERE, "phishing_autoencoder_model.keras")
+DEFAULT_WEIGHTS_PATH = os.path.join(HERE, "phishing_autoencoder_weights.npz")
+QUANTIZED_PRECISIONS = ("float16", "int8")
+DEFAULT_QUANTIZED_PATHS = {p: os.path.join(HERE, f"phishing_autoencoder_{p}.npz") for p in QUANTIZED_PRECISIONS}
+
+
+def _relu(x):
+    return np.maximum(x, 0, out=x)
+
+
+def _sigmoid(x):
+    np.negative(x, out=x)
+    np.exp(x, out=x)
+    x += 1
+    return np.reciprocal(x, out=x)
+
+
+def _tanh(x):
+    return np.tanh(x, out=x)
+
+
+def _linear(x):
+    return x
+
+
+ACTIVATIONS = {"relu": _relu, "sigmoid": _sigmoid, "tanh": _tanh, "linear": _linear}
+
+
+def load_keras_model(model_path=DEFAULT_KERAS_PATH):
+    """Load the .keras autoencoder with Keras 3, falling back to tf.keras."""
+    try:
+        import keras  # Keras 3
+        os.environ.setdefault("KERAS_BACKEND", "tensorflow")
+        model = keras.models.load_model(model_path)
+        print("✅ Loaded autoencoder model with Keras 3.")
+    except Exception as e_k3:
+        print(f"⚠️ Keras 3 load failed, trying tf.keras: {e_k3}")
+        import tensorflow as tf
+        model = tf.keras.models.load_model(model_path)
+        print("✅ Loaded autoencoder model with tf.keras.")
+    return model
+
+
+class KerasAutoencoder:
+    backend = "keras"
+
+    def __init__(self, model):
+        self.model = model
+
+    @classmethod
+    def load(cls, model_path=DEFAULT_KERAS_PATH):
+        return cls(load_keras_model(model_path))
+
+    def predict(self, x, verbose=0):
+        return self.model.predict(x, verbose=verbose)
+
+
+class NumpyAutoencoder:
+    """Dense feed-forward autoencoder evaluated with NumPy (float32, batched)."""
+
+    backend = "numpy"
+
+    def __init__(self, layers):
+        # layers: list of (kernel[in, out], bias[out], activation name)
+        self.layers = []
+        for kernel, bias, activation in layers:
+            if activation not in ACTIVATIONS:
+                raise ValueError(f"Unsupported activation: {activation}")
+            self.layers.append((
+                np.ascontiguousarray(kernel, dtype=np.float32),
+                np.ascontiguousarray(bias, dtype=np.float32),
+                str(activation),
+            ))
+        if not self.layers:
+            raise ValueError("Autoencoder has no dense layers.")
+
+    @property
+    def input_dim(self):
+        return self.layers[0][0].shape[0]
+
+    @classmethod
+    def from_keras(cls, model):
+        """Extract the Dense layers of a Sequential/functional Keras model. Dropout/Input layers are skipped."""
+        layers = []
+        for layer in model.layers:
+            kind = type(layer).__name__
+            if kind in ("InputLayer", "Dropout"):
+                continue
+            if kind != "Dense":
+                raise ValueError(f"Unsupported layer for NumPy backend: {layer.name} ({kind})")
+            cfg = layer.get_config()
+            weights = layer.get_weights()
+            kernel = weights[0]
+            bias = weights[1] if cfg.get("use_bias", True) and len(weights) > 1 else np.zeros(kernel.shape[1], dtype=np.float32)
+            layers.append((kernel, bias, cfg.get("activation", "linear")))
+        return cls(layers)
+
+    def save(self, path):
+        arrays = {"activations": np.array([a for _, _, a in self.layers])}
+        for i, (kernel, bias, _) in enumerate(self.layers):
+            arrays[f"kernel_{i}"] = kernel
+            arrays[f"bias_{i}"] = bias
+        np.savez(path, **arrays)
+
+    @classmethod
+    def load(cls, path=DEFAULT_WEIGHTS_PATH):
+        with np.load(path, allow_pickle=False) as data:
+            activations = [str(a) for a in data["activations"]]
+            return cls([(data[f"kernel_{i}"], data[f"bias_{i}"], a) for i, a in enumerate(activations)])
+
+    def predict(self, x, verbose=0):
+        h = np.asarray(x, dtype=np.float32)
+        for kernel, bias, activation in self.layers:
+            h = h @ kernel
+            h += bias
+            h = ACTIVATIONS[activation](h)
+        return h
+
+
+def quantize_kernel(kernel, precision):
+    """Reduced-precision storage for a float32 kernel[in, out]: {"q": values[, "scale": per-column scales]}."""
+    kernel = np.asarray(kernel, dtype=np.float32)
+    if precision == "float16":
+        return {"q": kernel.astype(np.float16)}
+    if precision == "int8":
+        # Symmetric per-output-channel scales, as in TFLite's per-channel weight quantization
+        scale = np.max(np.abs(kernel), axis=0) / 127.0
+        scale[scale == 0] = 1.0
+        q = np.clip(np.rint(kernel / scale), -127, 127).astype(np.int8)
+        return {"q": q, "scale": scale.astype(np.float32)}
+    raise ValueError(f"Unsupported precision: {precision} (choose from {', '.join(QUANTIZED_PRECISIONS)})")
+
+
+def dequantize_kernel(q, scale=None):
+    kernel = np.asarray(q, dtype=np.float32)
+    return kernel * scale if scale is not None else kernel
+
+
+class QuantizedAutoencoder(NumpyAutoencoder):
+    """NumpyAutoencoder whose weights round-trip through float16 or int8 storage.
+
+    Kernels are expanded back to float32 once at load, so inference runs the same BLAS matmuls
+    (and the folded inference plan) as the float32 backend; biases stay float32. The saving is
+    in the stored artifact (stored_bytes()) only: resident memory and inference speed are those
+    of the float32 backend, plus the small stored copy kept for save().
+    """
+
+    def __init__(self, layers, precision, quantized=None):
+        super().__init__(layers)
+        self.precision = precision
+        self.backend = f"numpy-{precision}"
+        self._quantized = quantized  # per layer: quantize_kernel() output, kept for save()
+
+    @classmethod
+    def from_float(cls, model, precision):
+        quantized, layers = [], []
+        for kernel, bias, activation in model.layers:
+            qk = quantize_kernel(kernel, precision)
+            quantized.append(qk)
+            layers.append((dequantize_kernel(qk["q"], qk.get("scale")), bias, activation))
+        return cls(layers, precision, quantized)
+
+    def save(self, path):
+        arrays = {"activations": np.array([a for _, _, a in self.layers]), "precision": np.array(self.precision)}
+        for i, ((_, bias, _), qk) in enumerate(zip(self.layers, self._quantized)):
+            arrays[f"kernel_{i}"] = qk["q"]
+            if "scale" in qk:
+                arrays[f"kernel_scale_{i}"] = qk["scale"]
+            arrays[f"bias_{i}"] = bias
+        np.savez(path, **arrays)
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path, allow_pickle=False) as data:
+            precision = str(data["precision"])
+            activations = [str(a) for a in data["activations"]]
+            quantized, layers = [], []
+            for i, a in enumerate(activations):
+                qk = {"q": data[f"kernel_{i}"]}
+                if f"kernel_scale_{i}" in data:
+                    qk["scale"] = data[f"kernel_scale_{i}"]
+                quantized.append(qk)
+                layers.append((dequantize_kernel(qk["q"], qk.get("scale")), data[f"bias_{i}"], a))
+        return cls(layers, precision, quantized)
+
+    def stored_bytes(self):
+        return sum(qk["q"].nbytes + (qk["scale"].nbytes if "scale" in qk else 0) + bias.nbytes
+                   for (_, bias, _), qk in zip(self.layers, self._quantized))
+
+
+def backend_precision(backend):
+    """Weight precision an AE_BACKEND value serves: 'float32' for keras/numpy, else its suffix."""
+    backend = (backend or "keras").lower()
+    if backend in ("keras", "numpy"):
+        return "float32"
+    precision = backend.split("-", 1)[1] if backend.startswith("numpy-") else None
+    if precision not in QUANTIZED_PRECISIONS:
+        raise ValueError(f"Unknown AE_BACKEND: {backend}")
+    return precision
+
+
+def load_autoencoder(backend="keras", keras_path=DEFAULT_KERAS_PATH, weights_path=DEFAULT_WEIGHTS_PATH, quantized_path=None):
+    """Return an autoencoder for the requested backend ('keras', 'numpy', 'numpy-float16' or 'numpy-int8')."""
+    backend = (backend or "keras").lower()
+    if backend == "numpy":
+        model = NumpyAutoencoder.load(weights_path)
+        print(f"✅ Loaded autoencoder weights for the NumPy backend ({len(model.layers)} dense layers).")
+        return model
+    if backend.startswith("numpy-"):
+        precision = backend.split("-", 1)[1]
+        if precision not in QUANTIZED_PRECISIONS:
+            raise ValueError(f"Unknown AE_BACKEND: {backend}")
+        path = quantized_path or DEFAULT_QUANTIZED_PATHS[precision]
+        model = QuantizedAutoencoder.load(path)
+        if model.precision != precision:
+            raise ValueError(f"{path} holds {model.precision} weights, not {precision}")
+        print(f"✅ Loaded {precision} autoencoder weights from {os.path.basename(path)} ({model.stored_bytes()} bytes stored).")
+        return model
+    if backend != "keras":
+        raise ValueError(f"Unknown AE_BACKEND: {backend}")
+    return KerasAutoencoder.load(keras_path)
+
+
+def parity_inputs(input_dim, n=2048, seed=0):
+    """Synthetic scaled-feature rows covering typical and extreme magnitudes."""
+    rng = np.random.default_rng(seed)
+    x = rng.standard_normal((n, input_dim)).astype(np.float32)
+    x[n // 2:] *= rng.uniform(0, 25, size=(n - n // 2, 1)).astype(np.float32)
+    x[:16] = 0.0
+    return x
+
+
+def check_parity(reference, candidate, x, atol=1e-4, rtol=1e-4):
+    """Compare reconstructions and reconstruction errors of two backends on x. Returns a report dict."""
+    ref = np.asarray(reference.predict(x, verbose=0), dtype=np.float64)
+    cand = np.asarray(candidate.predict(x, verbose=0), dtype=np.float64)
+    ref_err = np.mean(np.square(x - ref), axis=1)
+    cand_err = np.mean(np.square(x - cand), axis=1)
+    rel_err_diff = np.abs(cand_err - ref_err) / np.maximum(np.abs(ref_err), 1e-12)
+    return {
+        "rows": int(x.shape[0]),
+        "max_abs_recon_diff": float(np.max(np.abs(ref - cand))),
+        "max_rel_error_diff": float(np.max(rel_err_diff)),
+        "ok": bool(np.allclose(cand, ref, atol=atol, rtol=rtol) and np.all(rel_err_diff <= rtol * 10)),
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Export/verify NumPy autoencoder weights.")
+    sub = parser.add_subparsers(dest="cmd", required=True)
+    for name in ("export", "verify"):
+        p = sub.add_parser(name)
+        p.add_argument("--model", default=DEFAULT_KERAS_PATH)
+        p.add_argument("--weights", default=DEFAULT_WEIGHTS_PATH)
+        p.add_argument("--rows", type=int, default=2048)
+    args = parser.parse_args(argv)
+
+    keras_ae = KerasAutoencoder.load(args.model)
+    if args.cmd == "export":
+        candidate = NumpyAutoencoder.from_keras(keras_ae.model)
+    else:
+        candidate = NumpyAutoencoder.load(args.weights)
+    report = check_parity(keras_ae, candidate, parity_inputs(candidate.input_dim, n=args.rows))
+    print(f"Parity vs Keras: {report}")
+    if not report["ok"]:
+        print("❌ NumPy backend does not match Keras output.")
+        return 1
+    if args.cmd == "export":
+        candidate.save(args.weights)
+        print(f"✅ Wrote {args.weights}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
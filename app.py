@@ -1,20 +1,40 @@
 import numpy as np
 import pandas as pd
 import pickle
-from flask import Flask, request, jsonify
+from flask import Flask, Response, g, request, jsonify, stream_with_context
 from flask_cors import CORS
-import tensorflow as tf
 import re
 from urllib.parse import urlparse, urlunparse, parse_qsl, urlencode
-import tldextract
+import hmac
 import json
+import logging
 import os
+import tempfile
+import threading
+import time
+import warnings
 from google.oauth2 import service_account
 from google.cloud import firestore
+from prediction_cache import PredictionCache
+from microbatch import MicroBatcher
+from ae_backends import backend_precision, load_autoencoder, NumpyAutoencoder
+import model_bundle
+from inference_plan import FoldedAutoencoderPlan
+from gnn_index import load_gnn_index
+from domain_parser import DomainParser, host_of
+from structural_graph import StructuralGraph, domain_node, user_node, post_edges
+from admission import AdmissionController
+from known_bad import KnownBadIndex
+from local_firestore import LocalFirestoreClient
+from firestore_writer import BatchedFirestoreWriter
+from metrics import Registry, Counter, Histogram, CallbackCounter, CallbackGauge, BATCH_SIZE_BUCKETS, CONTENT_TYPE
 
 # --- Define the base directory for model artifacts ---
 HERE = os.path.dirname(os.path.abspath(__file__))
 
+# Scoring passes plain feature matrices to the scaler, which was fitted on a named DataFrame
+warnings.filterwarnings("ignore", message="X does not have valid feature names")
+
 # --- Initialize App ---
 app = Flask(__name__)
 CORS(app, origins=["*"])  # Allow all origins for Chrome extension
@@ -24,93 +44,238 @@ PORT = int(os.environ.get("PORT", 8000))
 
 # --- Model Loading ---
 MODEL_LOAD_ERROR = None
+ae_backend = os.environ.get('AE_BACKEND', 'keras').lower()
+# Packaged bundle (model_bundle.py build); when present it replaces the loose artifacts. The
+# bundle's precision decides the autoencoder, so an explicit AE_BACKEND has to agree with it
+# (numpy: float32, numpy-float16/-int8: a bundle built with that --precision). An explicit
+# AE_BACKEND=keras wins over the bundle: the bundle has no Keras model, so the loose artifacts
+# are served instead. Startup logs which one was used.
+MODEL_BUNDLE_DIR = os.environ.get('MODEL_BUNDLE_DIR', os.path.join(HERE, 'model_bundle'))
+# Set by load_models(); request handlers read `models` once and only use that bundle
+models = None
+# Aliases of the live bundle's fields for scripts such as debug_recon.py
 autoencoder_model = None
 scaler = None
 autoencoder_threshold = None
 effective_autoencoder_threshold = None
-gnn_probs = None
-post_node_map = None
+gnn_index = None
+inference_plan = None
 models_last_loaded_at = None
 
+# URLs used to check a freshly loaded bundle before it goes live
+_PROBE_URLS = [
+    "https://bit.ly/fake-login-scam?fbclid=EXAMPLE",
+    "http://192.168.0.1/~user/a_b-c/index.php?id=1&x=%20#top",
+    "https://www.abs-cbn.com/news/regions/2025/8/20/flood-control-projects",
+]
 
-def load_models():
-    """Load model artifacts from disk and set global variables.
-    This can be called at startup or via the /reload_models endpoint.
-    """
-    global MODEL_LOAD_ERROR, autoencoder_model, scaler, autoencoder_threshold, effective_autoencoder_threshold, gnn_probs, post_node_map, models_last_loaded_at
-    MODEL_LOAD_ERROR = None
-    autoencoder_model = None
-    scaler = None
-    autoencoder_threshold = None
-    effective_autoencoder_threshold = None
-    gnn_probs = None
-    post_node_map = None
-    try:
-        # Load Autoencoder model (.keras)
-        model_path = os.path.join(HERE, "phishing_autoencoder_model.keras")
-        try:
-            import keras  # Keras 3
-            os.environ.setdefault("KERAS_BACKEND", "tensorflow")
-            autoencoder_model = keras.models.load_model(model_path)
-            print("✅ Loaded autoencoder model with Keras 3.")
-        except Exception as e_k3:
-            print(f"⚠️ Keras 3 load failed, trying tf.keras: {e_k3}")
-            autoencoder_model = tf.keras.models.load_model(model_path)
-            print("✅ Loaded autoencoder model with tf.keras.")
+
+class ModelBundle:
+    """One consistent set of loaded artifacts. Never mutated after it goes live."""
+
+    def __init__(self, autoencoder_model, scaler, autoencoder_threshold, effective_autoencoder_threshold,
+                 gnn_index, inference_plan, loaded_at, bundle_info=None):
+        self.autoencoder_model = autoencoder_model
+        self.scaler = scaler
+        self.autoencoder_threshold = autoencoder_threshold
+        self.effective_autoencoder_threshold = effective_autoencoder_threshold
+        self.gnn_index = gnn_index
+        self.inference_plan = inference_plan
+        self.loaded_at = loaded_at
+        self.bundle_info = bundle_info  # manifest summary when loaded from a packaged bundle
+        self._feature_builders = {}
+
+    @property
+    def threshold(self):
+        return self.effective_autoencoder_threshold if self.effective_autoencoder_threshold is not None else self.autoencoder_threshold
+
+    def feature_builder(self, dtype=np.float32):
+        builder = self._feature_builders.get(dtype)
+        if builder is None:
+            builder = self._feature_builders[dtype] = FeatureMatrixBuilder.for_scaler(self.scaler, dtype=dtype)
+        return builder
+
+
+def _load_bundle() -> ModelBundle:
+    """Load every artifact from disk into a new ModelBundle. Raises on any failure."""
+    packaged = None
+    use_bundle = bool(MODEL_BUNDLE_DIR) and os.path.exists(os.path.join(MODEL_BUNDLE_DIR, model_bundle.MANIFEST))
+    if use_bundle and 'AE_BACKEND' in os.environ and ae_backend == 'keras':
+        print(f"⚠️ AE_BACKEND=keras is set: serving the loose Keras artifacts, not the model bundle in {MODEL_BUNDLE_DIR}.")
+        use_bundle = False
+    if use_bundle:
+        # One directory of mmap'd arrays, hash-checked against its manifest; no pickle involved
+        packaged = model_bundle.load(MODEL_BUNDLE_DIR, check_hashes=os.environ.get('MODEL_BUNDLE_VERIFY', '1') != '0')
+        precision = packaged.info()['precision']
+        if 'AE_BACKEND' in os.environ and backend_precision(ae_backend) != precision:
+            raise RuntimeError(
+                f"AE_BACKEND={ae_backend} asks for {backend_precision(ae_backend)} weights but the bundle in "
+                f"{MODEL_BUNDLE_DIR} is {precision}; rebuild it with model_bundle.py build --precision "
+                f"{backend_precision(ae_backend)}, unset AE_BACKEND, or set MODEL_BUNDLE_DIR= to serve the loose artifacts")
+        ae, sc, threshold, gnn = packaged.autoencoder, packaged.scaler, packaged.autoencoder_threshold, packaged.gnn_index
+        info = packaged.info()
+        print(f"✅ Loaded model bundle {info['version']} ({info['content_hash'][:12]}, {info['precision']}) from {MODEL_BUNDLE_DIR}; "
+              f"serving it with the numpy{'' if info['precision'] == 'float32' else '-' + info['precision']} backend.")
+    else:
+        # Load Autoencoder: Keras model (.keras) or its exported dense weights (.npz) for the
+        # TensorFlow-free NumPy backend, selected with AE_BACKEND=keras|numpy. numpy-float16 and
+        # numpy-int8 serve the reduced-precision weights written by quantize_autoencoder.py.
+        ae = load_autoencoder(
+            ae_backend,
+            keras_path=os.path.join(HERE, "phishing_autoencoder_model.keras"),
+            weights_path=os.path.join(HERE, "phishing_autoencoder_weights.npz"),
+            quantized_path=os.environ.get('AE_QUANTIZED_PATH') or None,
+        )
 
         # Load Scaler (try scaler.pkl then scaler_final.pkl)
+        sc = None
         for sp in [os.path.join(HERE, "scaler.pkl"), os.path.join(HERE, "scaler_final.pkl")]:
             if os.path.exists(sp):
                 with open(sp, "rb") as f:
-                    scaler = pickle.load(f)
+                    sc = pickle.load(f)
                     print(f"✅ Loaded scaler from {sp}.")
                     break
-        if scaler is None:
+        if sc is None:
             raise RuntimeError("Scaler file not found.")
 
         # Load Threshold
         threshold_path = os.path.join(HERE, "autoencoder_threshold.txt")
         if os.path.exists(threshold_path):
             with open(threshold_path, "r") as f:
-                autoencoder_threshold = float(f.read())
+                threshold = float(f.read())
             print("✅ Loaded autoencoder threshold.")
         else:
             raise RuntimeError("autoencoder_threshold.txt missing.")
 
-        # Apply optional multiplier from env var
-        try:
-            multiplier = float(os.environ.get('AE_THRESHOLD_MULTIPLIER', '1.0'))
-        except Exception:
-            multiplier = 1.0
-        effective_autoencoder_threshold = float(autoencoder_threshold * multiplier)
-        print(f"Effective AE threshold set to {effective_autoencoder_threshold} (multiplier={multiplier})")
-
-        # Load GNN artifacts if present
-        gnn_probs_path = os.path.join(HERE, "gnn_probs.npy")
-        post_node_map_path = os.path.join(HERE, "post_node_map.json")
-        if os.path.exists(gnn_probs_path) and os.path.exists(post_node_map_path):
-            gnn_probs = np.load(gnn_probs_path)
-            with open(post_node_map_path, "r") as f:
-                post_node_map = json.load(f)
-            print("✅ Loaded real-graph GCN artifacts.")
+        # Load GNN artifacts if present (mmap index; built in memory from post_node_map.json/gnn_probs.npy if missing)
+        gnn = load_gnn_index(HERE)
+        if gnn is not None:
+            print(f"✅ Loaded real-graph GCN artifacts ({len(gnn)} posts).")
         else:
             print("⚠️ GNN artifacts not found, continuing without them.")
 
-        models_last_loaded_at = __import__('datetime').datetime.utcnow().isoformat() + 'Z'
+    # Apply optional multiplier from env var
+    try:
+        multiplier = float(os.environ.get('AE_THRESHOLD_MULTIPLIER', '1.0'))
+    except Exception:
+        multiplier = 1.0
+    effective_threshold = float(threshold * multiplier)
+    print(f"Effective AE threshold set to {effective_threshold} (multiplier={multiplier})")
 
-    except Exception as e:
-        MODEL_LOAD_ERROR = str(e)
-        print(f"❌ Error loading models: {e}")
+    # Fold the scaler and the constant (mean-filled) feature columns into the first layer
+    plan = None
+    if isinstance(ae, NumpyAutoencoder) and os.environ.get('AE_FOLD_SCALER', '1') != '0':
+        plan = _build_inference_plan(sc, ae)
 
+    loaded_at = __import__('datetime').datetime.utcnow().isoformat() + 'Z'
+    return ModelBundle(ae, sc, threshold, effective_threshold, gnn, plan, loaded_at,
+                       bundle_info=packaged.info() if packaged is not None else None)
+
+
+def _warm_up(bundle: ModelBundle):
+    """Run a real inference through the bundle; raises if it fails or produces non-finite scores."""
+    errors, content_scores = score_content(_PROBE_URLS, bundle=bundle, use_cache=False)
+    if not (np.all(np.isfinite(errors)) and np.all(np.isfinite(content_scores))):
+        raise RuntimeError(f"Warm-up produced non-finite reconstruction errors: {errors.tolist()}")
+    if bundle.gnn_index is not None:
+        bundle.gnn_index.lookup(["warm-up"])
+
+
+def _install(bundle: ModelBundle):
+    global models, autoencoder_model, scaler, autoencoder_threshold, effective_autoencoder_threshold, gnn_index, inference_plan, models_last_loaded_at
+    models = bundle  # the atomic swap; everything below is for the module-level aliases
+    autoencoder_model = bundle.autoencoder_model
+    scaler = bundle.scaler
+    autoencoder_threshold = bundle.autoencoder_threshold
+    effective_autoencoder_threshold = bundle.effective_autoencoder_threshold
+    gnn_index = bundle.gnn_index
+    inference_plan = bundle.inference_plan
+    models_last_loaded_at = bundle.loaded_at
+    if structural_graph is not None:
+        structural_graph.set_prob_lookup(_gnn_prob_lookup(bundle))
+
+
+_reload_lock = threading.Lock()
+
+
+def load_models():
+    """Load, warm up and atomically install a new model bundle.
+    This can be called at startup, via the /reload_models endpoint, or by the generation watcher.
+    The previous bundle keeps serving until the new one has passed its warm-up inference; if
+    loading fails it stays live and MODEL_LOAD_ERROR describes the failure.
+    """
+    global MODEL_LOAD_ERROR
+    with _reload_lock:
+        try:
+            bundle = _load_bundle()
+            _warm_up(bundle)
+        except Exception as e:
+            MODEL_LOAD_ERROR = str(e)
+            print(f"❌ Error loading models: {e}")
+            return False
+        _install(bundle)
+        MODEL_LOAD_ERROR = None
+        return True
+
+
+# --- Cross-worker reload ---
+# /reload_models reloads the worker that serves it and then replaces this marker file; every
+# other worker notices the new marker (checked at most every MODEL_RELOAD_POLL_SECONDS) and
+# reloads in a background thread while its current bundle keeps serving.
+MODEL_GENERATION_FILE = os.environ.get('MODEL_GENERATION_FILE', os.path.join(tempfile.gettempdir(), 'dakugumen-model-generation'))
+MODEL_RELOAD_POLL_SECONDS = float(os.environ.get('MODEL_RELOAD_POLL_SECONDS', '2'))
+_generation_seen = None
+_generation_checked_at = 0.0
+
+
+def _generation_stamp():
+    try:
+        st = os.stat(MODEL_GENERATION_FILE)
+    except OSError:
+        return None
+    return (st.st_ino, st.st_mtime_ns)
+
+
+def _publish_generation(token: str):
+    global _generation_seen
+    tmp = f"{MODEL_GENERATION_FILE}.{os.getpid()}.tmp"
+    try:
+        with open(tmp, "w") as f:
+            f.write(token)
+        os.replace(tmp, MODEL_GENERATION_FILE)
+        _generation_seen = _generation_stamp()
+    except OSError as e:
+        print(f"⚠️ Could not publish model generation marker: {e}")
+
+
+def _reload_in_background():
+    if load_models():
+        print(f"✅ Picked up new model generation ({models_last_loaded_at}).")
+
+
+@app.before_request
+def _check_model_generation():
+    global _generation_seen, _generation_checked_at
+    now = time.monotonic()
+    if now - _generation_checked_at < MODEL_RELOAD_POLL_SECONDS:
+        return
+    _generation_checked_at = now
+    stamp = _generation_stamp()
+    if stamp is not None and stamp != _generation_seen:
+        _generation_seen = stamp
+        threading.Thread(target=_reload_in_background, name="model-reload", daemon=True).start()
 
-# Load models at startup
-load_models()
 
 # --- Firestore Client ---
 fs_db = None
 try:
     google_creds = os.environ.get("GOOGLE_APPLICATION_CREDENTIALS_JSON")
-    if google_creds:
+    local_fs_dir = os.environ.get("LOCAL_FIRESTORE_DIR")
+    if local_fs_dir:
+        # File-backed stand-in for local development
+        fs_db = LocalFirestoreClient(local_fs_dir)
+        print(f"✅ Using local file-backed Firestore stand-in at {local_fs_dir}.")
+    elif google_creds:
         creds_info = json.loads(google_creds)
         creds = service_account.Credentials.from_service_account_info(creds_info)
         fs_db = firestore.Client(credentials=creds, project=creds_info["project_id"])
@@ -132,7 +297,40 @@ try:
 except Exception as ee:
     print(f"⚠️ Firestore init failed: {ee}")
 
-def _compute_lexical_subset(url: str) -> dict:
+# /report and /flag only enqueue; documents are committed in batches off the request path
+fs_writer = None
+if fs_db is not None:
+    fs_writer = BatchedFirestoreWriter(
+        fs_db,
+        spill_path=os.environ.get('FIRESTORE_SPILL_PATH', os.path.join(tempfile.gettempdir(), 'dakugumen-firestore-spill.jsonl')),
+        max_batch=int(os.environ.get('FIRESTORE_BATCH_SIZE', '200')),
+        flush_interval=float(os.environ.get('FIRESTORE_FLUSH_MS', '500')) / 1000.0,
+        max_queue=int(os.environ.get('FIRESTORE_QUEUE_SIZE', '10000')),
+        server_timestamp=firestore.SERVER_TIMESTAMP,
+        replay_interval=float(os.environ.get('FIRESTORE_REPLAY_SECONDS', '30')),
+        write_time_field='writtenAt',  # data_pipeline/export_feedback.py checkpoints on it
+    )
+
+# --- Lexical Features ---
+SHORTENERS = {"bit.ly","tinyurl.com","t.co","goo.gl","ow.ly","is.gd","cutt.ly","lnkd.in","buff.ly"}
+# Suffix rules come from the bundled public_suffix_list.dat snapshot; no network at startup
+domain_parser = DomainParser.from_snapshot(
+    shorteners=SHORTENERS,
+    memo_size=int(os.environ.get('DOMAIN_MEMO_SIZE', '65536')),
+)
+_IPV4_RE = re.compile(r"^\d+\.\d+\.\d+\.\d+$")
+# (feature name, character) pairs counted per URL segment as qty_<name>_<segment>
+_COUNTED_CHARS = [
+    ("dot", "."), ("hyphen", "-"), ("underline", "_"), ("slash", "/"), ("questionmark", "?"),
+    ("equal", "="), ("at", "@"), ("and", "&"), ("exclamation", "!"), ("space", " "),
+    ("tilde", "~"), ("comma", ","), ("plus", "+"), ("asterisk", "*"), ("hashtag", "#"),
+    ("dollar", "$"), ("percent", "%"),
+]
+# Only these characters are counted on the domain segment
+_DOMAIN_COUNTED_CHARS = ("dot", "hyphen", "underline")
+
+
+def _normalize_url(url: str) -> str:
     # Normalize URL: remove common tracking query params that can inflate lexical features
     try:
         raw = url or ""
@@ -143,85 +341,702 @@ def _compute_lexical_subset(url: str) -> dict:
             q_filtered = [(k, v) for k, v in q if not (k.lower() == 'fbclid' or k.lower().startswith('utm_'))]
             new_query = urlencode(q_filtered)
             p = p._replace(query=new_query)
-        u = urlunparse(p)
+        return urlunparse(p)
     except Exception:
-        u = url or ""
-    parts = tldextract.extract(u)
+        return url or ""
+
+
+def _split_url(u: str):
+    """Split a normalized URL into (domain, directory, file, url_shortened, domain_in_ip)."""
+    parts = domain_parser.parse(u)
     domain = ".".join([p for p in [parts.subdomain, parts.domain, parts.suffix] if p])
     path_q = u.split(domain, 1)[-1] if domain and domain in u else ""
-    shorteners = {"bit.ly","tinyurl.com","t.co","goo.gl","ow.ly","is.gd","cutt.ly","lnkd.in","buff.ly"}
-
-    feats = {
-        "qty_dot_url": u.count("."),
-        "qty_hyphen_url": u.count("-"),
-        "qty_underline_url": u.count("_"),
-        "qty_slash_url": u.count("/"),
-        "qty_questionmark_url": u.count("?"),
-        "qty_equal_url": u.count("="),
-        "qty_at_url": u.count("@"),
-        "qty_and_url": u.count("&"),
-        "qty_exclamation_url": u.count("!"),
-        "qty_space_url": u.count(" "),
-        "qty_tilde_url": u.count("~"),
-        "qty_comma_url": u.count(","),
-        "qty_plus_url": u.count("+"),
-        "qty_asterisk_url": u.count("*"),
-        "qty_hashtag_url": u.count("#"),
-        "qty_dollar_url": u.count("$"),
-        "qty_percent_url": u.count("%"),
-        "length_url": len(u),
-        "url_shortened": int((parts.domain + "." + (parts.suffix or "")).lower() in shorteners),
-        "qty_dot_domain": domain.count("."),
-        "qty_hyphen_domain": domain.count("-"),
-        "qty_underline_domain": domain.count("_"),
-        "domain_length": len(domain),
-        "domain_in_ip": int(bool(re.match(r"^\d+\.\d+\.\d+\.\d+$", domain))),
-    }
     # Directory/file breakdown approx
     directory = path_q.rsplit("/", 1)[0] if "/" in path_q else ""
     filepart = path_q.rsplit("/", 1)[-1] if "/" in path_q else path_q
+    shortened = parts.shortened
+    in_ip = int(bool(_IPV4_RE.match(domain)))
+    return domain, directory, filepart, shortened, in_ip
+
+
+def _compute_lexical_subset(url: str) -> dict:
+    u = _normalize_url(url)
+    domain, directory, filepart, shortened, in_ip = _split_url(u)
+
+    feats = {f"qty_{name}_url": u.count(ch) for name, ch in _COUNTED_CHARS}
+    feats["length_url"] = len(u)
+    feats["url_shortened"] = shortened
+    for name, ch in _COUNTED_CHARS:
+        if name in _DOMAIN_COUNTED_CHARS:
+            feats[f"qty_{name}_domain"] = domain.count(ch)
+    feats["domain_length"] = len(domain)
+    feats["domain_in_ip"] = in_ip
     for prefix, s in [("directory", directory), ("file", filepart)]:
-        feats[f"qty_dot_{prefix}"] = s.count(".")
-        feats[f"qty_hyphen_{prefix}"] = s.count("-")
-        feats[f"qty_underline_{prefix}"] = s.count("_")
-        feats[f"qty_slash_{prefix}"] = s.count("/")
-        feats[f"qty_questionmark_{prefix}"] = s.count("?")
-        feats[f"qty_equal_{prefix}"] = s.count("=")
-        feats[f"qty_at_{prefix}"] = s.count("@")
-        feats[f"qty_and_{prefix}"] = s.count("&")
-        feats[f"qty_exclamation_{prefix}"] = s.count("!")
-        feats[f"qty_space_{prefix}"] = s.count(" ")
-        feats[f"qty_tilde_{prefix}"] = s.count("~")
-        feats[f"qty_comma_{prefix}"] = s.count(",")
-        feats[f"qty_plus_{prefix}"] = s.count("+")
-        feats[f"qty_asterisk_{prefix}"] = s.count("*")
-        feats[f"qty_hashtag_{prefix}"] = s.count("#")
-        feats[f"qty_dollar_{prefix}"] = s.count("$")
-        feats[f"qty_percent_{prefix}"] = s.count("%")
+        for name, ch in _COUNTED_CHARS:
+            feats[f"qty_{name}_{prefix}"] = s.count(ch)
         feats[f"{prefix}_length"] = len(s)
     return feats
 
+
+class FeatureMatrixBuilder:
+    """Builds the scaler-ordered feature matrix for a batch of URLs without per-URL dicts.
+
+    Column positions are resolved once at construction. For each batch, the URL, domain,
+    directory and file segments of every URL are concatenated into one byte buffer and all
+    character counts come out of a single np.bincount. Values are identical to the per-URL
+    _compute_lexical_subset dicts (counted characters are ASCII, so UTF-8 byte counts equal str.count).
+    """
+
+    SEGMENTS = ("url", "domain", "directory", "file")
+    EXTRAS = ("length_url", "domain_length", "directory_length", "file_length", "url_shortened", "domain_in_ip")
+
+    def __init__(self, columns, base_values, dtype=np.float32):
+        self.columns = list(columns)
+        self.dtype = dtype
+        self.base_row = np.asarray(base_values, dtype=dtype).reshape(-1)[:len(self.columns)]
+
+        # Map every byte to its slot in _COUNTED_CHARS; anything else lands in a trailing "other" slot
+        self._n_slots = len(_COUNTED_CHARS) + 1
+        self._byte_slot = np.full(256, len(_COUNTED_CHARS), dtype=np.intp)
+        for c, (_, ch) in enumerate(_COUNTED_CHARS):
+            self._byte_slot[ord(ch)] = c
+
+        col_pos = {col: i for i, col in enumerate(self.columns)}
+        dst, src = [], []
+        for k, seg in enumerate(self.SEGMENTS):
+            for c, (name, _) in enumerate(_COUNTED_CHARS):
+                if seg == "domain" and name not in _DOMAIN_COUNTED_CHARS:
+                    continue
+                pos = col_pos.get(f"qty_{name}_{seg}")
+                if pos is not None:
+                    dst.append(pos)
+                    src.append(k * self._n_slots + c)
+        n_counts = len(self.SEGMENTS) * self._n_slots
+        for j, name in enumerate(self.EXTRAS):
+            pos = col_pos.get(name)
+            if pos is not None:
+                dst.append(pos)
+                src.append(n_counts + j)
+        self._dst = np.array(dst, dtype=np.intp)
+        self._src = np.array(src, dtype=np.intp)
+
+    @classmethod
+    def for_scaler(cls, scaler_obj, dtype=np.float32):
+        cols = list(getattr(scaler_obj, 'feature_names_in_', []))
+        if not cols:
+            # Fallback to 111 dims
+            cols = [f"f{i}" for i in range(111)]
+        return cls(cols, getattr(scaler_obj, 'mean_', np.zeros(len(cols))), dtype=dtype)
+
+    @property
+    def active_columns(self) -> np.ndarray:
+        """Column positions that are computed from the URL; all others always hold base_row."""
+        return self._dst
+
+    def transform(self, urls, normalized=False, active_only=False) -> np.ndarray:
+        """Return the feature matrix for urls.
+
+        Pass normalized=True if urls already went through _normalize_url. With active_only=True
+        only the active_columns are returned, in that order.
+        """
+        n = len(urls)
+        if active_only:
+            out = np.empty((n, self._dst.size), dtype=self.dtype)
+        else:
+            out = np.empty((n, len(self.columns)), dtype=self.dtype)
+            out[:] = self.base_row
+        if n == 0 or self._dst.size == 0:
+            return out
+
+        chunks = []
+        extras = np.empty((n, len(self.EXTRAS)), dtype=np.float64)
+        for i, url in enumerate(urls):
+            u = url if normalized else _normalize_url(url)
+            domain, directory, filepart, shortened, in_ip = _split_url(u)
+            chunks += (u, domain, directory, filepart)
+            extras[i] = (len(u), len(domain), len(directory), len(filepart), shortened, in_ip)
+
+        encoded = [s.encode("utf-8", "surrogatepass") for s in chunks]
+        lengths = np.fromiter(map(len, encoded), dtype=np.intp, count=len(encoded))
+        data = np.frombuffer(b"".join(encoded), dtype=np.uint8)
+        keys = np.repeat(np.arange(len(encoded), dtype=np.intp) * self._n_slots, lengths) + self._byte_slot[data]
+        counts = np.bincount(keys, minlength=len(encoded) * self._n_slots).reshape(n, -1)
+
+        table = np.concatenate([counts, extras], axis=1)
+        if active_only:
+            out[:] = table[:, self._src]
+        else:
+            out[:, self._dst] = table[:, self._src]
+        return out
+
+
+def _get_feature_builder(dtype=np.float32) -> FeatureMatrixBuilder:
+    """Return the FeatureMatrixBuilder for the live model bundle's scaler."""
+    bundle = models
+    if bundle is None:
+        raise RuntimeError("Models not ready")
+    return bundle.feature_builder(dtype)
+
+
+def extract_feature_matrix(urls) -> np.ndarray:
+    """Return a float32 matrix with columns matching scaler.feature_names_in_. Missing features are filled with scaler.mean_."""
+    return _get_feature_builder(np.float32).transform(urls)
+
+
 def extract_features_for_urls(urls):
     """Return DataFrame with columns matching scaler.feature_names_in_. Missing features are filled with scaler.mean_."""
-    expected_cols = list(getattr(scaler, 'feature_names_in_', []))
-    if not expected_cols:
-        # Fallback to 111 dims
-        expected_cols = [f"f{i}" for i in range(111)]
-    base_means = getattr(scaler, 'mean_', np.zeros(len(expected_cols)))
-
-    rows = []
-    for u in urls:
-        feats = _compute_lexical_subset(u)
-        # Start with means to avoid missing keys
-        row_vals = {col: float(base_means[i]) for i, col in enumerate(expected_cols)}
-        # Override with computed where names match expected
-        for k, v in feats.items():
-            if k in row_vals:
-                row_vals[k] = float(v)
-        rows.append(row_vals)
-    return pd.DataFrame(rows, columns=expected_cols)
+    builder = _get_feature_builder(np.float64)
+    return pd.DataFrame(builder.transform(urls), columns=builder.columns)
+
+# --- Metrics & Prediction Logging ---
+# Per-process Prometheus metrics served on /metrics. Per-item diagnostics are JSON log lines
+# sampled at PREDICTION_LOG_SAMPLE_RATE (0 disables, 1 logs every item).
+registry = Registry()
+REQUESTS = registry.register(Counter(
+    'dakugumen_requests_total', 'HTTP requests by route and status code.', ['endpoint', 'status']))
+REQUEST_SECONDS = registry.register(Histogram(
+    'dakugumen_request_seconds', 'Request handling time by route (streamed responses: until the body starts).', ['endpoint']))
+STAGE_SECONDS = registry.register(Histogram(
+    'dakugumen_stage_seconds', 'Time spent per scoring stage (per call, not per URL).', ['stage']))
+BATCH_ITEMS = registry.register(Histogram(
+    'dakugumen_batch_items', 'Items scored per request.', ['endpoint'], buckets=BATCH_SIZE_BUCKETS))
+PREDICTIONS = registry.register(Counter(
+    'dakugumen_predictions_total', 'Scored items by endpoint and decision.', ['endpoint', 'decision']))
+ADMISSIONS = registry.register(Counter(
+    'dakugumen_admission_total', 'Scoring requests by admission outcome (admitted, degraded, rejected, too_large).',
+    ['endpoint', 'outcome']))
+registry.register(CallbackCounter(
+    'dakugumen_prediction_cache_total', 'Prediction cache lookups and removals.', 'result',
+    lambda: {k: v for k, v in prediction_cache.stats().items() if k in ('hits', 'misses', 'evictions', 'expirations')}))
+
+registry.register(CallbackGauge(
+    'dakugumen_prediction_cache_entries', 'Prediction cache entries held and allowed.', 'stat',
+    lambda: {k: v for k, v in prediction_cache.stats().items() if k in ('size', 'maxsize')}))
+registry.register(CallbackCounter(
+    'dakugumen_microbatch_total', 'Micro-batched /predict calls: batches run and items scored in them.', 'result',
+    lambda: {'batches': predict_batcher.batches, 'items': predict_batcher.items} if predict_batcher is not None else {}))
+registry.register(CallbackGauge(
+    'dakugumen_microbatch_batch_size', 'Micro-batcher batch sizes (mean and largest so far).', 'stat',
+    lambda: {k: predict_batcher.stats()[k] for k in ('avg_batch_size', 'largest_batch')} if predict_batcher is not None else {}))
+
+registry.register(CallbackCounter(
+    'dakugumen_known_bad_total', 'Known-bad index lookups and hits.', 'result',
+    lambda: {k: v for k, v in known_bad_index.stats().items() if k in ('lookups', 'url_hits', 'domain_hits')} if known_bad_index is not None else {}))
+
+PREDICTION_LOG_SAMPLE_RATE = float(os.environ.get('PREDICTION_LOG_SAMPLE_RATE', '0.01'))
+prediction_log = logging.getLogger('dakugumen.predictions')
+if not prediction_log.handlers:
+    _handler = logging.StreamHandler()
+    _handler.setFormatter(logging.Formatter('%(message)s'))
+    prediction_log.addHandler(_handler)
+    prediction_log.setLevel(logging.INFO)
+    prediction_log.propagate = False
+
+
+@app.before_request
+def _start_request_timer():
+    g.request_started = time.perf_counter()
+
+
+@app.after_request
+def _count_request(response):
+    endpoint = request.url_rule.rule if request.url_rule is not None else 'unmatched'
+    started = g.get('request_started')
+    if started is not None:
+        REQUEST_SECONDS.observe(time.perf_counter() - started, endpoint=endpoint)
+    REQUESTS.inc(endpoint=endpoint, status=str(response.status_code))
+    return response
+
+
+def _float_or_none(x):
+    x = float(x)
+    return None if x != x else x
+
+
+def _record_predictions(endpoint, urls, post_ids, scores):
+    """Update batch/decision metrics and emit sampled per-item log records for a scored request."""
+    n = len(urls)
+    BATCH_ITEMS.observe(n, endpoint=endpoint)
+    flagged = int(np.count_nonzero(scores['is_phishing']))
+    if flagged:
+        PREDICTIONS.inc(flagged, endpoint=endpoint, decision='phishing')
+    if n - flagged:
+        PREDICTIONS.inc(n - flagged, endpoint=endpoint, decision='benign')
+    if PREDICTION_LOG_SAMPLE_RATE <= 0:
+        return
+    sampled = np.flatnonzero(np.random.random(n) < PREDICTION_LOG_SAMPLE_RATE)
+    for i in sampled.tolist():
+        prediction_log.info(json.dumps({
+            'event': 'prediction',
+            'endpoint': endpoint,
+            'url': urls[i],
+            'post_id': post_ids[i],
+            'reconstruction_error': _float_or_none(scores['reconstruction_error'][i]),
+            'content_score': float(scores['content_score'][i]),
+            'structural_score': _float_or_none(scores['structural_score'][i]),
+            'final_score': float(scores['final_score'][i]),
+            'is_phishing': bool(scores['is_phishing'][i]),
+            'used_gcn': scores['used_gcn'],
+            'score_source': scores['score_source'][i] if scores.get('degraded') else 'model',
+            'known_bad': scores['known_bad'][i] if scores.get('known_bad') else None,
+            'sample_rate': PREDICTION_LOG_SAMPLE_RATE,
+        }, default=str))
+
+
+# --- Content Scoring ---
+# Server-side cache of (content_score, reconstruction_error) per normalized URL, shared by
+# /predict and /predict_batch and dropped whenever load_models() produces a new version.
+prediction_cache = PredictionCache(
+    maxsize=int(os.environ.get('PREDICTION_CACHE_SIZE', '50000')),
+    ttl=float(os.environ.get('PREDICTION_CACHE_TTL', '600')),
+)
+
+
+def score_content(urls, bundle=None, use_cache=True):
+    """Return (reconstruction_errors, content_scores) as float64 arrays aligned with urls.
+
+    URLs are normalized once; cached results are reused and each distinct uncached URL
+    goes through the scaler and autoencoder exactly once. Everything is computed with a
+    single model bundle (the live one unless given).
+    """
+    bundle = bundle or models
+    thr = bundle.threshold
+    version = bundle.loaded_at
+    keys = [_normalize_url(u) for u in urls]
+    errors = np.empty(len(keys), dtype=np.float64)
+    content_scores = np.empty(len(keys), dtype=np.float64)
+
+    pending = {}  # normalized url -> positions still to score
+    for i, key in enumerate(keys):
+        hit = prediction_cache.get(key, version) if use_cache else None
+        if hit is None:
+            pending.setdefault(key, []).append(i)
+        else:
+            content_scores[i], errors[i] = hit
+
+    if pending:
+        miss_keys = list(pending)
+        builder = bundle.feature_builder(np.float32)
+        plan = bundle.inference_plan
+        if plan is not None:
+            with STAGE_SECONDS.time(stage='features'):
+                active = builder.transform(miss_keys, normalized=True, active_only=True)
+            with STAGE_SECONDS.time(stage='inference'):
+                miss_errors = plan.reconstruction_errors(active)
+        else:
+            with STAGE_SECONDS.time(stage='features'):
+                feats = builder.transform(miss_keys, normalized=True)
+            with STAGE_SECONDS.time(stage='scaling'):
+                scaled = bundle.scaler.transform(feats)
+            with STAGE_SECONDS.time(stage='inference'):
+                recon = bundle.autoencoder_model.predict(scaled, verbose=0)
+                miss_errors = np.mean(np.square(scaled - recon), axis=1).astype(np.float64)
+        miss_scores = np.minimum(miss_errors / (thr * 2), 1.0)
+        for key, err, csc in zip(miss_keys, miss_errors.tolist(), miss_scores.tolist()):
+            if use_cache:
+                prediction_cache.put(key, (csc, err), version)
+            for i in pending[key]:
+                errors[i] = err
+                content_scores[i] = csc
+    return errors, content_scores
+
+
+def _build_inference_plan(scaler_obj, numpy_ae):
+    """Build a FoldedAutoencoderPlan and check it against scaler.transform + the full forward pass."""
+    builder = FeatureMatrixBuilder.for_scaler(scaler_obj, dtype=np.float32)
+    try:
+        plan = FoldedAutoencoderPlan.build(scaler_obj, numpy_ae, builder.active_columns, builder.base_row)
+        probe = _PROBE_URLS
+        full = builder.transform(probe)
+        scaled = scaler_obj.transform(full)
+        expected = np.mean(np.square(scaled - numpy_ae.predict(scaled)), axis=1)
+        got = plan.reconstruction_errors(builder.transform(probe, active_only=True))
+        if not np.allclose(got, expected, rtol=1e-4, atol=1e-6):
+            raise ValueError(f"folded errors {got.tolist()} != reference {expected.tolist()}")
+    except Exception as e:
+        print(f"⚠️ Folded inference plan unavailable, using scaler.transform + full model: {e}")
+        return None
+    print(f"✅ Folded scaler into autoencoder ({plan.n_active}/{plan.n_features} active inputs).")
+    return plan
+
+
+def score_items(urls, post_ids, bundle=None, use_cache=True, degraded=False):
+    """Content + structural score fusion for aligned urls/post_ids. Returns a dict of arrays.
+
+    degraded=True skips the autoencoder (cached or heuristic content scores, see degraded_content).
+    """
+    bundle = bundle or models
+    # 1. Content Scores (vectorized, cached per normalized URL)
+    errors, content_scores, sources, known = content_scores_for(urls, bundle=bundle, use_cache=use_cache, degraded=degraded)
+
+    # 2. Structural Scores per distinct post (artifacts, then the online graph, else 0.5)
+    # Keyed by str(post_id) -- what the GNN index and the graph hash anyway -- so list/dict
+    # post_ids from the request body can't make the grouping fail
+    post_keys = [None if pid is None else str(pid) for pid in post_ids]
+    post_links = {}
+    for url, key in zip(urls, post_keys):
+        post_links.setdefault(key, []).append(url)
+    post_scores = structural_scores_for(list(post_links), list(post_links.values()), bundle=bundle)
+    by_post = dict(zip(post_links, post_scores.tolist()))
+    structural_scores = np.array([by_post[key] for key in post_keys], dtype=np.float64)
+
+    # 3. Fuse Scores
+    final_scores = (0.6 * content_scores) + (0.4 * structural_scores)
+    if known is not None:
+        final_scores[[i for i, m in enumerate(known) if m]] = 1.0
+    decision_cutoff = float(os.environ.get('FINAL_SCORE_CUTOFF', '0.5'))
+    scores = {
+        'reconstruction_error': errors,
+        'content_score': content_scores,
+        'structural_score': structural_scores,
+        'final_score': final_scores,
+        'is_phishing': final_scores > decision_cutoff,
+        'used_gcn': bundle.gnn_index is not None,
+        'ae_threshold_used': bundle.threshold,
+    }
+    if degraded:
+        scores.update(degraded=True, score_source=sources)
+    if known is not None:
+        scores['known_bad'] = known
+    return scores
+
+
+def prediction_records(urls, post_ids, scores):
+    """Per-item response dicts (the /predict_batch prediction format) from score_items output."""
+    used_gcn, thr = scores['used_gcn'], scores['ae_threshold_used']
+    records = [
+        { 'url': url, 'post_id': pid, 'is_phishing': bool(pred), 'used_gcn': used_gcn, 'reconstruction_error': _float_or_none(err), 'content_score': float(csc), 'final_score': float(fin), 'ae_threshold_used': thr }
+        for url, pid, pred, err, csc, fin in zip(urls, post_ids, scores['is_phishing'].tolist(), scores['reconstruction_error'].tolist(),
+                                                  scores['content_score'].tolist(), scores['final_score'].tolist())
+    ]
+    if scores.get('degraded'):
+        for rec, source in zip(records, scores['score_source']):
+            rec['degraded'] = True
+            rec['score_source'] = source
+    if scores.get('known_bad'):
+        for rec, match in zip(records, scores['known_bad']):
+            if match:
+                rec['known_bad'] = match
+    return records
+
+
+def _score_content_rows(items):
+    """[(bundle, url)] -> [(error, content_score)]; each URL is scored with the bundle it came with.
+
+    A micro-batch can straddle a reload, so it is split per bundle instead of using whichever
+    one is live at flush time (the caller reports that bundle's threshold).
+    """
+    groups = {}
+    for i, (bundle, url) in enumerate(items):
+        groups.setdefault(id(bundle), (bundle, []))[1].append(i)
+    out = [None] * len(items)
+    for bundle, rows in groups.values():
+        errors, content_scores = score_content([items[i][1] for i in rows], bundle=bundle)
+        for i, err, csc in zip(rows, errors.tolist(), content_scores.tolist()):
+            out[i] = (err, csc)
+    return out
+
+
+def score_posts(posts, bundle=None, use_cache=True, degraded=False):
+    """Per-post verdicts for [(post_id, [links])].
+
+    Links are deduplicated by normalized URL (tracking parameters stripped) across the whole
+    request, so each distinct URL goes through the content model once (or, with degraded=True,
+    gets a cached/heuristic score instead) and is reported once per post, in normalized form;
+    the structural score is looked up once per post. A post is flagged when any of its links'
+    fused score crosses the cutoff. Also returns per-link arrays (urls, post_ids, scores)
+    for metrics and logging.
+    """
+    bundle = bundle or models
+    unique = {}  # normalized url -> column in the content score arrays
+    link_cols = []  # per post: columns of its distinct links, in first-seen order
+    for _, links in posts:
+        cols = [unique.setdefault(url, len(unique)) for url in dict.fromkeys(map(_normalize_url, links))]
+        link_cols.append(cols)
+    urls = list(unique)
+    errors, content_scores, sources, known = content_scores_for(urls, bundle=bundle, use_cache=use_cache, degraded=degraded)
+
+    post_ids = [pid for pid, _ in posts]
+    structural_scores = structural_scores_for(post_ids, [links for _, links in posts], bundle=bundle)
+
+    # Expand to one row per (post, distinct link) and fuse
+    counts = [len(cols) for cols in link_cols]
+    cols = np.fromiter((c for cs in link_cols for c in cs), dtype=np.intp, count=sum(counts))
+    post_rows = np.repeat(np.arange(len(posts)), counts)
+    link_structural = structural_scores[post_rows]
+    final_scores = (0.6 * content_scores[cols]) + (0.4 * link_structural)
+    if known is not None:
+        link_known = [known[c] for c in cols.tolist()]
+        final_scores[[i for i, m in enumerate(link_known) if m]] = 1.0
+    decision_cutoff = float(os.environ.get('FINAL_SCORE_CUTOFF', '0.5'))
+    flagged = final_scores > decision_cutoff
+
+    used_gcn = bundle.gnn_index is not None
+    results, start = [], 0
+    for (pid, _), n, struct in zip(posts, counts, structural_scores.tolist()):
+        post_cols = cols[start:start + n].tolist()
+        post_flags = flagged[start:start + n].tolist()
+        results.append({
+            'post_id': pid,
+            'is_phishing': any(post_flags),
+            'flagged_links': [urls[c] for c, f in zip(post_cols, post_flags) if f],
+            'final_score': float(final_scores[start:start + n].max()) if n else None,
+            'structural_score': struct,
+            'links_scored': n,
+            'used_gcn': used_gcn,
+        })
+        if degraded:
+            results[-1]['degraded'] = True
+            results[-1]['score_sources'] = sorted({sources[c] for c in post_cols})
+        if known is not None and any(known[c] for c in post_cols):
+            results[-1]['known_bad_links'] = [urls[c] for c in post_cols if known[c]]
+        start += n
+
+    link_scores = {
+        'reconstruction_error': errors[cols],
+        'content_score': content_scores[cols],
+        'structural_score': link_structural,
+        'final_score': final_scores,
+        'is_phishing': flagged,
+        'used_gcn': used_gcn,
+    }
+    if degraded:
+        link_scores.update(degraded=True, score_source=[sources[c] for c in cols.tolist()])
+    if known is not None:
+        link_scores['known_bad'] = link_known
+    return results, [urls[c] for c in cols.tolist()], [post_ids[r] for r in post_rows.tolist()], link_scores
+
+
+# --- Structural Graph ---
+# Posts missing from the GNN artifacts are scored from their neighbours in an online
+# post/domain/user graph. Scoring only reads it. Its source of truth is the append-only edge
+# log at GRAPH_EDGES_PATH (the export pipeline's graph_edges.jsonl): /graph_ingest and
+# /graph_click append to it, and every worker re-reads the appended lines at most once per
+# GRAPH_REFRESH_SECONDS while scoring, so all workers serve the same graph.
+structural_graph = None
+if os.environ.get('STRUCTURAL_GRAPH', '1') != '0':
+    structural_graph = StructuralGraph(
+        prior_weight=float(os.environ.get('GRAPH_PRIOR_WEIGHT', '1.0')),
+        max_nodes=int(os.environ.get('GRAPH_MAX_NODES', '1000000')),
+        max_edges=int(os.environ.get('GRAPH_MAX_EDGES', '5000000')),
+    )
+    _edges_path = os.environ.get('GRAPH_EDGES_PATH') or os.path.join(HERE, 'graph_edges.jsonl')
+    try:
+        _n_edges = structural_graph.follow(_edges_path, float(os.environ.get('GRAPH_REFRESH_SECONDS', '2')))
+        if _n_edges:
+            print(f"✅ Loaded {_n_edges} graph edges from {_edges_path}.")
+    except Exception as e:
+        print(f"⚠️ Could not load graph edges from {_edges_path}: {e}")
+
+def _gnn_prob_lookup(bundle):
+    if bundle.gnn_index is None:
+        return None
+    return lambda post_ids: bundle.gnn_index.lookup(post_ids, default=np.nan)
+
+
+def structural_scores_for(post_ids, post_links, bundle=None):
+    """Structural score per post: GNN artifacts first, then the online graph, else 0.5.
+
+    post_links (one list of URLs per post) let posts the graph hasn't seen borrow evidence
+    from the domains they link to. The graph is not modified, so scores don't depend on
+    which requests this worker served before.
+    """
+    bundle = bundle or models
+    with STAGE_SECONDS.time(stage='gnn_lookup'):
+        if bundle.gnn_index is not None:
+            scores = bundle.gnn_index.lookup(post_ids, default=np.nan)
+        else:
+            scores = np.full(len(post_ids), np.nan, dtype=np.float64)
+        if structural_graph is not None:
+            missing = np.flatnonzero(np.isnan(scores)).tolist()
+            if missing:
+                structural_graph.refresh_if_due()
+                scores[missing] = structural_graph.score(
+                    [post_ids[i] for i in missing],
+                    hosts=[{host_of(u) for u in post_links[i] if isinstance(u, str) and u} for i in missing])
+        scores[np.isnan(scores)] = 0.5
+    return scores
+
+
+# --- Known-Bad Index ---
+# Links users already flagged (exact normalized URL, or a listed host / parent domain)
+# are answered as phishing without touching the content model. Loaded from KNOWN_BAD_PATH
+# (flagged_phishing_links export, URL list or LocalFirestoreClient file) and re-read for
+# appended lines every KNOWN_BAD_REFRESH_SECONDS in each worker.
+def _host_and_parents(url):
+    """The URL's host and each parent domain down to the registered domain (a.b.evil.co.uk ... evil.co.uk)."""
+    if not isinstance(url, str) or not url:
+        return ()
+    parts = domain_parser.parse(url)
+    registered = ".".join(p for p in (parts.domain, parts.suffix) if p)
+    labels = parts.subdomain.split(".") if parts.subdomain else []
+    return [".".join(labels[i:] + [registered]) for i in range(len(labels))] + [registered]
+
+
+known_bad_index = None
+if os.environ.get('KNOWN_BAD_INDEX', '1') != '0':
+    known_bad_index = KnownBadIndex(normalize=_normalize_url, domains_of=_host_and_parents)
+    _known_bad_path = os.environ.get('KNOWN_BAD_PATH') or os.path.join(HERE, 'known_bad_links.jsonl')
+    try:
+        known_bad_index.follow(_known_bad_path, float(os.environ.get('KNOWN_BAD_REFRESH_SECONDS', '30')))
+        if len(known_bad_index):
+            print(f"✅ Loaded known-bad index from {_known_bad_path} ({known_bad_index.n_urls} URLs, {known_bad_index.n_domains} domains).")
+    except Exception as e:
+        print(f"⚠️ Could not load known-bad index from {_known_bad_path}: {e}")
+
+
+def _known_bad_matches(urls):
+    """Per-URL known-bad match ("url" / "domain" / None), or None when nothing matched."""
+    if known_bad_index is None:
+        return None
+    with STAGE_SECONDS.time(stage='known_bad'):
+        matches = known_bad_index.match(urls)
+    return matches if any(matches) else None
+
+
+def content_scores_for(urls, bundle=None, use_cache=True, degraded=False):
+    """(errors, content_scores, sources, known_bad) with known-bad links kept away from the model.
+
+    Known-bad links get content score 1.0 and a NaN error; sources is only set when degraded,
+    known_bad is None unless something matched.
+    """
+    known = _known_bad_matches(urls)
+    todo = list(range(len(urls))) if known is None else [i for i, m in enumerate(known) if m is None]
+    sub = urls if known is None else [urls[i] for i in todo]
+    sources = None
+    if degraded:
+        errors, content_scores, sources = degraded_content(sub, bundle=bundle)
+    else:
+        errors, content_scores = score_content(sub, bundle=bundle, use_cache=use_cache)
+    if known is None:
+        return errors, content_scores, sources, None
+    all_errors = np.full(len(urls), np.nan, dtype=np.float64)
+    all_scores = np.ones(len(urls), dtype=np.float64)
+    all_errors[todo], all_scores[todo] = errors, content_scores
+    if sources is not None:
+        all_sources = ['known_bad'] * len(urls)
+        for i, src in zip(todo, sources):
+            all_sources[i] = src
+        sources = all_sources
+    return all_errors, all_scores, sources, known
+
+
+# --- Admission Control & Degraded Scoring ---
+# Each worker scores at most MAX_INFLIGHT_ROWS rows at once and batches of at most
+# MAX_BATCH_ITEMS items. A request that can't get capacity within ADMISSION_WAIT_MS is answered
+# right away: with cached / lexical-heuristic content scores marked "degraded" (DEGRADED_MODE,
+# the default), or with 503 + Retry-After. Needs a threaded worker to see concurrent requests.
+MAX_BATCH_ITEMS = int(os.environ.get('MAX_BATCH_ITEMS', '1000'))
+RETRY_AFTER_SECONDS = int(os.environ.get('RETRY_AFTER_SECONDS', '2'))
+DEGRADED_MODE = os.environ.get('DEGRADED_MODE', '1').lower() in ('1', 'true', 'yes')
+admission = AdmissionController(
+    max_inflight_rows=int(os.environ.get('MAX_INFLIGHT_ROWS', '2048')),
+    max_wait=float(os.environ.get('ADMISSION_WAIT_MS', '50')) / 1000.0,
+)
+STREAM_CHUNK_WAIT_SECONDS = float(os.environ.get('STREAM_CHUNK_WAIT_SECONDS', '30'))
+
+# Same signals the extension's linkLooksSuspicious() uses, as additive content-score weights
+_HEURISTIC_TLDS = ("xyz", "top", "club", "online", "buzz", "site")
+_HEURISTIC_HOST_TOKENS = ("login-", "-verify", "-update", "-security", "-account")
+
+
+def heuristic_content_score(url: str) -> float:
+    """Lexical-only stand-in for the autoencoder content score, in [0, 1]."""
+    u = _normalize_url(url)
+    domain, _, _, shortened, in_ip = _split_url(u)
+    host = domain.lower()
+    score = 0.0
+    if shortened:
+        score += 0.5
+    if in_ip:
+        score += 0.6
+    if u.lower().startswith('http://'):
+        score += 0.2
+    if host.rsplit('.', 1)[-1] in _HEURISTIC_TLDS:
+        score += 0.4
+    if any(t in host for t in _HEURISTIC_HOST_TOKENS):
+        score += 0.5
+    if '@' in u.split('?', 1)[0]:
+        score += 0.3
+    if host.count('.') >= 4:
+        score += 0.2
+    if len(u) > 100:
+        score += 0.2
+    return min(score, 1.0)
+
+
+def degraded_content(urls, bundle=None):
+    """(errors, content_scores, sources) without running the autoencoder.
+
+    Cached model scores are used where present (source "cache"); other URLs get
+    heuristic_content_score (source "heuristic", reconstruction error NaN).
+    """
+    bundle = bundle or models
+    version = bundle.loaded_at
+    errors = np.full(len(urls), np.nan, dtype=np.float64)
+    content_scores = np.empty(len(urls), dtype=np.float64)
+    sources = []
+    for i, url in enumerate(urls):
+        hit = prediction_cache.get(_normalize_url(url), version)
+        if hit is None:
+            content_scores[i] = heuristic_content_score(url)
+            sources.append('heuristic')
+        else:
+            content_scores[i], errors[i] = hit
+            sources.append('cache')
+    return errors, content_scores, sources
+
+
+def _too_many_items(endpoint, n):
+    ADMISSIONS.inc(endpoint=endpoint, outcome='too_large')
+    return jsonify({'error': f'Too many items ({n} > {MAX_BATCH_ITEMS}); split the request', 'max_items': MAX_BATCH_ITEMS}), 413
+
+
+def _overloaded(endpoint):
+    ADMISSIONS.inc(endpoint=endpoint, outcome='rejected')
+    resp = jsonify({'error': 'Server overloaded, retry later', 'retry_after': RETRY_AFTER_SECONDS})
+    resp.headers['Retry-After'] = str(RETRY_AFTER_SECONDS)
+    return resp, 503
+
+
+def _admission_outcome(endpoint, admitted):
+    """Count the outcome; True when the request should be scored in degraded mode."""
+    ADMISSIONS.inc(endpoint=endpoint, outcome='admitted' if admitted else 'degraded')
+    return not admitted
+
+
+# Load models at startup
+load_models()
+_generation_seen = _generation_stamp()
+
+# Opt-in: coalesce concurrent /predict calls in this worker into one scaler+autoencoder pass.
+# Needs a threaded worker (e.g. gunicorn --threads 8) to see more than one request at a time.
+predict_batcher = None
+if os.environ.get('PREDICT_MICROBATCH', '0').lower() in ('1', 'true', 'yes'):
+    predict_batcher = MicroBatcher(
+        _score_content_rows,
+        max_wait=float(os.environ.get('PREDICT_MICROBATCH_WAIT_MS', '3')) / 1000.0,
+        max_items=int(os.environ.get('PREDICT_MICROBATCH_MAX_ITEMS', '64')),
+    )
+    print(f"Micro-batching enabled for /predict (wait={predict_batcher.max_wait * 1000:.1f}ms, max_items={predict_batcher.max_items})")
 
 # Health check endpoint
+# --- Admin Auth ---
+# /reload_models, /graph_ingest and /graph_click change what every worker serves. With
+# ADMIN_TOKEN set they need "Authorization: Bearer <ADMIN_TOKEN>". Without it the graph
+# endpoints are refused (anyone could tie any post to any domain) and /reload_models stays open.
+ADMIN_TOKEN = os.environ.get('ADMIN_TOKEN') or None
+
+
+def _admin_denied(required=True):
+    """An error response unless the request carries the admin token, else None."""
+    if ADMIN_TOKEN is None:
+        return (jsonify({'error': 'Admin endpoint disabled; set ADMIN_TOKEN on the server'}), 403) if required else None
+    if not hmac.compare_digest(request.headers.get('Authorization', '').encode(), f'Bearer {ADMIN_TOKEN}'.encode()):
+        return jsonify({'error': 'Unauthorized'}), 401
+    return None
+
+
 @app.route('/')
 def health_check():
     return jsonify({'status': 'healthy', 'service': 'dakugumen-phishing-detector'})
@@ -230,14 +1045,17 @@ def health_check():
 @app.route('/ready')
 def ready_check():
     return jsonify({
-        'models_ready': bool(autoencoder_model is not None and scaler is not None and autoencoder_threshold is not None),
+        'models_ready': models is not None,
         'error': MODEL_LOAD_ERROR,
-    }), (200 if autoencoder_model is not None and scaler is not None and autoencoder_threshold is not None else 503)
+        'firestore_writer': fs_writer.stats() if fs_writer is not None else None,
+        'admission': admission.stats(),
+    }), (200 if models is not None else 503)
 
 # --- API Endpoints ---
 @app.route('/predict', methods=['POST'])
 def predict():
-    if autoencoder_model is None or scaler is None or autoencoder_threshold is None:
+    bundle = models
+    if bundle is None:
         return jsonify({'error': 'Models not ready'}), 500
     
     data = request.get_json()
@@ -246,38 +1064,59 @@ def predict():
         return jsonify({'error': 'Missing "url" or "post_id"'}), 400
 
     try:
-        # 1. Content Score
-        features = extract_features_for_urls([url])
-        scaled_features = scaler.transform(features)
-        recon = autoencoder_model.predict(scaled_features, verbose=0)
-        error = float(np.mean(np.square(scaled_features - recon)))
-        # Use effective threshold (multiplier-aware) if available
-        thr = effective_autoencoder_threshold if effective_autoencoder_threshold is not None else autoencoder_threshold
-        content_score = float(min(error / (thr * 2), 1.0))
+        # 0. Links users already flagged skip the model
+        known = _known_bad_matches([url])
+        if known is not None:
+            used_gcn = bundle.gnn_index is not None
+            _record_predictions('predict', [url], [post_id], {
+                'reconstruction_error': [np.nan], 'content_score': [1.0], 'structural_score': [np.nan],
+                'final_score': [1.0], 'is_phishing': [True], 'used_gcn': used_gcn, 'known_bad': known,
+            })
+            return jsonify({'is_phishing': True, 'used_gcn': used_gcn, 'final_score': 1.0, 'reconstruction_error': None, 'content_score': 1.0,
+                            'ae_threshold_used': bundle.threshold, 'known_bad': known[0]})
+
+        # 1. Content Score (effective, multiplier-aware threshold; served from cache when possible)
+        with admission.admit(1) as admitted:
+            if not admitted and not DEGRADED_MODE:
+                return _overloaded('predict')
+            degraded = _admission_outcome('predict', admitted)
+            if degraded:
+                errors, content_scores, sources = degraded_content([url], bundle=bundle)
+                error, content_score = _float_or_none(errors[0]), float(content_scores[0])
+            elif predict_batcher is not None:
+                error, content_score = predict_batcher.submit((bundle, url))
+            else:
+                error, content_score = _score_content_rows([(bundle, url)])[0]
+        thr = bundle.threshold
         
-        # 2. Structural Score from precomputed artifacts (default 0.5 if missing)
-        structural_score = 0.5
-        if post_node_map is not None and gnn_probs is not None:
-            idx = post_node_map.get(str(post_id))
-            if idx is not None and 0 <= idx < len(gnn_probs):
-                structural_score = float(gnn_probs[idx])
+        # 2. Structural Score from precomputed artifacts or the online graph (default 0.5)
+        structural_score = float(structural_scores_for([post_id], [[url]], bundle=bundle)[0])
 
         # 3. Fuse Scores
         final_score = float((content_score * 0.6) + (structural_score * 0.4))
         decision_cutoff = float(os.environ.get('FINAL_SCORE_CUTOFF', '0.5'))
         is_phishing = bool(final_score > decision_cutoff)
         
-        used_gcn = bool(post_node_map is not None and gnn_probs is not None)
-        # Detailed log for debugging
-        print(f"URL: {url} | recon_error={error:.6f} content={content_score:.3f} gcn={structural_score:.3f} final={final_score:.3f} | phishing={is_phishing} gcn_used={used_gcn}")
-        return jsonify({'is_phishing': is_phishing, 'used_gcn': used_gcn, 'final_score': final_score, 'reconstruction_error': error, 'content_score': content_score, 'ae_threshold_used': thr})
+        used_gcn = bundle.gnn_index is not None
+        scores = {
+            'reconstruction_error': [np.nan if error is None else error], 'content_score': [content_score], 'structural_score': [structural_score],
+            'final_score': [final_score], 'is_phishing': [is_phishing], 'used_gcn': used_gcn,
+        }
+        body = {'is_phishing': is_phishing, 'used_gcn': used_gcn, 'final_score': final_score, 'reconstruction_error': error, 'content_score': content_score, 'ae_threshold_used': thr}
+        if degraded:
+            scores.update(degraded=True, score_source=sources)
+            body.update(degraded=True, score_source=sources[0])
+        _record_predictions('predict', [url], [post_id], scores)
+        with STAGE_SECONDS.time(stage='serialization'):
+            return jsonify(body)
 
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
 @app.route('/predict_batch', methods=['POST'])
 def predict_batch():
-    if autoencoder_model is None or scaler is None or autoencoder_threshold is None:
+    bundle = models
+    if bundle is None:
         return jsonify({'error': 'Models not ready'}), 500
 
     data = request.get_json() or {}
@@ -285,50 +1124,157 @@ def predict_batch():
     if not isinstance(items, list) or len(items) == 0:
         return jsonify({'predictions': []})
 
+    if len(items) > MAX_BATCH_ITEMS:
+        return _too_many_items('predict_batch', len(items))
+
     try:
         urls = [it.get('url') for it in items]
         post_ids = [it.get('post_id') for it in items]
+        with admission.admit(len(items)) as admitted:
+            if not admitted and not DEGRADED_MODE:
+                return _overloaded('predict_batch')
+            degraded = _admission_outcome('predict_batch', admitted)
+            scores = score_items(urls, post_ids, bundle=bundle, degraded=degraded)
+        _record_predictions('predict_batch', urls, post_ids, scores)
 
-        # 1. Content Scores (vectorized)
-        feats = extract_features_for_urls(urls)
-        scaled = scaler.transform(feats)
-        recon = autoencoder_model.predict(scaled, verbose=0)
-        errors = np.mean(np.square(scaled - recon), axis=1)
-        content_scores = np.minimum(errors / (autoencoder_threshold * 2), 1.0)
-
-        # 2. Structural Scores from artifacts (or 0.5 if unavailable)
-        if post_node_map is not None and gnn_probs is not None:
-            idxs = [post_node_map.get(str(pid), None) for pid in post_ids]
-            structural_scores = np.array([
-                float(gnn_probs[i]) if (i is not None and 0 <= i < len(gnn_probs)) else 0.5
-                for i in idxs
-            ], dtype=float)
-        else:
-            structural_scores = np.full(len(post_ids), 0.5, dtype=float)
+        with STAGE_SECONDS.time(stage='serialization'):
+            body = {'predictions': prediction_records(urls, post_ids, scores)}
+            if degraded:
+                body['degraded'] = True
+            return jsonify(body)
 
-        # 3. Fuse Scores
-        # Use effective threshold for content_score scaling
-        thr = effective_autoencoder_threshold if effective_autoencoder_threshold is not None else autoencoder_threshold
-        final_scores = (0.6 * content_scores) + (0.4 * structural_scores)
-        decision_cutoff = float(os.environ.get('FINAL_SCORE_CUTOFF', '0.5'))
-        preds = (final_scores > decision_cutoff).tolist()
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+
+def _parse_ndjson_items(lines, first_line_no):
+    """Parse NDJSON lines into ([(line_no, url, post_id)], [error records])."""
+    items, errors = [], []
+    for n, line in enumerate(lines, start=first_line_no):
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            it = json.loads(line)
+        except Exception as e:
+            errors.append({'line': n, 'error': f'Invalid JSON: {e}'})
+            continue
+        url = it.get('url') if isinstance(it, dict) else None
+        if not url:
+            errors.append({'line': n, 'error': 'Missing "url"'})
+            continue
+        if not isinstance(url, str):
+            errors.append({'line': n, 'error': '"url" must be a string'})
+            continue
+        items.append((n, url, it.get('post_id')))
+    return items, errors
+
+
+def score_ndjson_chunk(lines, first_line_no=1, bundle=None) -> str:
+    """Score a chunk of {url, post_id} NDJSON lines; returns the NDJSON result lines in input order.
+
+    Used by /predict_stream and bulk_score.py. Bypasses the prediction cache so bulk rescans
+    don't evict the entries live traffic depends on.
+    """
+    items, errors = _parse_ndjson_items(lines, first_line_no)
+    out = []
+    if items:
+        line_nos, urls, post_ids = zip(*items)
+        scores = score_items(list(urls), list(post_ids), bundle=bundle, use_cache=False)
+        _record_predictions('predict_stream', urls, post_ids, scores)
+        for n, rec in zip(line_nos, prediction_records(urls, post_ids, scores)):
+            rec['line'] = n
+            out.append(rec)
+    if errors:
+        out = sorted(out + errors, key=lambda r: r['line'])
+    with STAGE_SECONDS.time(stage='serialization'):
+        return "".join(json.dumps(r) + "\n" for r in out)
+
+
+@app.route('/predict_stream', methods=['POST'])
+def predict_stream():
+    """Stream NDJSON {url, post_id} lines in, NDJSON predictions out, CHUNK lines at a time."""
+    bundle = models
+    if bundle is None:
+        return jsonify({'error': 'Models not ready'}), 500
+    try:
+        chunk_size = max(1, min(int(request.args.get('chunk_size', '1000')), 10000))
+    except ValueError:
+        return jsonify({'error': 'Invalid chunk_size'}), 400
+    # Bulk rescans never get degraded scores: refuse up front when saturated, then let each
+    # chunk wait for capacity so live traffic keeps priority
+    if not admission.acquire(1):
+        return _overloaded('predict_stream')
+    admission.release(1)
+    ADMISSIONS.inc(endpoint='predict_stream', outcome='admitted')
+    body = request.stream
+
+    def score_chunk(chunk, first):
+        with admission.admit(len(chunk), timeout=STREAM_CHUNK_WAIT_SECONDS) as admitted:
+            if admitted:
+                return score_ndjson_chunk(chunk, first, bundle=bundle)
+        ADMISSIONS.inc(endpoint='predict_stream', outcome='rejected')
+        return "".join(json.dumps({'line': n, 'error': 'Server overloaded, not scored'}) + "\n"
+                       for n, line in enumerate(chunk, start=first) if line.strip())
+
+    def generate():
+        chunk, first = [], 1
+        for n, raw in enumerate(body, start=1):
+            chunk.append(raw.decode('utf-8', 'replace'))
+            if len(chunk) >= chunk_size:
+                yield score_chunk(chunk, first)
+                chunk, first = [], n + 1
+        if chunk:
+            yield score_chunk(chunk, first)
 
-        used_gcn = bool(post_node_map is not None and gnn_probs is not None)
-        # Log detailed per-item diagnostics
-        for u, pid, err, csc, gsc, fin, pr in zip(urls, post_ids, errors, content_scores, structural_scores, final_scores, preds):
-            print(f"BATCH URL: {u} | recon_error={float(err):.6f} content={float(csc):.3f} gcn={float(gsc):.3f} final={float(fin):.3f} | phishing={bool(pr)}")
+    return Response(stream_with_context(generate()), mimetype='application/x-ndjson')
+
+
+@app.route('/scan_posts', methods=['POST'])
+def scan_posts():
+    """Score many posts' links in one request: {"posts": [{"post_id", "links": [...]}]}."""
+    bundle = models
+    if bundle is None:
+        return jsonify({'error': 'Models not ready'}), 500
 
-        return jsonify({'predictions': [
-            { 'url': url, 'post_id': pid, 'is_phishing': bool(pred), 'used_gcn': used_gcn, 'reconstruction_error': float(err), 'content_score': float(csc), 'final_score': float(fin), 'ae_threshold_used': thr }
-            for url, pid, pred, err, csc, fin in zip(urls, post_ids, preds, errors.tolist(), content_scores.tolist(), final_scores.tolist())
-        ]})
+    data = request.get_json(silent=True) or {}
+    raw_posts = data.get('posts') or []
+    if not isinstance(raw_posts, list):
+        return jsonify({'error': '"posts" must be a list'}), 400
+    posts = []
+    for p in raw_posts:
+        if not isinstance(p, dict) or not isinstance(p.get('links') or [], list):
+            return jsonify({'error': 'Each post needs "post_id" and a "links" list'}), 400
+        posts.append((p.get('post_id'), [u for u in (p.get('links') or []) if isinstance(u, str) and u]))
+    if not posts:
+        return jsonify({'results': [], 'unique_urls': 0})
+    n_links = sum(len(links) for _, links in posts)
+    if n_links > MAX_BATCH_ITEMS:
+        return _too_many_items('scan_posts', n_links)
 
+    try:
+        with admission.admit(n_links) as admitted:
+            if not admitted and not DEGRADED_MODE:
+                return _overloaded('scan_posts')
+            degraded = _admission_outcome('scan_posts', admitted)
+            results, urls, post_ids, link_scores = score_posts(posts, bundle=bundle, degraded=degraded)
+        _record_predictions('scan_posts', urls, post_ids, link_scores)
+        with STAGE_SECONDS.time(stage='serialization'):
+            body = {
+                'results': results,
+                'unique_urls': len(set(urls)),
+                'ae_threshold_used': bundle.threshold,
+            }
+            if degraded:
+                body['degraded'] = True
+            return jsonify(body)
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+
 # Server-side report/graph endpoints remain the same...
 def _fs_ok():
-    return fs_db is not None
+    return fs_writer is not None
 
 @app.route('/report', methods=['POST'])
 def report():
@@ -342,8 +1288,8 @@ def report():
     if not app_id or not rtype:
         return jsonify({'error': 'Missing app_id or type'}), 400
     try:
-        col = fs_db.collection(f"artifacts/{app_id}/private_user_reports")
-        col.add({'type': rtype, 'payload': payload, 'userId': user_id, 'timestamp': firestore.SERVER_TIMESTAMP})
+        fs_writer.enqueue(f"artifacts/{app_id}/private_user_reports",
+                          {'type': rtype, 'payload': payload, 'userId': user_id, 'timestamp': firestore.SERVER_TIMESTAMP})
         return jsonify({'status': 'ok'})
     except Exception as e:
         return jsonify({'error': str(e)}), 500
@@ -351,25 +1297,45 @@ def report():
 
 @app.route('/reload_models', methods=['POST'])
 def reload_models_endpoint():
-    # security: restrict in production; for now anyone can call
-    load_models()
-    if MODEL_LOAD_ERROR:
-        return jsonify({'status': 'error', 'message': MODEL_LOAD_ERROR}), 500
+    denied = _admin_denied(required=False)
+    if denied:
+        return denied
+    # The current bundle keeps serving while the new one loads; on failure it stays live.
+    if not load_models():
+        return jsonify({'status': 'error', 'message': MODEL_LOAD_ERROR, 'models_last_loaded_at': models_last_loaded_at}), 500
+    # Tell the other workers to pick up the new generation
+    _publish_generation(models_last_loaded_at)
     return jsonify({'status': 'ok', 'models_last_loaded_at': models_last_loaded_at})
 
 
 @app.route('/model_info', methods=['GET'])
 def model_info():
+    bundle = models
     info = {
-        'models_ready': bool(autoencoder_model is not None and scaler is not None and autoencoder_threshold is not None),
-        'autoencoder_threshold': autoencoder_threshold,
-        'effective_ae_threshold': effective_autoencoder_threshold,
-        'scaler_type': type(scaler).__name__ if scaler is not None else None,
-        'gnn_loaded': bool(gnn_probs is not None and post_node_map is not None),
-        'models_last_loaded_at': models_last_loaded_at,
+        'models_ready': bundle is not None,
+        'model_load_error': MODEL_LOAD_ERROR,
+        'autoencoder_threshold': bundle.autoencoder_threshold if bundle else None,
+        'effective_ae_threshold': bundle.effective_autoencoder_threshold if bundle else None,
+        'ae_backend': getattr(bundle.autoencoder_model, 'backend', None) if bundle else None,
+        'scaler_type': type(bundle.scaler).__name__ if bundle else None,
+        'inference_plan': bundle.inference_plan.info() if bundle and bundle.inference_plan is not None else None,
+        'gnn_loaded': bool(bundle and bundle.gnn_index is not None),
+        'gnn_index_size': len(bundle.gnn_index) if bundle and bundle.gnn_index is not None else 0,
+        'structural_graph': structural_graph.stats() if structural_graph is not None else None,
+        'models_last_loaded_at': bundle.loaded_at if bundle else None,
+        'model_bundle': bundle.bundle_info if bundle else None,
+        'prediction_cache': prediction_cache.stats(),
+        'domain_parser': domain_parser.stats(),
+        'known_bad_index': known_bad_index.stats() if known_bad_index is not None else None,
+        'predict_microbatch': predict_batcher.stats() if predict_batcher is not None else None,
+        'admission': dict(admission.stats(), max_batch_items=MAX_BATCH_ITEMS, degraded_mode=DEGRADED_MODE),
     }
     return jsonify(info)
 
+@app.route('/metrics', methods=['GET'])
+def metrics():
+    return Response(registry.render(), content_type=CONTENT_TYPE)
+
 @app.route('/flag', methods=['POST'])
 def flag():
     if not _fs_ok():
@@ -381,15 +1347,59 @@ def flag():
     if not app_id or not url:
         return jsonify({'error': 'Missing app_id or url'}), 400
     try:
-        col = fs_db.collection(f"artifacts/{app_id}/public/data/flagged_phishing_links")
-        col.add({'url': url, 'userId': user_id, 'timestamp': firestore.SERVER_TIMESTAMP})
+        fs_writer.enqueue(f"artifacts/{app_id}/public/data/flagged_phishing_links",
+                          {'url': url, 'userId': user_id, 'timestamp': firestore.SERVER_TIMESTAMP})
         return jsonify({'status': 'ok'})
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
-# Add other endpoints (graph_ingest, graph_click) as in original...
-# [Include remaining endpoints from your original app.py]
+def _is_str_list(value):
+    return isinstance(value, list) and all(isinstance(v, str) for v in value)
+
+
+@app.route('/graph_ingest', methods=['POST'])
+def graph_ingest():
+    """Append a post, the domains it links to and the viewing user to the shared edge log."""
+    if structural_graph is None:
+        return jsonify({'error': 'Structural graph disabled'}), 503
+    denied = _admin_denied()
+    if denied:
+        return denied
+    body = request.get_json(silent=True) or {}
+    if not isinstance(body, dict):
+        return jsonify({'error': 'Expected a JSON object'}), 400
+    post_id = body.get('postId') or body.get('post_id')
+    if not post_id or not isinstance(post_id, str):
+        return jsonify({'error': 'Missing postId'}), 400
+    domains, links, user_id = body.get('domains', []), body.get('links', []), body.get('userId')
+    if not _is_str_list(domains) or not _is_str_list(links):
+        return jsonify({'error': 'domains and links must be lists of strings'}), 400
+    if user_id is not None and not isinstance(user_id, str):
+        return jsonify({'error': 'userId must be a string'}), 400
+    hosts = set(domains) | {host_of(u) for u in links if u}
+    added = structural_graph.append(post_edges(post_id, sorted(hosts), user_id=user_id))
+    return jsonify({'status': 'ok', 'edges_added': added})
+
+@app.route('/graph_click', methods=['POST'])
+def graph_click():
+    if structural_graph is None:
+        return jsonify({'error': 'Structural graph disabled'}), 503
+    denied = _admin_denied()
+    if denied:
+        return denied
+    body = request.get_json(silent=True) or {}
+    if not isinstance(body, dict):
+        return jsonify({'error': 'Expected a JSON object'}), 400
+    domain, user_id = body.get('domain'), body.get('userId')
+    if not domain or not user_id:
+        return jsonify({'error': 'Missing domain or userId'}), 400
+    if not isinstance(domain, str) or not isinstance(user_id, str):
+        return jsonify({'error': 'domain and userId must be strings'}), 400
+    added = structural_graph.append([(user_node(user_id), domain_node(domain), 'click')])
+    return jsonify({'status': 'ok', 'edges_added': added})
 
 if __name__ == "__main__":
+    if fs_writer is not None:
+        fs_writer.start()
     app.run(host="0.0.0.0", port=80)
 
@@ -1,7 +1,7 @@
 // Firebase imports
 import { initializeApp } from "https://www.gstatic.com/firebasejs/11.6.1/firebase-app.js";
 import { getAuth, signInAnonymously, signInWithCustomToken, onAuthStateChanged } from "https://www.gstatic.com/firebasejs/11.6.1/firebase-auth.js";
-import { getFirestore, doc, getDoc, addDoc, setDoc, updateDoc, deleteDoc, onSnapshot, collection, query, where, getDocs } from "https://www.gstatic.com/firebasejs/11.6.1/firebase-firestore.js";
+import { getFirestore, doc, getDoc, addDoc, setDoc, updateDoc, deleteDoc, onSnapshot, collection, query, where, getDocs, serverTimestamp } from "https://www.gstatic.com/firebasejs/11.6.1/firebase-firestore.js";
 
 // Global Firebase variables (provided by Canvas environment)
   // background.js
@@ -103,7 +103,7 @@ async function upsertGraphNode(nodeId, data) {
     if (!colRef) return false;
     try {
         const nodeRef = doc(db, `artifacts/${appId}/private/graph/nodes/${nodeId}`);
-        await setDoc(nodeRef, { ...data, updatedAt: new Date() }, { merge: true });
+        await setDoc(nodeRef, { ...data, updatedAt: new Date(), writtenAt: serverTimestamp() }, { merge: true });
         return true;
     } catch (e) {
         console.error('Firestore: upsert node failed', e);
@@ -115,7 +115,7 @@ async function addGraphEdge(edge) {
     const colRef = getGraphEdgesCollectionRef();
     if (!colRef) return false;
     try {
-        await addDoc(colRef, { ...edge, userId, ts: new Date() });
+        await addDoc(colRef, { ...edge, userId, ts: new Date(), writtenAt: serverTimestamp() });
         return true;
     } catch (e) {
         console.error('Firestore: add edge failed', e);
@@ -144,7 +144,8 @@ async function addUserReport(type, payload) {
             type,
             payload,
             userId: userId || 'anon',
-            timestamp: new Date()
+            timestamp: new Date(),
+            writtenAt: serverTimestamp()
         });
         return true;
     } catch (e) {
@@ -180,6 +181,7 @@ async function addFlaggedLink(linkUrl, detectedByUserId) {
         await addDoc(collectionRef, {
             url: linkUrl,
             timestamp: new Date(),
+            writtenAt: serverTimestamp(), // set by Firestore; the export checkpoints on it
             userId: detectedByUserId || 'anon' // Store which user flagged it
         });
         console.log(`Firestore: Added flagged link: ${linkUrl}`);
@@ -239,23 +241,70 @@ async function serverReport(rtype, payload) {
     }
 }
 
+// Set from Retry-After when the server sheds load (429/503); no scoring calls until it passes,
+// so an overloaded backend isn't hit again with per-link fallbacks
+let backendBackoffUntil = 0;
+
+function backendBackingOff() {
+    return Date.now() < backendBackoffUntil;
+}
+
+function noteBackendOverload(response) {
+    if (response.status !== 429 && response.status !== 503) return false;
+    const seconds = parseInt(response.headers.get('Retry-After') || '', 10);
+    backendBackoffUntil = Date.now() + (Number.isFinite(seconds) ? seconds : 5) * 1000;
+    return true;
+}
+
+class BackendOverloadedError extends Error {}
+
+// max_items from a 413 (request over the server's per-request item limit), or null
+async function itemLimitOf(response) {
+    if (response.status !== 413) return null;
+    try {
+        const limit = parseInt((await response.json()).max_items, 10);
+        return limit > 0 ? limit : null;
+    } catch (e) {
+        return null;
+    }
+}
+
+function chunked(list, size) {
+    const chunks = [];
+    for (let i = 0; i < list.length; i += size) chunks.push(list.slice(i, i + size));
+    return chunks;
+}
+
+function mergeVerdicts(verdicts) {
+    const flaggedLinks = verdicts.flatMap(v => v.flaggedLinks || []);
+    const merged = { isPhishing: flaggedLinks.length > 0, flaggedLinks };
+    if (verdicts.some(v => v.degraded)) {
+        merged.degraded = true;
+        merged.provisionalLinks = verdicts.flatMap(v => v.provisionalLinks || []);
+    }
+    return merged;
+}
+
 async function getBackendPredictionForLink(url, postId) {
     try {
         const urlLower = String(url || '').toLowerCase();
         const cached = getCachedPrediction(urlLower);
         if (cached) return { is_phishing: !!cached.is_phishing };
+        if (backendBackingOff()) return { is_phishing: false };
         const response = await fetch(`${API_BASE_URL}/predict`, {
             method: 'POST',
             headers: { 'Content-Type': 'application/json' },
             body: JSON.stringify({ url, post_id: postId })
         });
+        if (noteBackendOverload(response)) return { is_phishing: false };
         if (!response.ok) {
             const errText = await response.text();
             console.error('Backend prediction error:', response.status, errText);
             return { is_phishing: false };
         }
         const data = await response.json();
-        setCachedPrediction(urlLower, { is_phishing: !!data.is_phishing });
+        // Degraded (heuristic) answers aren't cached so the model re-scores the link later
+        if (!data.degraded) setCachedPrediction(urlLower, { is_phishing: !!data.is_phishing });
         return data; // { is_phishing: boolean }
     } catch (e) {
         console.error('Network error calling backend /predict:', e);
@@ -263,28 +312,123 @@ async function getBackendPredictionForLink(url, postId) {
     }
 }
 
-// Aggregates per-link predictions using batch endpoint
-async function getMLPrediction(postText, postLinks, postId) {
+// Aggregates per-link predictions using batch endpoint; maxItems splits the links into
+// several batches when the server's per-request limit is known
+async function getMLPrediction(postText, postLinks, postId, maxItems = null) {
     try {
         if (!postLinks || postLinks.length === 0) {
             return { isPhishing: false, flaggedLinks: [] };
         }
+        if (backendBackingOff()) return { isPhishing: false, flaggedLinks: [] };
+        if (maxItems && postLinks.length > maxItems) {
+            const parts = await Promise.all(chunked(postLinks, maxItems).map(links => getMLPrediction(postText, links, postId, maxItems)));
+            return mergeVerdicts(parts);
+        }
         const items = postLinks.map((url) => ({ url, post_id: postId }));
         const response = await fetch(`${API_BASE_URL}/predict_batch`, {
             method: 'POST', headers: { 'Content-Type': 'application/json' },
             body: JSON.stringify({ items })
         });
+        if (noteBackendOverload(response)) throw new BackendOverloadedError(`batch status ${response.status}`);
+        const limit = await itemLimitOf(response);
+        if (limit && limit < postLinks.length) return getMLPrediction(postText, postLinks, postId, limit);
         if (!response.ok) throw new Error(`batch status ${response.status}`);
         const data = await response.json();
-        const flagged = (data.predictions || []).filter(p => p.is_phishing).map(p => p.url);
+        const predictions = data.predictions || [];
+        // Heuristic (degraded) hits are provisional: only model or known-bad verdicts flag a post
+        const flagged = predictions.filter(p => p.is_phishing && (!p.degraded || p.known_bad)).map(p => p.url);
+        const provisional = predictions.filter(p => p.is_phishing && p.degraded && !p.known_bad).map(p => p.url);
         // Update cache for each url
-        (data.predictions || []).forEach(p => setCachedPrediction(String(p.url || '').toLowerCase(), { is_phishing: !!p.is_phishing }));
-        return { isPhishing: flagged.length > 0, flaggedLinks: flagged };
+        predictions.filter(p => !p.degraded).forEach(p => setCachedPrediction(String(p.url || '').toLowerCase(), { is_phishing: !!p.is_phishing }));
+        return { isPhishing: flagged.length > 0, flaggedLinks: flagged, degraded: !!data.degraded, provisionalLinks: provisional };
     } catch (e) {
+        if (e instanceof BackendOverloadedError) {
+            console.warn('Backend overloaded, skipping per-link fallback', e);
+            return { isPhishing: false, flaggedLinks: [] };
+        }
         console.warn('Batch prediction failed, falling back per-link', e);
         const results = await Promise.all(postLinks.map(async (link) => ({ link, res: await getBackendPredictionForLink(link, postId) })));
-        const flaggedLinks = results.filter(({ res }) => !!res && res.is_phishing).map(({ link }) => link);
-        return { isPhishing: flaggedLinks.length > 0, flaggedLinks };
+        const hits = results.filter(({ res }) => !!res && res.is_phishing);
+        const flaggedLinks = hits.filter(({ res }) => !res.degraded || res.known_bad).map(({ link }) => link);
+        const provisionalLinks = hits.filter(({ res }) => res.degraded && !res.known_bad).map(({ link }) => link);
+        return { isPhishing: flaggedLinks.length > 0, flaggedLinks, degraded: results.some(({ res }) => !!res && res.degraded), provisionalLinks };
+    }
+}
+
+// Scores all posts of a scan in one request; links are deduplicated server-side
+// Returns Map postId -> { isPhishing, flaggedLinks }, falling back to per-post batches on failure
+async function scanPosts(posts) {
+    const withLinks = posts.filter(p => p.links && p.links.length > 0);
+    const verdicts = new Map();
+    posts.filter(p => !p.links || p.links.length === 0).forEach(p => verdicts.set(p.id, { isPhishing: false, flaggedLinks: [] }));
+    if (withLinks.length === 0) return verdicts;
+    if (backendBackingOff()) {
+        withLinks.forEach(p => verdicts.set(p.id, { isPhishing: false, flaggedLinks: [] }));
+        return verdicts;
+    }
+    try {
+        const response = await fetch(`${API_BASE_URL}/scan_posts`, {
+            method: 'POST', headers: { 'Content-Type': 'application/json' },
+            body: JSON.stringify({ posts: withLinks.map(p => ({ post_id: p.id, links: p.links })) })
+        });
+        if (noteBackendOverload(response)) throw new BackendOverloadedError(`scan_posts status ${response.status}`);
+        if (response.status === 413) {
+            // Over the server's per-request item limit: rescan in groups of at most max_items
+            // links; a post with more links than that alone goes through split /predict_batch calls
+            const limit = await itemLimitOf(response);
+            const groups = [];
+            let group = [], groupLinks = 0;
+            for (const post of withLinks) {
+                if (limit && post.links.length > limit) {
+                    groups.push([post]);
+                    continue;
+                }
+                if (group.length && (!limit || groupLinks + post.links.length > limit)) {
+                    groups.push(group);
+                    group = [];
+                    groupLinks = 0;
+                }
+                group.push(post);
+                groupLinks += post.links.length;
+            }
+            if (group.length) groups.push(group);
+            if (!limit && groups.length === 1) throw new Error('scan_posts status 413');
+            await Promise.all(groups.map(async (g) => {
+                if (g.length === 1 && limit && g[0].links.length > limit) {
+                    verdicts.set(g[0].id, await getMLPrediction(g[0].text, g[0].links, g[0].id, limit));
+                } else {
+                    (await scanPosts(g)).forEach((v, k) => verdicts.set(k, v));
+                }
+            }));
+            return verdicts;
+        }
+        if (!response.ok) throw new Error(`scan_posts status ${response.status}`);
+        const data = await response.json();
+        (data.results || []).forEach(r => {
+            const links = r.flagged_links || [];
+            if (r.degraded) {
+                // Heuristic hits are provisional: only known-bad links flag a degraded post
+                const knownBad = new Set(r.known_bad_links || []);
+                const flagged = links.filter(url => knownBad.has(url));
+                verdicts.set(r.post_id, { isPhishing: flagged.length > 0, flaggedLinks: flagged, degraded: true,
+                                          provisionalLinks: links.filter(url => !knownBad.has(url)) });
+                return;
+            }
+            verdicts.set(r.post_id, { isPhishing: !!r.is_phishing, flaggedLinks: links });
+            links.forEach(url => setCachedPrediction(String(url).toLowerCase(), { is_phishing: true }));
+        });
+        return verdicts;
+    } catch (e) {
+        if (e instanceof BackendOverloadedError) {
+            console.warn('Backend overloaded, skipping per-post fallback', e);
+            withLinks.forEach(p => verdicts.set(p.id, { isPhishing: false, flaggedLinks: [] }));
+            return verdicts;
+        }
+        console.warn('scan_posts failed, falling back per-post', e);
+        await Promise.all(withLinks.map(async (post) => {
+            verdicts.set(post.id, await getMLPrediction(post.text, post.links, post.id));
+        }));
+        return verdicts;
     }
 }
 
@@ -314,8 +458,8 @@ chrome.runtime.onMessage.addListener((request, sender, sendResponse) => {
     } else if (request.action === "analyzePosts") {
         // Message from content_script.js with extracted post data
         console.log("Background script: Received posts for analysis:", request.posts.length);
-        request.posts.forEach(async (post) => {
-            const prediction = await getMLPrediction(post.text, post.links, post.id);
+        scanPosts(request.posts).then((verdicts) => request.posts.forEach(async (post) => {
+            const prediction = verdicts.get(post.id) || { isPhishing: false, flaggedLinks: [] };
             if (prediction.isPhishing) {
                 console.warn(`Phishing detected in post ${post.id}! Links: ${post.links.join(', ')}`);
                 // Store the flagged link in Firestore
@@ -329,6 +473,12 @@ chrome.runtime.onMessage.addListener((request, sender, sendResponse) => {
                         chrome.tabs.sendMessage(tabs[0].id, { action: "blurPost", postId: post.id });
                     }
                 });
+            } else if (prediction.degraded) {
+                // Scored without the model while the server was busy: neither store, blur nor
+                // unblur on that; the next scan re-scores the post (degraded results aren't cached)
+                if (prediction.provisionalLinks && prediction.provisionalLinks.length) {
+                    console.info(`Provisional (degraded) hit in post ${post.id}: ${prediction.provisionalLinks.join(', ')}`);
+                }
             } else {
                 // Unblur if previously blurred by a heuristic (now disabled) or prior run
                 chrome.tabs.query({ active: true, currentWindow: true }, (tabs) => {
@@ -337,7 +487,7 @@ chrome.runtime.onMessage.addListener((request, sender, sendResponse) => {
                     }
                 });
             }
-        });
+        }));
         sendResponse({ status: "processing" }); // Acknowledge receipt
         return true;
     } else if (request.action === 'reportFalsePositive') {
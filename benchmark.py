@@ -0,0 +1,268 @@
+"""Reproducible benchmarks for the scoring pipeline and HTTP endpoints.
+
+    python benchmark.py -o bench.json                      # all stages, default batch sizes
+    python benchmark.py --sizes 1,100,10000 --stages endpoint_predict_batch
+    python benchmark.py -o new.json --compare bench.json   # print p50 / throughput deltas
+
+Each stage is timed in isolation on a seeded synthetic URL corpus for every batch size:
+_compute_lexical_subset, extract_features_for_urls, extract_feature_matrix, scaler.transform,
+autoencoder inference (and the folded plan when loaded), the GNN lookup, and /predict and
+/predict_batch end to end through the Flask test client. Results (p50/p99 latency per call,
+URLs/sec, peak traced memory per call) are written as JSON so runs can be compared across
+commits. The prediction cache is disabled unless --with-cache is given.
+"""
+import argparse
+import contextlib
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import time
+import tracemalloc
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+DEFAULT_SIZES = [1, 10, 100, 1000, 10000]
+STAGES = [
+    "lexical_subset",
+    "extract_features_for_urls",
+    "extract_feature_matrix",
+    "scaler_transform",
+    "autoencoder",
+    "folded_plan",
+    "gnn_lookup",
+    "endpoint_predict",
+    "endpoint_predict_batch",
+]
+
+_HOSTS = [
+    "bit.ly", "tinyurl.com", "t.co", "www.abs-cbn.com", "news.example.co.uk", "m.facebook.com",
+    "secure-login.account-verify.com", "192.168.10.24", "shop.xn--80ak6aa92e.com", "cdn.static-files.net",
+    "gcash-promo.weebly.com", "www.gmanetwork.com", "l.facebook.com", "drive.google.com",
+]
+_WORDS = ["login", "verify", "news", "regions", "promo", "account", "update", "2025", "index",
+          "gift", "secure", "photo", "watch", "story", "claim", "free", "bank", "wallet"]
+
+
+def synthetic_urls(n, seed=0):
+    """Deterministic corpus mixing shorteners, news links, IP hosts, tracking params and odd characters."""
+    rng = random.Random(seed)
+    urls = []
+    for i in range(n):
+        host = rng.choice(_HOSTS)
+        depth = rng.randint(0, 6)
+        path = "/".join(rng.choice(_WORDS) + rng.choice(["", "-", "_", "."]) + str(rng.randint(0, 999)) for _ in range(depth))
+        if rng.random() < 0.3:
+            path += rng.choice([".html", ".php", "/", "~user", "@x", "%20doc"])
+        query = []
+        if rng.random() < 0.5:
+            query.append(f"fbclid=IwAR{rng.getrandbits(64):x}")
+        if rng.random() < 0.3:
+            query.append(f"utm_source={rng.choice(_WORDS)}&utm_medium=social")
+        if rng.random() < 0.4:
+            query.append(f"id={i}&ref={rng.choice(_WORDS)}")
+        url = f"{rng.choice(['https', 'http'])}://{host}/{path}"
+        if query:
+            url += "?" + "&".join(query)
+        if rng.random() < 0.05:
+            url += "#" + rng.choice(_WORDS)
+        urls.append(url)
+    return urls
+
+
+def _percentile(sorted_vals, q):
+    if not sorted_vals:
+        return None
+    k = min(len(sorted_vals) - 1, max(0, int(round(q / 100.0 * (len(sorted_vals) - 1)))))
+    return sorted_vals[k]
+
+
+def time_stage(fn, batch_size, repeats, warmup=1):
+    """Call fn() repeatedly; returns latency percentiles (ms), throughput and peak traced memory."""
+    for _ in range(warmup):
+        fn()
+    times = []
+    for _ in range(repeats):
+        t0 = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - t0)
+    # Memory is measured on a separate call so tracing overhead doesn't skew the timings
+    tracemalloc.start()
+    fn()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    times.sort()
+    total = sum(times)
+    return {
+        "batch_size": batch_size,
+        "repeats": repeats,
+        "p50_ms": _percentile(times, 50) * 1000.0,
+        "p99_ms": _percentile(times, 99) * 1000.0,
+        "mean_ms": total / len(times) * 1000.0,
+        "urls_per_sec": (batch_size * len(times) / total) if total > 0 else None,
+        "peak_mem_mb": peak / (1024.0 * 1024.0),
+    }
+
+
+def _repeats_for(size, budget):
+    return max(3, min(200, budget // max(1, size)))
+
+
+def _git_commit():
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], cwd=HERE, stderr=subprocess.DEVNULL).decode().strip()
+    except Exception:
+        return None
+
+
+def build_stage_fns(app, stage, urls, post_ids):
+    """Return a zero-argument callable for stage over urls/post_ids, or None if unavailable."""
+    bundle = app.models
+    client = app.app.test_client()
+    if stage == "lexical_subset":
+        return lambda: [app._compute_lexical_subset(u) for u in urls]
+    if stage == "extract_features_for_urls":
+        return lambda: app.extract_features_for_urls(urls)
+    if stage == "extract_feature_matrix":
+        return lambda: app.extract_feature_matrix(urls)
+    if stage == "scaler_transform":
+        feats = app.extract_feature_matrix(urls)
+        return lambda: bundle.scaler.transform(feats)
+    if stage == "autoencoder":
+        scaled = bundle.scaler.transform(app.extract_feature_matrix(urls))
+        return lambda: bundle.autoencoder_model.predict(scaled, verbose=0)
+    if stage == "folded_plan":
+        if bundle.inference_plan is None:
+            return None
+        active = bundle.feature_builder().transform(urls, active_only=True)
+        return lambda: bundle.inference_plan.reconstruction_errors(active)
+    if stage == "gnn_lookup":
+        if bundle.gnn_index is None:
+            return None
+        return lambda: bundle.gnn_index.lookup(post_ids)
+    if stage == "endpoint_predict":
+        def call():
+            for u, pid in zip(urls, post_ids):
+                r = client.post("/predict", json={"url": u, "post_id": pid})
+                if r.status_code != 200:
+                    raise RuntimeError(r.get_data(as_text=True))
+        return call
+    if stage == "endpoint_predict_batch":
+        body = {"items": [{"url": u, "post_id": pid} for u, pid in zip(urls, post_ids)]}
+        def call():
+            r = client.post("/predict_batch", json=body)
+            if r.status_code != 200:
+                raise RuntimeError(r.get_data(as_text=True))
+        return call
+    raise ValueError(f"Unknown stage: {stage}")
+
+
+def _post_id_pool():
+    path = os.path.join(HERE, "post_node_map.json")
+    known = []
+    if os.path.exists(path):
+        with open(path) as f:
+            known = list(json.load(f))
+    # Half known posts (when available), half unseen ones
+    return known + [f"post-unseen-{i}" for i in range(max(len(known), 100))]
+
+
+def run(stages, sizes, seed=0, budget=20000, with_cache=False, max_endpoint_predict=1000):
+    if not with_cache:
+        os.environ["PREDICTION_CACHE_SIZE"] = "0"
+    # The serving limits would answer the larger sizes with 413s; the benchmark measures the
+    # scoring path itself, so lift them to the largest size being run
+    for var, default in (("MAX_BATCH_ITEMS", 1000), ("MAX_INFLIGHT_ROWS", 2048)):
+        if 0 < int(os.environ.get(var, default)) < max(sizes):
+            os.environ[var] = str(max(sizes))
+    # Model loading and per-request diagnostics print to stdout; keep them out of the report
+    with contextlib.redirect_stdout(sys.stderr):
+        import app
+    if app.models is None:
+        raise RuntimeError(f"Models not ready: {app.MODEL_LOAD_ERROR}")
+
+    corpus = synthetic_urls(max(sizes), seed=seed)
+    rng = random.Random(seed + 1)
+    pool = _post_id_pool()
+    post_ids = [rng.choice(pool) for _ in corpus]
+
+    results = []
+    for stage in stages:
+        for size in sizes:
+            if stage == "endpoint_predict" and size > max_endpoint_predict:
+                continue  # one request per URL; large sizes only measure the same thing for longer
+            fn = build_stage_fns(app, stage, corpus[:size], post_ids[:size])
+            if fn is None:
+                continue
+            with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+                res = time_stage(fn, size, _repeats_for(size, budget))
+            res["stage"] = stage
+            results.append(res)
+            print(f"{stage:28s} n={size:<6d} p50={res['p50_ms']:9.3f}ms p99={res['p99_ms']:9.3f}ms "
+                  f"{res['urls_per_sec'] or 0:12.0f} urls/s peak={res['peak_mem_mb']:.2f}MB", file=sys.stderr)
+
+    bundle = app.models
+    return {
+        "meta": {
+            "commit": _git_commit(),
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+            "ae_backend": getattr(bundle.autoencoder_model, "backend", None),
+            "folded_plan": bundle.inference_plan is not None,
+            "prediction_cache": bool(with_cache),
+            "seed": seed,
+            "sizes": sizes,
+        },
+        "results": results,
+    }
+
+
+def compare(new, old):
+    """Print per (stage, batch size) p50 and throughput changes of new vs old."""
+    old_idx = {(r["stage"], r["batch_size"]): r for r in old.get("results", [])}
+    print(f"{'stage':28s} {'n':>6s} {'p50 old':>10s} {'p50 new':>10s} {'change':>8s} {'urls/s change':>14s}")
+    for r in new.get("results", []):
+        o = old_idx.get((r["stage"], r["batch_size"]))
+        if o is None:
+            continue
+        change = (r["p50_ms"] / o["p50_ms"] - 1.0) * 100.0 if o["p50_ms"] else 0.0
+        tput = ((r["urls_per_sec"] or 0) / o["urls_per_sec"] - 1.0) * 100.0 if o.get("urls_per_sec") else 0.0
+        print(f"{r['stage']:28s} {r['batch_size']:6d} {o['p50_ms']:10.3f} {r['p50_ms']:10.3f} {change:+7.1f}% {tput:+13.1f}%")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the scoring pipeline and endpoints.")
+    parser.add_argument("-o", "--output", help="Write the JSON report here (default: stdout)")
+    parser.add_argument("--sizes", default=",".join(map(str, DEFAULT_SIZES)), help="Comma-separated batch sizes")
+    parser.add_argument("--stages", default=",".join(STAGES), help="Comma-separated stages to run")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--budget", type=int, default=20000, help="Approximate URLs processed per stage and size")
+    parser.add_argument("--with-cache", action="store_true", help="Keep the prediction cache enabled")
+    parser.add_argument("--compare", help="Earlier JSON report to compare against")
+    args = parser.parse_args(argv)
+
+    sizes = sorted({int(s) for s in args.sizes.split(",") if s.strip()})
+    stages = [s.strip() for s in args.stages.split(",") if s.strip()]
+    unknown = [s for s in stages if s not in STAGES]
+    if unknown:
+        parser.error(f"unknown stages: {', '.join(unknown)} (choose from {', '.join(STAGES)})")
+
+    report = run(stages, sizes, seed=args.seed, budget=args.budget, with_cache=args.with_cache)
+    text = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(text + "\n")
+    else:
+        print(text)
+    if args.compare:
+        with open(args.compare) as f:
+            compare(report, json.load(f))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,90 @@
+"""Stream-score an NDJSON dump of {url, post_id} lines (e.g. a crawled link dump).
+
+    python bulk_score.py links.jsonl -o scored.jsonl --chunk-size 2048 --workers 4
+    cat links.jsonl | python bulk_score.py - > scored.jsonl
+
+Input is read and scored CHUNK lines at a time through the same feature -> scaler ->
+autoencoder -> GNN fusion path as /predict_batch, and results are written as NDJSON in
+input order as soon as each chunk is done. With --workers > 1, chunks fan out over a process
+pool with a bounded number in flight, so memory stays flat regardless of input size.
+"""
+import argparse
+import collections
+import contextlib
+import multiprocessing
+import os
+import sys
+import time
+
+
+def _read_chunks(f, chunk_size):
+    chunk, first = [], 1
+    for n, line in enumerate(f, start=1):
+        chunk.append(line)
+        if len(chunk) >= chunk_size:
+            yield first, chunk
+            chunk, first = [], n + 1
+    if chunk:
+        yield first, chunk
+
+
+def _init_worker():
+    # Each pool process loads its own models (spawned, so TensorFlow is safe too). Load-time
+    # messages go to stderr so they can't end up in NDJSON written to stdout.
+    with contextlib.redirect_stdout(sys.stderr):
+        import app  # noqa: F401
+
+
+def _score_chunk(args):
+    first, lines = args
+    import app
+    return len(lines), app.score_ndjson_chunk(lines, first)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Bulk-score NDJSON {url, post_id} lines.")
+    parser.add_argument("input", help="NDJSON input file, or - for stdin")
+    parser.add_argument("-o", "--output", default="-", help="NDJSON output file, or - for stdout (default)")
+    parser.add_argument("--chunk-size", type=int, default=2048)
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    args = parser.parse_args(argv)
+
+    fin = sys.stdin if args.input == "-" else open(args.input, "r", encoding="utf-8", errors="replace")
+    fout = sys.stdout if args.output == "-" else open(args.output, "w", encoding="utf-8")
+    chunks = _read_chunks(fin, max(1, args.chunk_size))
+    t0 = time.perf_counter()
+    lines_done = 0
+    try:
+        if args.workers <= 1:
+            _init_worker()
+            for chunk in chunks:
+                n, out = _score_chunk(chunk)
+                fout.write(out)
+                lines_done += n
+        else:
+            ctx = multiprocessing.get_context("spawn")
+            with ctx.Pool(args.workers, initializer=_init_worker) as pool:
+                # Keep at most 2 chunks per worker in flight so input is never read ahead unbounded
+                pending = collections.deque()
+                for chunk in chunks:
+                    pending.append(pool.apply_async(_score_chunk, (chunk,)))
+                    if len(pending) >= args.workers * 2:
+                        n, out = pending.popleft().get()
+                        fout.write(out)
+                        lines_done += n
+                while pending:
+                    n, out = pending.popleft().get()
+                    fout.write(out)
+                    lines_done += n
+    finally:
+        if fin is not sys.stdin:
+            fin.close()
+        if fout is not sys.stdout:
+            fout.close()
+    elapsed = time.perf_counter() - t0
+    print(f"✅ Scored {lines_done} lines in {elapsed:.1f}s ({lines_done / max(elapsed, 1e-9):.0f} lines/s)", file=sys.stderr)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,416 @@
+"""Incremental export of the extension's feedback collections for retraining.
+
+    python data_pipeline/export_feedback.py --app-id my-app --include-flagged --output feedback_dataset.csv
+    LOCAL_FIRESTORE_DIR=/tmp/fs python data_pipeline/export_feedback.py --app-id dev --update-gnn --gnn-dir /tmp/gnn
+
+Each collection is read in pages of --page-size documents ordered by writtenAt, the
+server-side write time every writer sets with SERVER_TIMESTAMP, starting after the
+checkpoint left by the previous run (last write time + document ID per collection in
+<out-dir>/_checkpoints.json, saved after every page), so only documents written or updated
+since then are read, whatever the writing client's clock said. Documents from before
+writtenAt existed are read once, on the first run (or --full), by their client timestamp;
+anything still written without it (older extension versions) is only picked up by --full.
+Every page lands in date partitions:
+
+    <out-dir>/<collection>/date=YYYY-MM-DD/part-<run>-<page>.parquet   (.csv without pyarrow)
+
+Export is at-least-once: a run that dies between writing a page and saving its checkpoint
+exports that page again next time.
+
+Labelled rows (url, label, source, ...) from user reports, and from flagged links with
+--include-flagged, are appended to --output; the first run (or --full) rewrites it. The
+latest report label per post goes to <out-dir>/post_labels.json for GNN retraining. Graph
+edges are appended to <out-dir>/graph_edges.jsonl, the file the server's structural graph
+loads (GRAPH_EDGES_PATH). With --update-gnn --gnn-dir DIR, unlabelled posts that aren't in
+DIR/post_node_map.json yet get a node index and the structural graph's neighbour estimate
+(with the report labels as evidence) appended to DIR/gnn_probs.npy, and the GNN score index
+is rewritten; existing entries are left as they are. --gnn-dir has no default, so the
+served artifacts are only changed when asked for; run python model_bundle.py build
+afterwards to serve them from the bundle.
+
+--known-bad appends links from user-confirmed reports (false_negative / true_positive) to the
+snapshot the server short-circuits on (KNOWN_BAD_PATH). flagged_phishing_links also holds the
+model's own verdicts, so with --include-flagged those only go to --known-bad-candidates, a
+file for review that the server doesn't read.
+
+Firestore credentials come from GOOGLE_APPLICATION_CREDENTIALS(_JSON); with
+--local-firestore / LOCAL_FIRESTORE_DIR the file-backed stand-in (local_firestore.py) is
+read instead.
+"""
+import argparse
+import csv
+import importlib.util
+import json
+import os
+import sys
+from datetime import datetime, timezone
+
+import numpy as np
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from gnn_index import GnnScoreIndex  # noqa: E402
+from structural_graph import StructuralGraph  # noqa: E402
+
+# Set to SERVER_TIMESTAMP by every writer (the extension and the server's batched writer);
+# the export is ordered and checkpointed by it, so client clocks can't hide documents
+WRITE_TIME_FIELD = "writtenAt"
+# name -> (collection path, client-side timestamp field of documents written before WRITE_TIME_FIELD)
+COLLECTIONS = {
+    "user_reports": ("artifacts/{app_id}/private_user_reports", "timestamp"),
+    "flagged_links": ("artifacts/{app_id}/public/data/flagged_phishing_links", "timestamp"),
+    "graph_nodes": ("artifacts/{app_id}/private/graph/nodes", "updatedAt"),
+    "graph_edges": ("artifacts/{app_id}/private/graph/edges", "ts"),
+}
+REPORT_LABELS = {"false_negative": 1, "true_positive": 1, "false_positive": 0, "true_negative": 0}
+KNOWN_BAD_SOURCES = {"report:false_negative", "report:true_positive"}  # users asserted these links are phishing
+LABEL_COLUMNS = ["url", "label", "source", "post_id", "user_id", "timestamp", "doc_id"]
+CHECKPOINT_FILE = "_checkpoints.json"
+POST_LABELS_FILE = "post_labels.json"  # post ID -> latest report label, for GNN retraining
+
+
+def _to_datetime(value):
+    """Firestore timestamps arrive as datetimes, the local stand-in's as ISO strings."""
+    if isinstance(value, str):
+        try:
+            value = datetime.fromisoformat(value)
+        except ValueError:
+            return None
+    if not isinstance(value, datetime):
+        return None
+    return value if value.tzinfo is not None else value.replace(tzinfo=timezone.utc)
+
+
+def _iso(value):
+    return value.isoformat() if isinstance(value, datetime) else value
+
+
+def make_client(local_dir=None):
+    if local_dir:
+        from local_firestore import LocalFirestoreClient
+        print(f"✅ Reading the local Firestore stand-in at {local_dir}", file=sys.stderr)
+        return LocalFirestoreClient(local_dir)
+    from google.cloud import firestore
+    creds_json = os.environ.get("GOOGLE_APPLICATION_CREDENTIALS_JSON")
+    if creds_json:
+        from google.oauth2 import service_account
+        info = json.loads(creds_json)
+        creds = service_account.Credentials.from_service_account_info(info)
+        return firestore.Client(credentials=creds, project=info.get("project_id"))
+    return firestore.Client()
+
+
+# --- Checkpoints ---
+
+def load_checkpoints(out_dir, app_id):
+    path = os.path.join(out_dir, CHECKPOINT_FILE)
+    if not os.path.exists(path):
+        return None
+    with open(path, "r", encoding="utf-8") as f:
+        state = json.load(f)
+    if state.get("app_id") != app_id:
+        raise SystemExit(f"❌ {path} belongs to app {state.get('app_id')!r}, not {app_id!r}; use another --out-dir or --full.")
+    return state
+
+
+def save_checkpoints(out_dir, state):
+    path = os.path.join(out_dir, CHECKPOINT_FILE)
+    tmp = f"{path}.tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(state, f, indent=2, sort_keys=True)
+    os.replace(tmp, path)
+
+
+# --- Reading ---
+
+def iter_pages(collection, field, page_size, after=None, after_id=None):
+    """Yield pages of (doc_id, data, timestamp) ordered by field, strictly after (after, after_id).
+
+    Documents without the field are skipped (Firestore leaves them out of ordered queries).
+    Within a run, pages continue from the last snapshot with start_after; across runs the
+    query restarts at the checkpoint timestamp and drops the documents up to after_id that
+    share it, since ties are ordered by document ID.
+    """
+    query = collection.order_by(field)
+    if after is not None:
+        query = query.where(field, ">=", after)
+    last = None
+    while True:
+        page_query = query if last is None else query.start_after(last)
+        snaps = list(page_query.limit(page_size).stream())
+        if not snaps:
+            return
+        last = snaps[-1]
+        page = []
+        for snap in snaps:
+            data = snap.to_dict() or {}
+            ts = _to_datetime(data.get(field))
+            if ts is None:
+                continue
+            if after is not None and ts == after and after_id is not None and snap.id <= after_id:
+                continue
+            page.append((snap.id, data, ts))
+        if page:
+            yield page
+        if len(snaps) < page_size:
+            return
+
+
+# --- Writing ---
+
+def _flatten(doc_id, data, ts):
+    row = {"doc_id": doc_id, "export_ts": ts.isoformat()}
+    for k, v in data.items():
+        if isinstance(v, (dict, list)):
+            v = json.dumps(v, default=str, sort_keys=True)
+        elif isinstance(v, datetime):
+            v = v.isoformat()
+        row[k] = v
+    return row
+
+
+def resolve_format(fmt):
+    if fmt == "auto":
+        return "parquet" if importlib.util.find_spec("pyarrow") is not None else "csv"
+    return fmt
+
+
+def _write_rows(path, rows, fmt):
+    tmp = f"{path}.tmp"
+    if fmt == "parquet":
+        import pandas as pd
+        pd.DataFrame(rows).to_parquet(tmp, index=False)
+    else:
+        columns = list(dict.fromkeys(k for row in rows for k in row))
+        with open(tmp, "w", encoding="utf-8", newline="") as f:
+            writer = csv.DictWriter(f, fieldnames=columns)
+            writer.writeheader()
+            writer.writerows(rows)
+    os.replace(tmp, path)
+
+
+def write_partitions(out_dir, name, page, run_id, page_no, fmt):
+    """Write one page as one part file per date partition. Returns the paths written."""
+    by_date = {}
+    for doc_id, data, ts in page:
+        by_date.setdefault(ts.strftime("%Y-%m-%d"), []).append(_flatten(doc_id, data, ts))
+    paths = []
+    for date, rows in sorted(by_date.items()):
+        part_dir = os.path.join(out_dir, name, f"date={date}")
+        os.makedirs(part_dir, exist_ok=True)
+        path = os.path.join(part_dir, f"part-{run_id}-{page_no:05d}.{fmt}")
+        _write_rows(path, rows, fmt)
+        paths.append(path)
+    return paths
+
+
+def label_rows(name, doc_id, data, ts):
+    """Training rows for a report or flagged-link document (empty for anything else)."""
+    if name == "user_reports":
+        label = REPORT_LABELS.get(data.get("type"))
+        payload = data.get("payload") or {}
+        if label is None or not isinstance(payload, dict):
+            return []
+        urls = payload.get("links") or ([payload["url"]] if payload.get("url") else [])
+        source = f"report:{data['type']}"
+        post_id = payload.get("postId") or ""
+    elif name == "flagged_links":
+        label, urls, source, post_id = 1, [data.get("url")], "flagged", ""
+    else:
+        return []
+    return [
+        {"url": u, "label": label, "source": source, "post_id": post_id, "user_id": data.get("userId") or "",
+         "timestamp": ts.isoformat(), "doc_id": doc_id}
+        for u in urls if isinstance(u, str) and u
+    ]
+
+
+def _append_jsonl(path, records):
+    if records:
+        with open(path, "a", encoding="utf-8") as f:
+            f.writelines(json.dumps(r, default=str) + "\n" for r in records)
+
+
+# --- GNN artifacts ---
+
+def _save_npy(path, arr):
+    tmp = f"{path}.tmp"
+    with open(tmp, "wb") as f:
+        np.save(f, arr)
+    os.replace(tmp, path)
+
+
+def save_post_labels(path, post_labels):
+    """Merge post_labels (post ID -> latest report label) into the JSON object at path; returns the result."""
+    merged = {}
+    if os.path.exists(path):
+        with open(path, "r", encoding="utf-8") as f:
+            merged = json.load(f)
+    merged.update(post_labels)
+    tmp = f"{path}.tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(merged, f, sort_keys=True)
+    os.replace(tmp, path)
+    return merged
+
+
+def update_gnn(gnn_dir, edges_path, post_labels, prior_weight=1.0):
+    """Append graph-scored posts missing from post_node_map.json to gnn_probs.npy and rewrite the score index.
+
+    post_labels maps post IDs to report labels (0/1). They only count as evidence for their
+    neighbours: gnn_probs.npy holds model probabilities, so labelled posts themselves are left
+    for the next GNN training run. Unlabelled new posts are scored from their neighbours in the
+    graph built from edges_path and only added when the graph has some. Returns the number of
+    posts added.
+    """
+    map_path = os.path.join(gnn_dir, "post_node_map.json")
+    probs_path = os.path.join(gnn_dir, "gnn_probs.npy")
+    post_node_map = {}
+    if os.path.exists(map_path):
+        with open(map_path, "r", encoding="utf-8") as f:
+            post_node_map = json.load(f)
+    probs = np.load(probs_path).astype(np.float32).reshape(-1) if os.path.exists(probs_path) else np.zeros(0, np.float32)
+    index = GnnScoreIndex.from_node_map(post_node_map, probs)
+
+    labelled = {pid: float(lbl) for pid, lbl in post_labels.items() if pid and pid not in post_node_map}
+
+    def lookup(post_ids):
+        out = index.lookup(post_ids, default=np.nan)
+        for i, pid in enumerate(post_ids):
+            if pid in labelled:
+                out[i] = labelled[pid]
+        return out
+
+    graph = StructuralGraph(prob_lookup=lookup, prior_weight=prior_weight)
+    candidates = []
+    if os.path.exists(edges_path):
+        graph.load_edges_jsonl(edges_path)
+        with open(edges_path, "r", encoding="utf-8") as f:
+            for line in f:
+                if line.strip():
+                    rec = json.loads(line)
+                    for node in (rec.get("src"), rec.get("dst")):
+                        if isinstance(node, str) and node.startswith("post:"):
+                            candidates.append(node[len("post:"):])
+    candidates = [pid for pid in dict.fromkeys(candidates) if pid not in post_node_map and pid not in labelled]
+    scores = graph.score(candidates) if candidates else np.zeros(0)
+    new = {pid: float(s) for pid, s in zip(candidates, scores.tolist()) if s == s}
+    if not new:
+        return 0
+    start = len(probs)
+    probs = np.concatenate([probs, np.asarray(list(new.values()), dtype=np.float32)])
+    for offset, pid in enumerate(new):
+        post_node_map[pid] = start + offset
+    _save_npy(probs_path, probs)
+    tmp = f"{map_path}.tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(post_node_map, f)
+    os.replace(tmp, map_path)
+    GnnScoreIndex.from_node_map(post_node_map, probs).save(gnn_dir, map_path, probs_path)
+    return len(new)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Incrementally export feedback collections for retraining.")
+    parser.add_argument("--app-id", default=os.environ.get("APP_ID"), help="App ID in the Firestore paths (artifacts/{app-id}/...)")
+    parser.add_argument("--include-flagged", action="store_true", help="Export public flagged links as weak positives")
+    parser.add_argument("--output", default="feedback_dataset.csv", help="Labelled dataset CSV (appended to between runs)")
+    parser.add_argument("--out-dir", default="feedback_export", help="Partitions, checkpoints and graph_edges.jsonl")
+    parser.add_argument("--format", choices=("auto", "parquet", "csv"), default="auto", help="Partition format (auto: parquet if pyarrow is installed)")
+    parser.add_argument("--page-size", type=int, default=500)
+    parser.add_argument("--full", action="store_true", help="Ignore checkpoints and export everything again")
+    parser.add_argument("--local-firestore", default=os.environ.get("LOCAL_FIRESTORE_DIR"), help="Read the local stand-in in this directory")
+    parser.add_argument("--known-bad", help="Also append user-confirmed phishing links to this known-bad snapshot (see known_bad.py)")
+    parser.add_argument("--known-bad-candidates", help="Append flagged links (model verdicts included) here for review")
+    parser.add_argument("--update-gnn", action="store_true", help="Add graph-scored new posts to the GNN artifacts in --gnn-dir")
+    parser.add_argument("--gnn-dir", help="Directory with the GNN artifacts to update (required with --update-gnn)")
+    parser.add_argument("--graph-prior-weight", type=float, default=1.0)
+    args = parser.parse_args(argv)
+    if not args.app_id:
+        parser.error("--app-id (or APP_ID) is required")
+    if args.update_gnn and not args.gnn_dir:
+        parser.error(f"--update-gnn needs an explicit --gnn-dir (pass {ROOT} to update the served artifacts)")
+
+    os.makedirs(args.out_dir, exist_ok=True)
+    state = None if args.full else load_checkpoints(args.out_dir, args.app_id)
+    incremental = state is not None
+    state = state or {"app_id": args.app_id, "collections": {}}
+    fmt = resolve_format(args.format)
+    run_id = datetime.now(timezone.utc).strftime("%Y%m%dT%H%M%SZ")
+    edges_path = os.path.join(args.out_dir, "graph_edges.jsonl")
+    labels_path = os.path.join(args.out_dir, POST_LABELS_FILE)
+    if not incremental:
+        for stale in (edges_path, labels_path):
+            if os.path.exists(stale):
+                os.remove(stale)
+
+    db = make_client(args.local_firestore)
+    names = ["user_reports", "graph_nodes", "graph_edges"] + (["flagged_links"] if args.include_flagged else [])
+    post_labels = {}  # post ID -> label of its latest report in this run
+    with open(args.output, "a" if incremental else "w", encoding="utf-8", newline="") as out:
+        labels = csv.DictWriter(out, fieldnames=LABEL_COLUMNS)
+        if out.tell() == 0:
+            labels.writeheader()
+        for name in names:
+            path, legacy_field = COLLECTIONS[name]
+            collection = db.collection(path.format(app_id=args.app_id))
+            checkpoint = state["collections"].get(name, {})
+            exported = label_count = page_no = 0
+            # Documents from before WRITE_TIME_FIELD existed are read once, by their client
+            # timestamp; everything else by the server-side write time
+            passes = [("legacy_", legacy_field)] if not checkpoint.get("legacy_done") else []
+            for prefix, field in passes + [("", WRITE_TIME_FIELD)]:
+                for page in iter_pages(collection, field, args.page_size,
+                                       _to_datetime(checkpoint.get(prefix + "after")), checkpoint.get(prefix + "doc_id")):
+                    last_id, _, last_ts = page[-1]
+                    if prefix:
+                        page = [doc for doc in page if WRITE_TIME_FIELD not in doc[1]]
+                    if page:
+                        write_partitions(args.out_dir, name, page, run_id, page_no, fmt)
+                        page_no += 1
+                    for doc_id, data, ts in page:
+                        rows = label_rows(name, doc_id, data, ts)
+                        labels.writerows(rows)
+                        label_count += len(rows)
+                        if args.known_bad:
+                            _append_jsonl(args.known_bad, [
+                                {"url": r["url"], "source": r["source"], "doc_id": doc_id}
+                                for r in rows if r["source"] in KNOWN_BAD_SOURCES])
+                        if name == "user_reports" and rows and rows[0]["post_id"]:
+                            post_labels[rows[0]["post_id"]] = rows[0]["label"]
+                    if name == "graph_edges":
+                        _append_jsonl(edges_path, [
+                            {"src": d["src"], "dst": d["dst"], "edgeType": d.get("edgeType")}
+                            for _, d, _ in page if d.get("src") and d.get("dst")])
+                    if name == "flagged_links" and args.known_bad_candidates:
+                        _append_jsonl(args.known_bad_candidates, [
+                            {"url": d["url"], "doc_id": doc_id} for doc_id, d, _ in page if d.get("url")])
+                    out.flush()
+                    exported += len(page)
+                    checkpoint = {
+                        **checkpoint,
+                        prefix + "after": last_ts.isoformat(),
+                        prefix + "doc_id": last_id,
+                        "documents": checkpoint.get("documents", 0) + len(page),
+                        "exported_at": datetime.now(timezone.utc).isoformat(),
+                    }
+                    state["collections"][name] = checkpoint
+                    save_checkpoints(args.out_dir, state)
+                if prefix:
+                    checkpoint = {**checkpoint, "legacy_done": True}
+                    state["collections"][name] = checkpoint
+                    save_checkpoints(args.out_dir, state)
+            print(f"✅ {name}: {exported} new documents, {label_count} labelled rows", file=sys.stderr)
+
+    all_labels = save_post_labels(labels_path, post_labels)
+    print(f"✅ Post labels: {len(post_labels)} from this run, {len(all_labels)} in {labels_path}", file=sys.stderr)
+    if args.update_gnn:
+        added = update_gnn(args.gnn_dir, edges_path, all_labels, args.graph_prior_weight)
+        print(f"✅ GNN artifacts: +{added} graph-scored posts in {args.gnn_dir}"
+              + (" (rebuild the model bundle to serve them)" if added else ""), file=sys.stderr)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
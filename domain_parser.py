@@ -0,0 +1,161 @@
+"""Offline public-suffix domain parsing with a bounded per-hostname memo.
+
+Replaces per-URL tldextract.extract() calls: the suffix rules come from a Public Suffix List
+snapshot shipped next to this file (public_suffix_list.dat, ICANN section only, which is what
+tldextract uses by default), so nothing is fetched or cached on disk at startup. Splitting
+follows tldextract's rules (wildcards, exceptions, punycode labels, bare IPv4/IPv6 hosts),
+so features computed from the parts are unchanged.
+
+    parser = DomainParser.from_snapshot()
+    parser.parse("https://news.bbc.co.uk/a")   # ParsedHost(subdomain='news', domain='bbc', suffix='co.uk', shortened=0)
+
+Refresh the snapshot by replacing public_suffix_list.dat with
+https://publicsuffix.org/list/public_suffix_list.dat.
+"""
+import ipaddress
+import os
+import re
+from collections import namedtuple
+from functools import lru_cache
+from urllib.parse import scheme_chars
+
+try:
+    import idna as _idna  # IDNA 2008, what tldextract uses for punycode labels
+except ImportError:  # optional; fall back to the stdlib punycode codec
+    _idna = None
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_SNAPSHOT = os.path.join(HERE, "public_suffix_list.dat")
+
+_PRIVATE_SECTION = "// ===BEGIN PRIVATE DOMAINS==="
+_RULE_RE = re.compile(r"^(?P<suffix>[.*!]*\w[\S]*)", re.UNICODE | re.MULTILINE)
+_IPV4_RE = re.compile(
+    r"^(?:(?:[0-9]|[1-9][0-9]|1[0-9]{2}|2[0-4][0-9]|25[0-5])\.){3}"
+    r"(?:[0-9]|[1-9][0-9]|1[0-9]{2}|2[0-4][0-9]|25[0-5])$",
+    re.ASCII,
+)
+_SCHEME_CHARS = frozenset(scheme_chars)
+_IDEOGRAPHIC_DOTS = ("。", "．", "｡")
+
+ParsedHost = namedtuple("ParsedHost", ["subdomain", "domain", "suffix", "shortened"])
+
+
+def _schemeless(url):
+    i = url.find("//")
+    if i == 0:
+        return url[2:]
+    if i < 2 or url[i - 1] != ":" or set(url[:i - 1]) - _SCHEME_CHARS:
+        return url
+    return url[i + 2:]
+
+
+def host_of(url: str) -> str:
+    """Case-preserving host of a URL-like string (no scheme, userinfo, port or trailing dot)."""
+    authority = _schemeless(url).partition("/")[0].partition("?")[0].partition("#")[0]
+    after_userinfo = authority.rpartition("@")[-1]
+    if after_userinfo[:1] == "[":
+        head, bracket, _ = after_userinfo.partition("]")
+        if bracket:
+            return head + "]"
+    return after_userinfo.partition(":")[0].strip().rstrip("." + "".join(_IDEOGRAPHIC_DOTS))
+
+
+def _decode_label(label):
+    lowered = label.lower()
+    if lowered.startswith("xn--"):
+        try:
+            if _idna is not None:
+                return _idna.decode(lowered)
+            return lowered[4:].encode("ascii").decode("punycode")
+        except Exception:
+            pass
+    return lowered
+
+
+def _looks_like_ipv6(host):
+    try:
+        ipaddress.IPv6Address(host)
+    except ValueError:
+        return False
+    return True
+
+
+class DomainParser:
+    """Split hostnames into (subdomain, domain, suffix) against a fixed suffix list.
+
+    Results are memoized per hostname in an LRU of memo_size entries, together with the URL
+    shortener flag, so repeated hosts cost one dict lookup.
+    """
+
+    def __init__(self, suffixes, shorteners=(), memo_size=65536):
+        self._trie = {}
+        for rule in suffixes:
+            node = self._trie
+            for label in reversed(rule.split(".")):
+                node = node.setdefault(label, {})
+            node[None] = True  # end of a rule
+        self.n_rules = len(suffixes)
+        self.shorteners = frozenset(s.lower() for s in shorteners)
+        self.memo_size = int(memo_size)
+        self._parse_host = lru_cache(maxsize=self.memo_size)(self._split_host)
+
+    @classmethod
+    def from_snapshot(cls, path=DEFAULT_SNAPSHOT, shorteners=(), memo_size=65536):
+        with open(path, "r", encoding="utf-8") as f:
+            public_text = f.read().partition(_PRIVATE_SECTION)[0]
+        rules = [m.group("suffix") for m in _RULE_RE.finditer(public_text)]
+        return cls(rules, shorteners=shorteners, memo_size=memo_size)
+
+    def _suffix_index(self, labels):
+        """Index of the first public-suffix label, or None when no rule matches."""
+        node = self._trie
+        suffix_idx = idx = len(labels)
+        for label in reversed(labels):
+            decoded = _decode_label(label)
+            child = node.get(decoded)
+            if child is not None:
+                idx -= 1
+                node = child
+                if None in node:
+                    suffix_idx = idx
+                continue
+            if "*" in node:
+                return idx if ("!" + decoded) in node else idx - 1
+            break
+        return None if suffix_idx == len(labels) else suffix_idx
+
+    def _split_host(self, host):
+        for dot in _IDEOGRAPHIC_DOTS:
+            host = host.replace(dot, ".")
+        if len(host) >= 4 and host[0] == "[" and host[-1] == "]" and _looks_like_ipv6(host[1:-1]):
+            return ParsedHost("", host, "", 0)
+        labels = host.split(".")
+        i = self._suffix_index(labels)
+        if i is None:
+            if len(labels) == 4 and host[:1].isdecimal() and _IPV4_RE.match(host):
+                return ParsedHost("", host, "", 0)
+            subdomain, domain, suffix = ".".join(labels[:-1]), labels[-1], ""
+        else:
+            subdomain = ".".join(labels[:i - 1]) if i >= 2 else ""
+            domain = labels[i - 1] if i > 0 else ""
+            suffix = ".".join(labels[i:])
+        shortened = int((domain + "." + suffix).lower() in self.shorteners)
+        return ParsedHost(subdomain, domain, suffix, shortened)
+
+    def parse_host(self, host: str) -> ParsedHost:
+        return self._parse_host(host)
+
+    def parse(self, url: str) -> ParsedHost:
+        return self._parse_host(host_of(url))
+
+    def stats(self):
+        info = self._parse_host.cache_info()
+        lookups = info.hits + info.misses
+        return {
+            'rules': self.n_rules,
+            'memo_size': info.currsize,
+            'memo_maxsize': info.maxsize,
+            'hits': info.hits,
+            'misses': info.misses,
+            'hit_rate': (info.hits / lookups) if lookups else 0.0,
+        }
@@ -0,0 +1,368 @@
+import atexit
+import fcntl
+import glob
+import json
+import os
+import queue
+import threading
+import time
+from datetime import datetime, timezone
+
+from local_firestore import SERVER_TIMESTAMP_MARKER, _is_server_timestamp
+
+# Firestore rejects batches with more than 500 writes
+FIRESTORE_MAX_BATCH = 500
+# Spilled SERVER_TIMESTAMP fields: the client time the document was spilled at, so a replay
+# hours later doesn't stamp it with the replay time
+CLIENT_TIMESTAMP_KEY = "__client_timestamp__"
+
+
+def _encode(data, now):
+    return {k: ({CLIENT_TIMESTAMP_KEY: now} if _is_server_timestamp(v) else v) for k, v in data.items()}
+
+
+class BatchedFirestoreWriter:
+    """Background pipeline that turns per-request document adds into Firestore batch commits.
+
+    enqueue() only puts (collection_path, data) on a bounded in-process queue. A background
+    thread groups documents into client.batch() commits of up to max_batch documents or
+    whatever arrived within flush_interval seconds, retrying failed commits with exponential
+    backoff. Documents that cannot be written (queue full, retries exhausted, shutdown with
+    Firestore down) are appended to a JSONL spill file (one per process: <spill_path>.<pid>),
+    with SERVER_TIMESTAMP fields replaced by the client time of the spill; write_time_field,
+    if given, is added at commit time and always holds the real commit time. Spill files -- this
+    process's and any left behind by processes that no longer exist -- are replayed after the
+    next successful commit, when the writer thread starts (see start()) and every
+    replay_interval seconds while it is idle. A spill file is only deleted once all of its
+    documents were committed or spilled again, so replay is at-least-once.
+
+    Each writer holds an flock on <spill_path>.<pid>.lock for its lifetime; a spill file is
+    only taken over when that lock is free, so a recycled PID can't make a dead writer's
+    file look owned (or a live writer's file look abandoned). Works with any client exposing
+    collection(path).document() and batch().set()/commit(), e.g.
+    local_firestore.LocalFirestoreClient.
+    """
+
+    def __init__(self, client, spill_path, max_batch=200, flush_interval=0.5, max_queue=10000,
+                 max_retries=4, backoff_base=0.2, backoff_max=5.0, server_timestamp=None,
+                 replay_interval=30.0, write_time_field=None):
+        self.client = client
+        self.spill_path = spill_path
+        self.max_batch = max(1, min(int(max_batch), FIRESTORE_MAX_BATCH))
+        self.flush_interval = float(flush_interval)
+        self.max_queue = int(max_queue)
+        self.max_retries = int(max_retries)
+        self.backoff_base = float(backoff_base)
+        self.backoff_max = float(backoff_max)
+        # Value written for SERVER_TIMESTAMP fields of spill lines without a client timestamp
+        self.server_timestamp = server_timestamp
+        self.replay_interval = float(replay_interval)
+        # Set to SERVER_TIMESTAMP on every commit, replays included, so readers can page by
+        # when a document actually reached Firestore
+        self.write_time_field = write_time_field
+        self._next_replay = 0.0
+        self._owner_fd = None
+        self._queue = queue.Queue(maxsize=self.max_queue)
+        self._spill_lock = threading.Lock()
+        self._start_lock = threading.Lock()
+        self._thread = None
+        self._pid = None
+        self._stopping = False
+        self._pending = 0  # enqueued but not yet committed or spilled
+        self._pending_lock = threading.Lock()
+        self.enqueued = 0
+        self.committed = 0
+        self.commits = 0
+        self.failed_commits = 0
+        self.spilled = 0
+        self.replayed = 0
+        atexit.register(self.close)
+
+    # --- producer side ---
+
+    def enqueue(self, collection_path, data) -> bool:
+        """Queue a document for writing. Returns False if it had to be spilled to disk instead."""
+        self._ensure_thread()
+        with self._pending_lock:
+            self._pending += 1
+        try:
+            self._queue.put_nowait((collection_path, data))
+        except queue.Full:
+            self._done(1)
+            self._spill([(collection_path, data)])
+            return False
+        self.enqueued += 1
+        return True
+
+    def _done(self, n):
+        with self._pending_lock:
+            self._pending -= n
+
+    def start(self):
+        """Start the writer thread in this process, which also replays any spill files left over.
+
+        Call it once a worker is forked (gunicorn.conf.py does); otherwise the thread starts
+        with the first enqueue().
+        """
+        self._ensure_thread()
+
+    def _ensure_thread(self):
+        # Threads don't survive fork(); (re)start lazily in whichever process enqueues
+        if self._thread is not None and self._pid == os.getpid() and self._thread.is_alive():
+            return
+        with self._start_lock:
+            if self._thread is None or self._pid != os.getpid() or not self._thread.is_alive():
+                if self._pid != os.getpid():
+                    # Forked child: whatever is queued belongs to the parent, which writes it
+                    self._queue = queue.Queue(maxsize=self.max_queue)
+                    self._pending = 0
+                if self._pid != os.getpid() or self._owner_fd is None:
+                    self._hold_owner_lock()
+                # else the thread died in this process: the new one picks up the same queue
+                self._pid = os.getpid()
+                self._next_replay = 0.0
+                self._stopping = False
+                self._thread = threading.Thread(target=self._run, name="firestore-writer", daemon=True)
+                self._thread.start()
+
+    # --- consumer side ---
+
+    def _collect(self):
+        try:
+            first = self._queue.get(timeout=self.flush_interval)
+        except queue.Empty:
+            return []
+        docs = [first]
+        deadline = time.monotonic() + self.flush_interval
+        while len(docs) < self.max_batch:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                docs.append(self._queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return docs
+
+    def _run(self):
+        while not self._stopping:
+            docs = self._collect()
+            if not docs:
+                if time.monotonic() >= self._next_replay:
+                    self._replay_if_pending()
+                continue
+            ok = False
+            try:
+                ok = self._commit_with_retry(docs)
+                if not ok:
+                    self._spill(docs)
+            except Exception as e:
+                print(f"⚠️ Firestore writer could not spill {len(docs)} docs: {e}")
+            finally:
+                self._done(len(docs))
+            if ok:
+                self._replay_if_pending()
+
+    def _replay_if_pending(self):
+        self._next_replay = time.monotonic() + self.replay_interval
+        try:
+            if self._spill_files():
+                self._replay_spill()
+        except Exception as e:
+            print(f"⚠️ Firestore spill replay failed: {e}")
+
+    def _commit(self, docs):
+        batch = self.client.batch()
+        for path, data in docs:
+            if self.write_time_field:
+                ts = self.server_timestamp if self.server_timestamp is not None else SERVER_TIMESTAMP_MARKER
+                data = {**data, self.write_time_field: ts}
+            batch.set(self.client.collection(path).document(), data)
+        batch.commit()
+
+    def _commit_with_retry(self, docs, retries=None) -> bool:
+        retries = self.max_retries if retries is None else retries
+        for attempt in range(retries + 1):
+            try:
+                self._commit(docs)
+                self.commits += 1
+                self.committed += len(docs)
+                return True
+            except Exception as e:
+                self.failed_commits += 1
+                if attempt == retries or self._stopping:
+                    print(f"⚠️ Firestore batch commit failed ({len(docs)} docs), giving up: {e}")
+                    return False
+                time.sleep(min(self.backoff_max, self.backoff_base * (2 ** attempt)))
+        return False
+
+    # --- spill file ---
+
+    def _own_spill_path(self):
+        return f"{self.spill_path}.{os.getpid()}"
+
+    def _hold_owner_lock(self):
+        if self._owner_fd is not None:
+            os.close(self._owner_fd)  # inherited from the parent, whose lock it is
+            self._owner_fd = None
+        try:
+            fd = os.open(f"{self.spill_path}.{os.getpid()}.lock", os.O_RDWR | os.O_CREAT | os.O_CLOEXEC, 0o644)
+            fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            self._owner_fd = fd
+        except OSError as e:
+            print(f"⚠️ Firestore writer could not lock its spill file: {e}")
+
+    def _owner_alive(self, pid):
+        """Whether the writer process pid is still running, judged by its lock (or, without one, the pid)."""
+        try:
+            fd = os.open(f"{self.spill_path}.{pid}.lock", os.O_RDWR)
+        except FileNotFoundError:
+            try:
+                os.kill(pid, 0)
+            except ProcessLookupError:
+                return False
+            except OSError:
+                pass
+            return True
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            return True
+        finally:
+            os.close(fd)
+        return False
+
+    def _spill(self, docs):
+        now = datetime.now(timezone.utc).isoformat()
+        self._spill_records([(path, _encode(data, now)) for path, data in docs])
+
+    def _spill_records(self, records):
+        """Append already-encoded (path, data) records to this process's spill file."""
+        lines = [json.dumps({"path": path, "data": data}, default=str) + "\n" for path, data in records]
+        with self._spill_lock:
+            with open(self._own_spill_path(), "a", encoding="utf-8") as f:
+                f.writelines(lines)
+        self.spilled += len(records)
+
+    def _spill_files(self):
+        """This process's spill file plus those of processes that have exited."""
+        own = self._own_spill_path()
+        files = [own] if os.path.exists(own) else []
+        for path in glob.glob(f"{glob.escape(self.spill_path)}.*"):
+            pid = path.rsplit(".", 1)[-1]
+            if path == own or not pid.isdigit():
+                continue
+            if not self._owner_alive(int(pid)):
+                files.append(path)
+        return files
+
+    def _decode(self, data):
+        out = {}
+        for k, v in data.items():
+            if isinstance(v, dict) and set(v) == {CLIENT_TIMESTAMP_KEY}:
+                v = datetime.fromisoformat(v[CLIENT_TIMESTAMP_KEY])
+            elif v == SERVER_TIMESTAMP_MARKER and self.server_timestamp is not None:
+                v = self.server_timestamp  # spilled before client timestamps were recorded
+            out[k] = v
+        return out
+
+    def _replay_spill(self):
+        """Write spilled documents back now that Firestore accepts commits again."""
+        for path in self._spill_files():
+            claimed = f"{path}.replaying.{os.getpid()}"
+            with self._spill_lock:
+                try:
+                    os.replace(path, claimed)
+                except FileNotFoundError:
+                    continue  # another process claimed it first
+            records = []
+            with open(claimed, "r", encoding="utf-8") as f:
+                for line in f:
+                    if not line.strip():
+                        continue
+                    try:
+                        rec = json.loads(line)
+                    except ValueError:
+                        print(f"⚠️ Skipping unreadable spill line in {path}")
+                        continue
+                    records.append((rec["path"], rec["data"]))
+            docs = [(p, self._decode(data)) for p, data in records]
+            # The claimed file stays until its documents are committed or spilled again, so a
+            # crash in between leaves it for the next replay (it's named after this pid)
+            for i in range(0, len(docs), self.max_batch):
+                chunk = docs[i:i + self.max_batch]
+                if not self._commit_with_retry(chunk, retries=1):
+                    # Still failing: keep the rest for the next recovery
+                    self._spill_records(records[i:])
+                    os.remove(claimed)
+                    return
+                self.replayed += len(chunk)
+            os.remove(claimed)
+            pid = int(path.rsplit(".", 1)[-1])
+            if pid != os.getpid():
+                self._remove_stale_lock(pid)
+
+    def _remove_stale_lock(self, pid):
+        # Only while holding it ourselves, so a live writer that reused the pid keeps its lock
+        lock_path = f"{self.spill_path}.{pid}.lock"
+        try:
+            fd = os.open(lock_path, os.O_RDWR)
+        except OSError:
+            return
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            os.remove(lock_path)
+        except OSError:
+            pass
+        finally:
+            os.close(fd)
+
+    # --- lifecycle ---
+
+    def flush(self, timeout=10.0) -> bool:
+        """Block until every enqueued document was committed or spilled (or timeout)."""
+        deadline = time.monotonic() + timeout
+        while self._pending > 0:
+            if time.monotonic() >= deadline:
+                return False
+            time.sleep(0.01)
+        return True
+
+    def close(self):
+        """Stop the background thread and write out whatever is still queued (spilling on failure)."""
+        if self._thread is None or self._pid != os.getpid():
+            return
+        self._stopping = True
+        self._thread.join(timeout=self.flush_interval * 2 + 1)
+        docs = []
+        while True:
+            try:
+                docs.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+        for i in range(0, len(docs), self.max_batch):
+            chunk = docs[i:i + self.max_batch]
+            if not self._commit_with_retry(chunk, retries=0):
+                self._spill(chunk)
+            self._done(len(chunk))
+        if self._owner_fd is not None and not os.path.exists(self._own_spill_path()):
+            # Nothing left for others to take over: drop the lock file too
+            try:
+                os.remove(f"{self.spill_path}.{os.getpid()}.lock")
+            except OSError:
+                pass
+            os.close(self._owner_fd)
+            self._owner_fd = None
+
+    def stats(self):
+        return {
+            'queued': self._queue.qsize(),
+            'max_queue': self.max_queue,
+            'enqueued': self.enqueued,
+            'committed': self.committed,
+            'commits': self.commits,
+            'failed_commits': self.failed_commits,
+            'spilled': self.spilled,
+            'replayed': self.replayed,
+            'spill_pending': os.path.exists(self._own_spill_path()),
+        }
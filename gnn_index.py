@@ -0,0 +1,173 @@
+"""Compact, memory-mapped structural (GNN) score index.
+
+The index is two aligned .npy arrays next to each other:
+
+    gnn_index_keys.npy   sorted uint64 hashes of post IDs (blake2b, 8 bytes)
+    gnn_index_probs.npy  float32 structural score for each key
+    gnn_index_meta.json  size and blake2b hash of the post_node_map.json / gnn_probs.npy it was built from
+
+Both are opened with np.load(mmap_mode='r'), so every gunicorn worker shares the same pages
+through the OS cache and startup cost no longer depends on the number of posts. Build it
+from the training artifacts with:
+
+    python gnn_index.py build [--node-map post_node_map.json] [--probs gnn_probs.npy] [--out-dir .]
+"""
+import argparse
+import hashlib
+import json
+import os
+import sys
+
+import numpy as np
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+KEYS_FILE = "gnn_index_keys.npy"
+PROBS_FILE = "gnn_index_probs.npy"
+META_FILE = "gnn_index_meta.json"
+DEFAULT_STRUCTURAL_SCORE = 0.5
+
+
+def hash_post_id(post_id) -> int:
+    return int.from_bytes(hashlib.blake2b(str(post_id).encode("utf-8", "surrogatepass"), digest_size=8).digest(), "little")
+
+
+def hash_post_ids(post_ids) -> np.ndarray:
+    return np.fromiter((hash_post_id(p) for p in post_ids), dtype=np.uint64, count=len(post_ids))
+
+
+def source_fingerprint(path):
+    """Size and content hash of a source artifact; mtimes don't survive checkouts or copies."""
+    h = hashlib.blake2b(digest_size=16)
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            h.update(chunk)
+    return {"size": os.path.getsize(path), "blake2b": h.hexdigest()}
+
+
+def _matches(path, fingerprint):
+    # Size first, so a changed artifact usually doesn't need hashing
+    return (isinstance(fingerprint, dict) and os.path.getsize(path) == fingerprint.get("size")
+            and source_fingerprint(path) == fingerprint)
+
+
+class GnnScoreIndex:
+    def __init__(self, keys, probs):
+        if len(keys) != len(probs):
+            raise ValueError(f"GNN index keys ({len(keys)}) and probs ({len(probs)}) are not aligned.")
+        self.keys = keys
+        self.probs = probs
+
+    def __len__(self):
+        return int(self.keys.shape[0])
+
+    @classmethod
+    def from_node_map(cls, post_node_map, gnn_probs):
+        """Build an in-memory index from a {post_id: node_index} map and per-node probabilities.
+
+        Entries whose node index is out of range are dropped, matching the old lookup
+        which fell back to the default score for them.
+        """
+        probs_src = np.asarray(gnn_probs).reshape(-1)
+        ids, vals = [], []
+        for pid, idx in post_node_map.items():
+            if idx is not None and 0 <= int(idx) < len(probs_src):
+                ids.append(pid)
+                vals.append(float(probs_src[int(idx)]))
+        keys = hash_post_ids(ids)
+        order = np.argsort(keys, kind="stable")
+        keys = keys[order]
+        probs = np.asarray(vals, dtype=np.float32)[order]
+        dup = np.flatnonzero(keys[1:] == keys[:-1])
+        if dup.size:
+            raise ValueError(f"Post ID hash collision in GNN index ({dup.size} duplicates).")
+        return cls(keys, probs)
+
+    @classmethod
+    def from_artifacts(cls, node_map_path, probs_path):
+        with open(node_map_path, "r") as f:
+            post_node_map = json.load(f)
+        return cls.from_node_map(post_node_map, np.load(probs_path))
+
+    @classmethod
+    def open(cls, directory=HERE, mmap=True):
+        mode = "r" if mmap else None
+        keys = np.load(os.path.join(directory, KEYS_FILE), mmap_mode=mode, allow_pickle=False)
+        probs = np.load(os.path.join(directory, PROBS_FILE), mmap_mode=mode, allow_pickle=False)
+        return cls(keys, probs)
+
+    @staticmethod
+    def exists(directory=HERE):
+        return all(os.path.exists(os.path.join(directory, n)) for n in (KEYS_FILE, PROBS_FILE))
+
+    def save(self, directory=HERE, node_map_path=None, probs_path=None):
+        """Write the index; with the source paths, also their fingerprints for load_gnn_index()."""
+        # Write to temp names and rename so readers never see a half-written pair
+        for name, arr in ((KEYS_FILE, self.keys), (PROBS_FILE, self.probs)):
+            tmp = os.path.join(directory, name + ".tmp")
+            with open(tmp, "wb") as f:
+                np.save(f, np.ascontiguousarray(arr))
+            os.replace(tmp, os.path.join(directory, name))
+        meta_path = os.path.join(directory, META_FILE)
+        if node_map_path is None or probs_path is None:
+            if os.path.exists(meta_path):
+                os.remove(meta_path)  # no longer describes this index
+            return
+        meta = {"node_map": source_fingerprint(node_map_path), "probs": source_fingerprint(probs_path)}
+        with open(meta_path + ".tmp", "w") as f:
+            json.dump(meta, f, indent=2, sort_keys=True)
+        os.replace(meta_path + ".tmp", meta_path)
+
+    def lookup(self, post_ids, default=DEFAULT_STRUCTURAL_SCORE) -> np.ndarray:
+        """Vectorized structural scores for post_ids; unknown IDs get default."""
+        out = np.full(len(post_ids), default, dtype=np.float64)
+        if len(self) == 0 or len(post_ids) == 0:
+            return out
+        hashes = hash_post_ids(post_ids)
+        pos = np.searchsorted(self.keys, hashes)
+        np.minimum(pos, len(self) - 1, out=pos)
+        found = self.keys[pos] == hashes
+        out[found] = self.probs[pos[found]]
+        return out
+
+
+def index_is_current(directory, node_map_path, probs_path):
+    """True if the index in directory was built from exactly these node map / probs files."""
+    try:
+        with open(os.path.join(directory, META_FILE), "r") as f:
+            meta = json.load(f)
+    except (OSError, ValueError):
+        return False
+    return _matches(node_map_path, meta.get("node_map")) and _matches(probs_path, meta.get("probs"))
+
+
+def load_gnn_index(directory=HERE, node_map_path=None, probs_path=None):
+    """Open the mmap index, or build one in memory from the JSON/npy pair if the index is missing or stale."""
+    node_map_path = node_map_path or os.path.join(directory, "post_node_map.json")
+    probs_path = probs_path or os.path.join(directory, "gnn_probs.npy")
+    have_sources = os.path.exists(node_map_path) and os.path.exists(probs_path)
+    if GnnScoreIndex.exists(directory):
+        if not have_sources or index_is_current(directory, node_map_path, probs_path):
+            return GnnScoreIndex.open(directory)
+        print("⚠️ GNN index doesn't match post_node_map.json/gnn_probs.npy; rebuilding in memory (run gnn_index.py build).")
+    if have_sources:
+        return GnnScoreIndex.from_artifacts(node_map_path, probs_path)
+    return None
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Build the memory-mapped GNN score index.")
+    sub = parser.add_subparsers(dest="cmd", required=True)
+    b = sub.add_parser("build")
+    b.add_argument("--node-map", default=os.path.join(HERE, "post_node_map.json"))
+    b.add_argument("--probs", default=os.path.join(HERE, "gnn_probs.npy"))
+    b.add_argument("--out-dir", default=HERE)
+    args = parser.parse_args(argv)
+
+    index = GnnScoreIndex.from_artifacts(args.node_map, args.probs)
+    index.save(args.out_dir, args.node_map, args.probs)
+    print(f"✅ Wrote GNN index with {len(index)} posts to {args.out_dir}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
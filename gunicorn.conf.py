@@ -0,0 +1,52 @@
+# Gunicorn settings for the API container (used by startup.sh).
+#
+# The app is imported once in the master (preload_app), which loads and warms the model
+# bundle; workers are forked afterwards and share those pages copy-on-write instead of each
+# calling load_models() again. TensorFlow's runtime does not survive fork(), so preloading is
+# only on by default with the NumPy autoencoder backends (a model bundle, or AE_BACKEND=numpy*); with Keras each
+# worker loads its own copy. GUNICORN_PRELOAD=1/0 overrides.
+import os
+import sys
+import time
+
+from preload_models import configure_cpu_threads, format_memory, memory_usage
+
+_boot_started = time.perf_counter()
+
+bind = f"0.0.0.0:{os.environ.get('PORT', '80')}"
+workers = int(os.environ.get("WEB_CONCURRENCY", "2"))
+# Threaded (gthread) workers so the app's admission control sees concurrent requests and can
+# shed or degrade them quickly; with sync workers the overflow just waits in the listen backlog.
+threads = int(os.environ.get("GUNICORN_THREADS", "4"))
+timeout = int(os.environ.get("GUNICORN_TIMEOUT", "120"))
+_bundle_dir = os.environ.get("MODEL_BUNDLE_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), "model_bundle"))
+# A packaged model bundle is served by a NumPy backend unless AE_BACKEND=keras is set explicitly
+# (app.py then serves the loose Keras artifacts instead)
+_ae_backend = os.environ.get("AE_BACKEND")
+_numpy_backend = (_ae_backend or "").lower().startswith("numpy") or (
+    _ae_backend is None and bool(_bundle_dir) and os.path.exists(os.path.join(_bundle_dir, "manifest.json")))
+preload_app = os.environ.get("GUNICORN_PRELOAD", "1" if _numpy_backend else "0") != "0"
+
+# Has to happen before the app (and numpy/TensorFlow) is imported
+intra_op_threads = configure_cpu_threads(workers, threads)
+
+
+def when_ready(server):
+    server.log.info(
+        "Master ready in %.2fs (preload_app=%s, workers=%d, threads=%d, intra-op threads/worker=%d) %s",
+        time.perf_counter() - _boot_started, preload_app, workers, threads, intra_op_threads,
+        format_memory(memory_usage()),
+    )
+
+
+def post_worker_init(worker):
+    # The app is loaded by now (in the master under preload_app, else in this worker); start its
+    # Firestore writer here rather than at import so spills left by dead workers get replayed
+    # without waiting for the next /report or /flag
+    app_module = sys.modules.get("app")
+    if getattr(app_module, "fs_writer", None) is not None:
+        app_module.fs_writer.start()
+    worker.log.info(
+        "Worker %s up %.2fs after boot %s",
+        worker.pid, time.perf_counter() - _boot_started, format_memory(memory_usage()),
+    )
@@ -0,0 +1,101 @@
+import numpy as np
+
+from ae_backends import ACTIVATIONS
+
+
+def scaler_affine(scaler_obj, n_features):
+    """Return (slope, offset) such that scaler_obj.transform(x) == x * slope + offset.
+
+    Works for any per-feature affine scaler (StandardScaler, RobustScaler, MinMaxScaler, ...).
+    Raises ValueError if the scaler is not affine per feature.
+    """
+    probe = np.zeros((3, n_features), dtype=np.float64)
+    probe[1] = 1.0
+    probe[2] = np.linspace(-7.0, 13.0, n_features)
+    out = np.asarray(scaler_obj.transform(probe), dtype=np.float64)
+    offset = out[0]
+    slope = out[1] - out[0]
+    if not np.allclose(out[2], probe[2] * slope + offset, rtol=1e-9, atol=1e-9):
+        raise ValueError(f"{type(scaler_obj).__name__} is not a per-feature affine transform.")
+    return slope, offset
+
+
+class FoldedAutoencoderPlan:
+    """Scaler + autoencoder reconstruction error with the constant work precomputed.
+
+    Only the active feature columns (the ones FeatureMatrixBuilder actually computes) are
+    inputs; every other column always holds the same fill value, so its scaled value is a
+    constant. At build time:
+      * the scaler's slope/offset for active columns are folded into the first dense layer,
+        and the constant columns' contribution to it is folded into its bias;
+      * the scaled constant columns become a fixed reconstruction target subtracted from the
+        output, so their share of the error needs no per-request input; the output layer is
+        permuted to [active | constant] so both residuals are contiguous slices.
+    Per request this leaves one elementwise affine on the active columns (for their own error
+    term) plus the dense stack, with the first matmul shrunk to len(active_cols) inputs.
+    """
+
+    def __init__(self, layers, active_cols, active_slope, active_offset, const_target, n_features):
+        self.layers = layers
+        self.active_cols = np.asarray(active_cols, dtype=np.intp)
+        self.active_slope = active_slope
+        self.active_offset = active_offset
+        self.const_target = const_target
+        self.n_features = int(n_features)
+
+    @classmethod
+    def build(cls, scaler_obj, numpy_ae, active_cols, base_row):
+        n_features = numpy_ae.input_dim
+        slope, offset = scaler_affine(scaler_obj, n_features)
+        active = np.asarray(active_cols, dtype=np.intp)
+        const_mask = np.ones(n_features, dtype=bool)
+        const_mask[active] = False
+
+        base = np.asarray(base_row, dtype=np.float64)
+        const_scaled = np.where(const_mask, base * slope + offset, 0.0)
+
+        kernel0, bias0, act0 = numpy_ae.layers[0]
+        k0 = kernel0.astype(np.float64)
+        folded_kernel = slope[active][:, None] * k0[active]
+        folded_bias = bias0.astype(np.float64) + offset[active] @ k0[active] + const_scaled @ k0
+
+        layers = [(folded_kernel.astype(np.float32), folded_bias.astype(np.float32), act0)]
+        layers += list(numpy_ae.layers[1:])
+
+        # Reorder the output units as [active..., constant...] so the per-row residual is a slice
+        order = np.concatenate([active, np.flatnonzero(const_mask)])
+        kernel_n, bias_n, act_n = layers[-1]
+        layers[-1] = (np.ascontiguousarray(kernel_n[:, order]), np.ascontiguousarray(bias_n[order]), act_n)
+        return cls(
+            layers,
+            active,
+            slope[active].astype(np.float32),
+            offset[active].astype(np.float32),
+            const_scaled[order][active.size:].astype(np.float32),
+            n_features,
+        )
+
+    @property
+    def n_active(self):
+        return int(self.active_cols.size)
+
+    def reconstruction_errors(self, x_active):
+        """x_active: (n, n_active) raw feature values in active_cols order. Returns float64 errors."""
+        x = np.asarray(x_active, dtype=np.float32)
+        h = x
+        for kernel, bias, activation in self.layers:
+            h = h @ kernel
+            h += bias
+            h = ACTIVATIONS[activation](h)
+        # h is the reconstruction with outputs ordered [active | constant]; turn it into the residual
+        n_active = self.active_cols.size
+        h[:, n_active:] -= self.const_target
+        h[:, :n_active] -= x * self.active_slope + self.active_offset
+        return np.einsum('ij,ij->i', h, h).astype(np.float64) / self.n_features
+
+    def info(self):
+        return {
+            'active_inputs': self.n_active,
+            'total_inputs': self.n_features,
+            'first_layer_macs_per_row': int(self.layers[0][0].size),
+        }
@@ -0,0 +1,305 @@
+"""In-memory index of links users already flagged, checked before the content model.
+
+Entries are exact normalized URLs and domains (a domain entry matches links on that host
+or any of its subdomains; the caller's domains_of(url) lists the hosts to try). Keys are 8-byte blake2b hashes of "url:<url>" /
+"domain:<host>", as in gnn_index, kept in a sorted uint64 array plus a small set of keys
+added since the last merge. A Bloom filter sits in front of both, so the common case -- a
+link that isn't known-bad -- is answered with a few bit probes; a Bloom hit is always
+confirmed against the exact keys, so false positives never reach a verdict.
+
+The snapshot is a JSONL file whose lines are any of:
+
+    https://evil.example/login                          plain URL (a line without "://" is a domain)
+    {"url": "https://evil.example/login"}               flagged_phishing_links document
+    {"domain": "evil.example"}
+    {"id": "...", "data": {"url": "..."}, "merge": false}   LocalFirestoreClient collection file
+
+refresh() only reads lines appended since the previous call and reloads the whole file if
+it was replaced, truncated or newly created; follow() has it run periodically in a background
+thread, started by the first match() in each process (never at follow() time, which under
+gunicorn's preload_app runs in the master before it forks).
+"""
+import hashlib
+import json
+import math
+import os
+import threading
+import time
+
+import numpy as np
+
+URL_MATCH, DOMAIN_MATCH = "url", "domain"
+
+
+def _hash_keys(keys) -> np.ndarray:
+    return np.fromiter(
+        (int.from_bytes(hashlib.blake2b(k.encode("utf-8", "surrogatepass"), digest_size=8).digest(), "little") for k in keys),
+        dtype=np.uint64, count=len(keys))
+
+
+def _parse_line(line):
+    """Return (kind, value) for a snapshot line, or None to skip it."""
+    line = line.strip()
+    if not line or line.startswith("#"):
+        return None
+    if not line.startswith("{"):
+        return (URL_MATCH, line) if "://" in line else (DOMAIN_MATCH, line)
+    try:
+        rec = json.loads(line)
+    except ValueError:
+        return None
+    if isinstance(rec.get("data"), dict):
+        rec = rec["data"]
+    if isinstance(rec.get("url"), str) and rec["url"]:
+        return URL_MATCH, rec["url"]
+    if isinstance(rec.get("domain"), str) and rec["domain"]:
+        return DOMAIN_MATCH, rec["domain"]
+    return None
+
+
+def _domain_key(domain):
+    return "domain:" + domain.strip().lower().rstrip(".")
+
+
+class BloomFilter:
+    """Fixed-size Bloom filter over uint64 key hashes (double hashing on the two 32-bit halves)."""
+
+    def __init__(self, capacity, error_rate=0.001):
+        self.capacity = max(int(capacity), 1024)
+        self.error_rate = float(error_rate)
+        self.n_bits = int(math.ceil(-self.capacity * math.log(self.error_rate) / (math.log(2) ** 2)))
+        self.n_hashes = max(1, int(round(self.n_bits / self.capacity * math.log(2))))
+        self.bits = np.zeros((self.n_bits + 7) // 8, dtype=np.uint8)
+        self.count = 0
+
+    def _positions(self, hashes):
+        h1 = hashes & np.uint64(0xFFFFFFFF)
+        h2 = (hashes >> np.uint64(32)) | np.uint64(1)
+        i = np.arange(self.n_hashes, dtype=np.uint64)
+        return (h1[:, None] + i[None, :] * h2[:, None]) % np.uint64(self.n_bits)
+
+    def add(self, hashes):
+        pos = self._positions(hashes).ravel()
+        np.bitwise_or.at(self.bits, pos >> np.uint64(3), np.left_shift(1, pos & np.uint64(7)).astype(np.uint8))
+        self.count += len(hashes)
+
+    def contains(self, hashes) -> np.ndarray:
+        pos = self._positions(hashes)
+        return np.all((self.bits[pos >> np.uint64(3)] >> (pos & np.uint64(7)).astype(np.uint8)) & 1, axis=1)
+
+
+class KnownBadIndex:
+    def __init__(self, normalize=None, domains_of=None, error_rate=0.001, merge_threshold=4096):
+        # normalize(url) -> index key for exact URL matches; domains_of(url) -> hosts to check
+        self.normalize = normalize or (lambda u: u)
+        self.domains_of = domains_of or (lambda u: ())
+        self.error_rate = float(error_rate)
+        self.merge_threshold = int(merge_threshold)
+        self._lock = threading.Lock()
+        self._keys = np.zeros(0, dtype=np.uint64)
+        self._recent = set()
+        self._bloom = BloomFilter(1024, self.error_rate)
+        self.n_urls = 0
+        self.n_domains = 0
+        self.lookups = 0
+        self.url_hits = 0
+        self.domain_hits = 0
+        # snapshot state
+        self.path = None
+        self._file_id = None
+        self._offset = 0
+        self.loaded_at = None
+        self.refreshed_at = None
+        self.refresh_errors = 0
+        self.refresh_interval = None
+        self._thread = None
+        self._pid = None
+
+    def __len__(self):
+        return self.n_urls + self.n_domains
+
+    # --- building ---
+
+    def _keys_for(self, entries):
+        urls = ["url:" + self.normalize(v) for kind, v in entries if kind == URL_MATCH]
+        domains = [_domain_key(v) for kind, v in entries if kind == DOMAIN_MATCH]
+        return _hash_keys(urls), _hash_keys(domains)
+
+    def add(self, entries):
+        """Add (kind, value) entries, kind being "url" or "domain". Returns how many were new."""
+        url_h, domain_h = self._keys_for(entries)
+        added = 0
+        with self._lock:
+            for hashes, kind in ((url_h, URL_MATCH), (domain_h, DOMAIN_MATCH)):
+                hashes = np.unique(hashes)
+                if len(hashes):
+                    hashes = hashes[~self._contains_locked(hashes)]
+                if not len(hashes):
+                    continue
+                self._recent.update(hashes.tolist())
+                if self._bloom.count + len(hashes) > self._bloom.capacity:
+                    self._rebuild_bloom(2 * (len(self) + len(hashes)))
+                else:
+                    self._bloom.add(hashes)
+                if kind == URL_MATCH:
+                    self.n_urls += len(hashes)
+                else:
+                    self.n_domains += len(hashes)
+                added += len(hashes)
+            if len(self._recent) > self.merge_threshold:
+                self._merge_recent()
+        return added
+
+    def _merge_recent(self):
+        self._keys = np.union1d(self._keys, np.fromiter(self._recent, dtype=np.uint64, count=len(self._recent)))
+        self._recent = set()
+
+    def _rebuild_bloom(self, capacity):
+        self._merge_recent()  # new keys are already in _recent
+        bloom = BloomFilter(capacity, self.error_rate)
+        bloom.add(self._keys)
+        self._bloom = bloom
+
+    def _contains_locked(self, hashes):
+        found = self._bloom.contains(hashes)
+        maybe = np.flatnonzero(found)
+        if len(maybe):
+            h = hashes[maybe]
+            exact = np.zeros(len(maybe), dtype=bool)
+            if len(self._keys):
+                pos = np.minimum(np.searchsorted(self._keys, h), len(self._keys) - 1)
+                exact = self._keys[pos] == h
+            if self._recent:
+                exact |= np.fromiter((x in self._recent for x in h.tolist()), dtype=bool, count=len(h))
+            found[maybe] = exact
+        return found
+
+    # --- snapshot ---
+
+    def load(self, path):
+        """Replace the index with the contents of a snapshot file."""
+        with open(path, "rb") as f:
+            st = os.fstat(f.fileno())
+            data = f.read()
+        end = data.rfind(b"\n") + 1
+        entries = [e for e in map(_parse_line, data[:end].decode("utf-8", "replace").splitlines()) if e]
+        url_h, domain_h = self._keys_for(entries)
+        url_h, domain_h = np.unique(url_h), np.unique(domain_h)
+        keys = np.union1d(url_h, domain_h)
+        bloom = BloomFilter(2 * len(keys), self.error_rate)
+        bloom.add(keys)
+        with self._lock:
+            self._keys, self._recent, self._bloom = keys, set(), bloom
+            self.n_urls, self.n_domains = len(url_h), len(domain_h)
+            self.path, self._file_id, self._offset = path, (st.st_dev, st.st_ino), end
+            self.loaded_at = self.refreshed_at = time.time()
+        return len(self)
+
+    def refresh(self):
+        """Pick up lines appended to the snapshot since the last load/refresh. Returns entries added."""
+        if self.path is None:
+            return 0
+        try:
+            st = os.stat(self.path)
+        except OSError:
+            return 0
+        if (st.st_dev, st.st_ino) != self._file_id or st.st_size < self._offset:
+            before = len(self)
+            return self.load(self.path) - before
+        if st.st_size == self._offset:
+            self.refreshed_at = time.time()
+            return 0
+        with open(self.path, "rb") as f:
+            f.seek(self._offset)
+            data = f.read(st.st_size - self._offset)
+        end = data.rfind(b"\n") + 1  # leave a partially written last line for next time
+        entries = [e for e in map(_parse_line, data[:end].decode("utf-8", "replace").splitlines()) if e]
+        added = self.add(entries)
+        self._offset += end
+        self.refreshed_at = time.time()
+        return added
+
+    def follow(self, path, interval=30.0):
+        """Load path if it exists and re-read it every interval seconds (0: never) once lookups start."""
+        self.path = path
+        if os.path.exists(path):
+            self.load(path)
+        self.refresh_interval = float(interval)
+
+    def _ensure_refresher(self):
+        # Only called from match(): a thread started before fork() wouldn't survive it, and one
+        # holding _lock at fork time would leave the child's copy locked forever
+        if not self.refresh_interval or self.path is None:
+            return
+        if self._thread is not None and self._pid == os.getpid() and self._thread.is_alive():
+            return
+        with self._lock:
+            if self._thread is None or self._pid != os.getpid() or not self._thread.is_alive():
+                self._pid = os.getpid()
+                self._thread = threading.Thread(target=self._run, name="known-bad-refresh", daemon=True)
+                self._thread.start()
+
+    def _run(self):
+        while True:
+            time.sleep(self.refresh_interval)
+            try:
+                added = self.refresh()
+                if added:
+                    print(f"✅ Known-bad index: +{added} entries from {self.path} ({len(self)} total).")
+            except Exception as e:
+                self.refresh_errors += 1
+                print(f"⚠️ Known-bad index refresh failed: {e}")
+
+    # --- lookups ---
+
+    def match(self, urls):
+        """Per URL: "url" (exact match), "domain" (host or parent domain listed) or None.
+
+        Missing / non-string URLs never match.
+        """
+        out = [None] * len(urls)
+        self._ensure_refresher()
+        if not len(self) or not urls:
+            return out
+        valid = [i for i, u in enumerate(urls) if isinstance(u, str) and u]
+        url_h = _hash_keys(["url:" + self.normalize(urls[i]) for i in valid])
+        owners, domain_keys = [], []
+        with self._lock:
+            hits = self._contains_locked(url_h)
+        for j in np.flatnonzero(hits).tolist():
+            out[valid[j]] = URL_MATCH
+        if self.n_domains:
+            for i in valid:
+                u = urls[i]
+                if out[i] is None:
+                    for d in self.domains_of(u):
+                        if d:
+                            owners.append(i)
+                            domain_keys.append(_domain_key(d))
+            if domain_keys:
+                with self._lock:
+                    dhits = self._contains_locked(_hash_keys(domain_keys))
+                for j in np.flatnonzero(dhits).tolist():
+                    out[owners[j]] = DOMAIN_MATCH
+        n_url = int(np.count_nonzero(hits))
+        with self._lock:
+            self.lookups += len(urls)
+            self.url_hits += n_url
+            self.domain_hits += sum(1 for m in out if m == DOMAIN_MATCH)
+        return out
+
+    def stats(self):
+        return {
+            'path': self.path,
+            'urls': self.n_urls,
+            'domains': self.n_domains,
+            'bloom_bytes': int(self._bloom.bits.nbytes),
+            'key_bytes': int(self._keys.nbytes),
+            'lookups': self.lookups,
+            'url_hits': self.url_hits,
+            'domain_hits': self.domain_hits,
+            'loaded_at': self.loaded_at,
+            'refreshed_at': self.refreshed_at,
+            'refresh_interval': self.refresh_interval,
+            'refresh_errors': self.refresh_errors,
+        }
@@ -0,0 +1,231 @@
+"""File-backed stand-in for the parts of google.cloud.firestore.Client the server uses.
+
+Each collection path is an append-only JSONL file under a root directory; the last record
+for a document ID wins. Good enough for local development and for exercising the write
+pipeline without credentials:
+
+    LOCAL_FIRESTORE_DIR=/tmp/fs python app.py
+
+Collections also support the paginated queries data_pipeline/export_feedback.py runs:
+where() / order_by() / start_after() / limit() with Firestore's semantics (documents
+missing an order_by field are left out; ties are broken by document ID).
+"""
+import json
+import os
+import threading
+import uuid
+from datetime import datetime, timezone
+
+try:
+    from google.cloud.firestore import SERVER_TIMESTAMP as _FS_SERVER_TIMESTAMP
+except Exception:  # google-cloud-firestore not installed
+    _FS_SERVER_TIMESTAMP = object()
+
+# Spill-file stand-in for firestore.SERVER_TIMESTAMP; both resolve to the commit time when written
+SERVER_TIMESTAMP_MARKER = {"__server_timestamp__": True}
+
+
+def _collection_file(root, path):
+    return os.path.join(root, path.strip("/").replace("/", "__") + ".jsonl")
+
+
+class LocalDocumentReference:
+    def __init__(self, client, collection_path, doc_id):
+        self._client = client
+        self.collection_path = collection_path
+        self.id = doc_id
+
+    def set(self, data, merge=False):
+        self._client._append(self.collection_path, [(self.id, data, merge)])
+
+
+class LocalCollectionReference:
+    def __init__(self, client, path):
+        self._client = client
+        self.path = path
+
+    def document(self, doc_id=None):
+        return LocalDocumentReference(self._client, self.path, doc_id or uuid.uuid4().hex)
+
+    def add(self, data):
+        ref = self.document()
+        ref.set(data)
+        return None, ref
+
+    def stream(self):
+        for doc_id, data in self._client._read(self.path).items():
+            yield LocalDocumentSnapshot(doc_id, data)
+
+    def where(self, field, op, value):
+        return LocalQuery(self).where(field, op, value)
+
+    def order_by(self, field, direction="ASCENDING"):
+        return LocalQuery(self).order_by(field, direction)
+
+    def start_after(self, cursor):
+        return LocalQuery(self).start_after(cursor)
+
+    def limit(self, count):
+        return LocalQuery(self).limit(count)
+
+
+def _sort_value(value):
+    """Comparable form of a field value; ISO timestamp strings compare as datetimes."""
+    if isinstance(value, str) and len(value) >= 10 and value[4:5] == "-" and value[7:8] == "-":
+        try:
+            value = datetime.fromisoformat(value)
+        except ValueError:
+            return value
+    if isinstance(value, datetime) and value.tzinfo is None:
+        value = value.replace(tzinfo=timezone.utc)
+    return value
+
+
+_OPS = {
+    "<": lambda a, b: a < b,
+    "<=": lambda a, b: a <= b,
+    "==": lambda a, b: a == b,
+    "!=": lambda a, b: a != b,
+    ">=": lambda a, b: a >= b,
+    ">": lambda a, b: a > b,
+}
+
+
+class LocalQuery:
+    """Immutable query over one collection; each method returns a new query, as in Firestore."""
+
+    def __init__(self, collection, filters=(), orders=(), cursor=None, count=None):
+        self._collection = collection
+        self._filters = tuple(filters)
+        self._orders = tuple(orders)
+        self._cursor = cursor
+        self._count = count
+
+    def _copy(self, **changes):
+        state = dict(filters=self._filters, orders=self._orders, cursor=self._cursor, count=self._count)
+        state.update(changes)
+        return LocalQuery(self._collection, **state)
+
+    def where(self, field, op, value):
+        if op not in _OPS:
+            raise ValueError(f"Unsupported operator {op!r}")
+        return self._copy(filters=self._filters + ((field, op, _sort_value(value)),))
+
+    def order_by(self, field, direction="ASCENDING"):
+        return self._copy(orders=self._orders + ((field, direction == "DESCENDING"),))
+
+    def start_after(self, cursor):
+        """cursor is a document snapshot from a previous page or a {field: value} dict."""
+        return self._copy(cursor=cursor)
+
+    def limit(self, count):
+        return self._copy(count=int(count))
+
+    def _key(self, doc_id, data):
+        return tuple(_sort_value(data[f]) for f, _ in self._orders) + (doc_id,)
+
+    def stream(self):
+        docs = []
+        for doc_id, data in self._collection._client._read(self._collection.path).items():
+            if any(f not in data for f, _ in self._orders):
+                continue
+            try:
+                if not all(f in data and _OPS[op](_sort_value(data[f]), v) for f, op, v in self._filters):
+                    continue
+            except TypeError:  # mismatched types never match, as in Firestore
+                continue
+            docs.append((doc_id, data))
+        descending = bool(self._orders) and self._orders[0][1]
+        docs.sort(key=lambda d: self._key(*d), reverse=descending)
+        if self._cursor is not None:
+            if isinstance(self._cursor, LocalDocumentSnapshot):
+                after = self._key(self._cursor.id, self._cursor._data)
+            else:
+                after = tuple(_sort_value(self._cursor[f]) for f, _ in self._orders)
+            n = len(after)
+            docs = [d for d in docs if (self._key(*d)[:n] < after if descending else self._key(*d)[:n] > after)]
+        if self._count is not None:
+            docs = docs[:self._count]
+        for doc_id, data in docs:
+            yield LocalDocumentSnapshot(doc_id, data)
+
+
+class LocalDocumentSnapshot:
+    def __init__(self, doc_id, data):
+        self.id = doc_id
+        self._data = data
+
+    def to_dict(self):
+        return dict(self._data)
+
+    def get(self, field):
+        return self._data.get(field)
+
+
+class LocalWriteBatch:
+    def __init__(self, client):
+        self._client = client
+        self._writes = []
+
+    def set(self, ref, data, merge=False):
+        self._writes.append((ref, data, merge))
+
+    def commit(self):
+        by_collection = {}
+        for ref, data, merge in self._writes:
+            by_collection.setdefault(ref.collection_path, []).append((ref.id, data, merge))
+        for path, writes in by_collection.items():
+            self._client._append(path, writes)
+        self._writes = []
+
+
+class LocalFirestoreClient:
+    def __init__(self, root):
+        self.root = root
+        os.makedirs(root, exist_ok=True)
+        self._lock = threading.Lock()
+        self._read_cache = {}
+
+    def collection(self, path):
+        return LocalCollectionReference(self, path)
+
+    def batch(self):
+        return LocalWriteBatch(self)
+
+    def _append(self, path, writes):
+        now = datetime.now(timezone.utc).isoformat()
+        lines = []
+        for doc_id, data, merge in writes:
+            resolved = {k: (now if _is_server_timestamp(v) else v) for k, v in data.items()}
+            lines.append(json.dumps({"id": doc_id, "data": resolved, "merge": bool(merge)}, default=str) + "\n")
+        with self._lock:
+            with open(_collection_file(self.root, path), "a", encoding="utf-8") as f:
+                f.writelines(lines)
+
+    def _read(self, path):
+        docs = {}
+        fp = _collection_file(self.root, path)
+        try:
+            st = os.stat(fp)
+        except OSError:
+            return docs
+        # Paginated queries read the same file once per page; reuse the parse while it's unchanged
+        stamp = (st.st_size, st.st_mtime_ns)
+        cached = self._read_cache.get(fp)
+        if cached is not None and cached[0] == stamp:
+            return cached[1]
+        with open(fp, "r", encoding="utf-8") as f:
+            for line in f:
+                if not line.strip():
+                    continue
+                rec = json.loads(line)
+                if rec.get("merge") and rec["id"] in docs:
+                    docs[rec["id"]].update(rec["data"])
+                else:
+                    docs[rec["id"]] = rec["data"]
+        self._read_cache[fp] = (stamp, docs)
+        return docs
+
+
+def _is_server_timestamp(value):
+    return value is _FS_SERVER_TIMESTAMP or value == SERVER_TIMESTAMP_MARKER
@@ -0,0 +1,87 @@
+import os
+import queue
+import threading
+import time
+from concurrent.futures import Future
+
+
+class MicroBatcher:
+    """Coalesces concurrent single-item calls into one batched call.
+
+    Callers block in submit(); a background thread collects items for up to max_wait
+    seconds (or until max_items are queued), calls fn(items) once and hands each caller
+    its own element of the returned list. If fn raises, every caller in that batch gets
+    the exception. Only useful when a worker serves requests concurrently (gunicorn
+    --threads / gthread); with one request at a time it degenerates to batches of one.
+    """
+
+    def __init__(self, fn, max_wait=0.003, max_items=64):
+        self._fn = fn
+        self.max_wait = float(max_wait)
+        self.max_items = max(1, int(max_items))
+        self._queue = queue.Queue()
+        self._lock = threading.Lock()
+        self._thread = None
+        self._pid = None
+        self.batches = 0
+        self.items = 0
+        self.largest_batch = 0
+
+    def _ensure_thread(self):
+        # Threads don't survive fork(); start (again) lazily in whichever process submits
+        if self._thread is not None and self._pid == os.getpid() and self._thread.is_alive():
+            return
+        with self._lock:
+            if self._thread is None or self._pid != os.getpid() or not self._thread.is_alive():
+                self._queue = queue.Queue()
+                self._pid = os.getpid()
+                self._thread = threading.Thread(target=self._run, name="predict-microbatch", daemon=True)
+                self._thread.start()
+
+    def submit(self, item, timeout=None):
+        """Queue item for the next batch and return its result (or raise fn's exception)."""
+        self._ensure_thread()
+        fut = Future()
+        self._queue.put((item, fut))
+        return fut.result(timeout=timeout)
+
+    def _collect(self):
+        batch = [self._queue.get()]
+        deadline = time.monotonic() + self.max_wait
+        while len(batch) < self.max_items:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self._queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._collect()
+            futures = [fut for _, fut in batch]
+            try:
+                results = list(self._fn([item for item, _ in batch]))
+                if len(results) != len(futures):
+                    raise RuntimeError(f"batched call returned {len(results)} results for {len(futures)} items")
+                for fut, res in zip(futures, results):
+                    fut.set_result(res)
+            except BaseException as e:
+                for fut in futures:
+                    if not fut.done():
+                        fut.set_exception(e)
+            self.batches += 1
+            self.items += len(batch)
+            self.largest_batch = max(self.largest_batch, len(batch))
+
+    def stats(self):
+        return {
+            'max_wait_ms': self.max_wait * 1000.0,
+            'max_items': self.max_items,
+            'batches': self.batches,
+            'items': self.items,
+            'avg_batch_size': (self.items / self.batches) if self.batches else 0.0,
+            'largest_batch': self.largest_batch,
+        }
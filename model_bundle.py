@@ -0,0 +1,291 @@
+"""Versioned, content-hashed model bundle: one directory of .npy arrays plus a manifest.
+
+    model_bundle/
+        manifest.json          format, version, content hash, per-file sha256/shape/dtype,
+                               scaler feature names, AE activations and threshold
+        ae_kernel_<i>.npy      dense kernels (float32, or float16/int8 + ae_kernel_scale_<i>.npy
+                               for a smaller bundle; expanded to float32 at load)
+        ae_bias_<i>.npy
+        scaler_center.npy      scaler.transform(x) == (x - center) / scale
+        scaler_scale.npy
+        scaler_fill.npy        fill values for features that aren't computed (scaler.mean_), optional
+        gnn_index_keys.npy     the GNN score index (see gnn_index.py)
+        gnn_index_probs.npy
+
+Every array is opened with np.load(mmap_mode='r', allow_pickle=False), so loading runs no
+pickle and workers share pages. content_hash covers each file's bytes and the manifest's
+model fields, not the version label or creation time, so the same inputs always hash the
+same. Build it from the loose artifacts (scaler.pkl is unpickled here, at packaging time only):
+
+    python model_bundle.py build [--out model_bundle] [--version 2025-08-20] [--precision float32|float16|int8]
+    python model_bundle.py verify [model_bundle]
+"""
+import argparse
+import hashlib
+import json
+import os
+import pickle
+import shutil
+import sys
+import time
+
+import numpy as np
+
+from ae_backends import (DEFAULT_KERAS_PATH, DEFAULT_WEIGHTS_PATH, QUANTIZED_PRECISIONS, NumpyAutoencoder,
+                         QuantizedAutoencoder, dequantize_kernel, quantize_kernel)
+from gnn_index import KEYS_FILE, PROBS_FILE, GnnScoreIndex, load_gnn_index
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_BUNDLE_DIR = os.path.join(HERE, "model_bundle")
+MANIFEST = "manifest.json"
+FORMAT = "dakugumen-model-bundle"
+FORMAT_VERSION = 1
+
+
+class BundleError(Exception):
+    pass
+
+
+class BundleScaler:
+    """Per-feature (x - center) / scale, the transform of StandardScaler and RobustScaler.
+
+    Exposes feature_names_in_ (and mean_ when the source scaler had one) like the sklearn
+    scaler it replaces, so the feature builder and folded plan treat both the same.
+    """
+
+    def __init__(self, center, scale, feature_names=None, fill=None, source_type=None):
+        self.source_type = source_type
+        self.center_ = center
+        self.scale_ = scale
+        if feature_names:
+            self.feature_names_in_ = np.asarray(feature_names, dtype=object)
+        if fill is not None:
+            self.mean_ = fill
+        self.n_features_in_ = len(center)
+
+    @classmethod
+    def from_sklearn(cls, scaler):
+        n = int(scaler.n_features_in_)
+        kind = type(scaler).__name__
+        if kind == "RobustScaler":
+            center = scaler.center_ if getattr(scaler, "with_centering", True) else None
+        elif kind == "StandardScaler":
+            center = scaler.mean_ if getattr(scaler, "with_mean", True) else None
+        else:
+            raise BundleError(f"Unsupported scaler for the bundle: {kind}")
+        scale = scaler.scale_ if getattr(scaler, "scale_", None) is not None else None
+        center = np.zeros(n) if center is None else np.asarray(center, dtype=np.float64)
+        scale = np.ones(n) if scale is None else np.asarray(scale, dtype=np.float64)
+        names = [str(c) for c in getattr(scaler, "feature_names_in_", [])]
+        fill = np.asarray(scaler.mean_, dtype=np.float64) if getattr(scaler, "mean_", None) is not None else None
+        return cls(center, scale, names or None, fill, source_type=kind)
+
+    def transform(self, X):
+        # Same in-place ops and dtype handling as sklearn, so results are bit-identical
+        X = np.asarray(X)
+        out = np.array(X, dtype=np.float32 if X.dtype == np.float32 else np.float64)
+        out -= self.center_
+        out /= self.scale_
+        return out
+
+
+def _sha256(path):
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            h.update(block)
+    return h.hexdigest()
+
+
+def _content_hash(files, model):
+    h = hashlib.sha256()
+    for name in sorted(files):
+        h.update(f"{name}\0{files[name]['sha256']}\n".encode())
+    h.update(json.dumps(model, sort_keys=True).encode())
+    return h.hexdigest()
+
+
+def build(out_dir=DEFAULT_BUNDLE_DIR, version=None, precision="float32", source_dir=HERE):
+    """Package the loose artifacts in source_dir into a bundle at out_dir. Returns the manifest."""
+    weights = os.path.join(source_dir, os.path.basename(DEFAULT_WEIGHTS_PATH))
+    if os.path.exists(weights):
+        ae = NumpyAutoencoder.load(weights)
+    else:
+        from ae_backends import KerasAutoencoder
+        ae = NumpyAutoencoder.from_keras(KerasAutoencoder.load(os.path.join(source_dir, os.path.basename(DEFAULT_KERAS_PATH))).model)
+
+    scaler = None
+    for name in ("scaler.pkl", "scaler_final.pkl"):
+        path = os.path.join(source_dir, name)
+        if os.path.exists(path):
+            with open(path, "rb") as f:
+                scaler = BundleScaler.from_sklearn(pickle.load(f))
+            break
+    if scaler is None:
+        raise BundleError("Scaler file not found.")
+    with open(os.path.join(source_dir, "autoencoder_threshold.txt")) as f:
+        threshold = float(f.read())
+    gnn = load_gnn_index(source_dir)
+
+    arrays = {"scaler_center.npy": scaler.center_, "scaler_scale.npy": scaler.scale_}
+    if getattr(scaler, "mean_", None) is not None:
+        arrays["scaler_fill.npy"] = scaler.mean_
+    for i, (kernel, bias, _) in enumerate(ae.layers):
+        if precision == "float32":
+            arrays[f"ae_kernel_{i}.npy"] = kernel
+        else:
+            qk = quantize_kernel(kernel, precision)
+            arrays[f"ae_kernel_{i}.npy"] = qk["q"]
+            if "scale" in qk:
+                arrays[f"ae_kernel_scale_{i}.npy"] = qk["scale"]
+        arrays[f"ae_bias_{i}.npy"] = bias
+    if gnn is not None:
+        arrays[KEYS_FILE] = np.asarray(gnn.keys)
+        arrays[PROBS_FILE] = np.asarray(gnn.probs)
+
+    tmp = f"{out_dir}.tmp-{os.getpid()}"
+    shutil.rmtree(tmp, ignore_errors=True)
+    os.makedirs(tmp)
+    files = {}
+    for name, arr in sorted(arrays.items()):
+        path = os.path.join(tmp, name)
+        with open(path, "wb") as f:
+            np.save(f, np.ascontiguousarray(arr), allow_pickle=False)
+        files[name] = {"sha256": _sha256(path), "bytes": os.path.getsize(path),
+                       "dtype": str(arr.dtype), "shape": list(arr.shape)}
+    model = {
+        "autoencoder": {"activations": [a for _, _, a in ae.layers], "precision": precision},
+        "autoencoder_threshold": threshold,
+        "scaler": {"source_type": scaler.source_type,
+                   "feature_names": [str(c) for c in getattr(scaler, "feature_names_in_", [])]},
+        "gnn_posts": len(gnn) if gnn is not None else 0,
+    }
+    content_hash = _content_hash(files, model)
+    manifest = {
+        "format": FORMAT,
+        "format_version": FORMAT_VERSION,
+        "version": version or time.strftime("%Y%m%d-%H%M%S", time.gmtime()),
+        "created_at": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+        "content_hash": content_hash,
+        "model": model,
+        "files": files,
+    }
+    with open(os.path.join(tmp, MANIFEST), "w") as f:
+        json.dump(manifest, f, indent=2, sort_keys=True)
+        f.write("\n")
+
+    # Swap directories; processes that still mmap the old files keep reading them
+    old = None
+    if os.path.exists(out_dir):
+        old = f"{out_dir}.old-{os.getpid()}"
+        os.replace(out_dir, old)
+    os.replace(tmp, out_dir)
+    if old:
+        shutil.rmtree(old, ignore_errors=True)
+    return manifest
+
+
+def read_manifest(bundle_dir=DEFAULT_BUNDLE_DIR):
+    with open(os.path.join(bundle_dir, MANIFEST)) as f:
+        manifest = json.load(f)
+    if manifest.get("format") != FORMAT or manifest.get("format_version") != FORMAT_VERSION:
+        raise BundleError(f"{bundle_dir} is not a {FORMAT} v{FORMAT_VERSION} bundle.")
+    return manifest
+
+
+def verify(bundle_dir=DEFAULT_BUNDLE_DIR, manifest=None):
+    """Recompute every file hash and the content hash; raises BundleError on any mismatch."""
+    manifest = manifest or read_manifest(bundle_dir)
+    for name, meta in manifest["files"].items():
+        path = os.path.join(bundle_dir, name)
+        if not os.path.exists(path):
+            raise BundleError(f"Bundle file missing: {name}")
+        if _sha256(path) != meta["sha256"]:
+            raise BundleError(f"Bundle file {name} does not match its manifest hash.")
+    if _content_hash(manifest["files"], manifest["model"]) != manifest["content_hash"]:
+        raise BundleError("Bundle content hash does not match its manifest.")
+    return manifest
+
+
+class LoadedBundle:
+    def __init__(self, manifest, path, autoencoder, scaler, threshold, gnn_index):
+        self.manifest = manifest
+        self.path = path
+        self.autoencoder = autoencoder
+        self.scaler = scaler
+        self.autoencoder_threshold = threshold
+        self.gnn_index = gnn_index
+
+    def info(self):
+        return {
+            "path": self.path,
+            "version": self.manifest["version"],
+            "content_hash": self.manifest["content_hash"],
+            "created_at": self.manifest["created_at"],
+            "precision": self.manifest["model"]["autoencoder"]["precision"],
+        }
+
+
+def load(bundle_dir=DEFAULT_BUNDLE_DIR, check_hashes=True):
+    """Open a bundle: every array memory-mapped, no pickle. Hashes are checked unless disabled."""
+    manifest = read_manifest(bundle_dir)
+    if check_hashes:
+        verify(bundle_dir, manifest)
+    files = manifest["files"]
+
+    def arr(name):
+        return np.load(os.path.join(bundle_dir, name), mmap_mode="r", allow_pickle=False)
+
+    model = manifest["model"]
+    precision = model["autoencoder"]["precision"]
+    layers = []
+    for i, activation in enumerate(model["autoencoder"]["activations"]):
+        kernel = arr(f"ae_kernel_{i}.npy")
+        if precision != "float32":
+            scale_name = f"ae_kernel_scale_{i}.npy"
+            kernel = dequantize_kernel(kernel, arr(scale_name) if scale_name in files else None)
+        layers.append((kernel, arr(f"ae_bias_{i}.npy"), activation))
+    if precision == "float32":
+        ae = NumpyAutoencoder(layers)
+    elif precision in QUANTIZED_PRECISIONS:
+        ae = QuantizedAutoencoder(layers, precision)
+    else:
+        raise BundleError(f"Unknown autoencoder precision: {precision}")
+
+    scaler = BundleScaler(
+        arr("scaler_center.npy"), arr("scaler_scale.npy"),
+        model["scaler"]["feature_names"] or None,
+        arr("scaler_fill.npy") if "scaler_fill.npy" in files else None,
+        source_type=model["scaler"]["source_type"],
+    )
+    gnn = GnnScoreIndex.open(bundle_dir) if KEYS_FILE in files else None
+    return LoadedBundle(manifest, bundle_dir, ae, scaler, float(model["autoencoder_threshold"]), gnn)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Build or verify the model bundle.")
+    sub = parser.add_subparsers(dest="cmd", required=True)
+    b = sub.add_parser("build")
+    b.add_argument("--out", default=DEFAULT_BUNDLE_DIR)
+    b.add_argument("--version", help="Version label (default: UTC timestamp)")
+    b.add_argument("--precision", choices=("float32",) + QUANTIZED_PRECISIONS, default="float32")
+    b.add_argument("--source-dir", default=HERE, help="Directory with the loose artifacts")
+    v = sub.add_parser("verify")
+    v.add_argument("bundle", nargs="?", default=DEFAULT_BUNDLE_DIR)
+    args = parser.parse_args(argv)
+
+    try:
+        if args.cmd == "build":
+            manifest = build(args.out, version=args.version, precision=args.precision, source_dir=args.source_dir)
+            print(f"✅ Wrote bundle {manifest['version']} ({manifest['content_hash'][:12]}) to {args.out}")
+        else:
+            manifest = verify(args.bundle)
+            print(f"✅ Bundle {manifest['version']} ({manifest['content_hash'][:12]}) verified.")
+    except (BundleError, OSError) as e:
+        print(f"❌ {e}")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,62 +1,77 @@
-import tensorflow as tf
-import joblib
-import keras
-import numpy as np
-import json
+"""Helpers for loading the models once in the gunicorn master (see gunicorn.conf.py).
+
+Run directly to check that every artifact loads and a warm-up inference passes, without
+starting the server:
+
+    python preload_models.py
+"""
 import os
+import sys
+import time
+
+# Thread pools sized per worker so N forked workers don't oversubscribe the cores
+_THREAD_ENV_VARS = ("OMP_NUM_THREADS", "OPENBLAS_NUM_THREADS", "MKL_NUM_THREADS", "TF_NUM_INTRAOP_THREADS")
+
+
+def configure_cpu_threads(workers, threads_per_worker=1):
+    """Split the available cores between gunicorn workers by setting the math-library thread env vars.
+
+    Must run before numpy/TensorFlow are imported. Values already set in the environment win.
+    Returns the number of intra-op threads each worker gets.
+    """
+    try:
+        cores = len(os.sched_getaffinity(0))
+    except AttributeError:
+        cores = os.cpu_count() or 1
+    per_worker = max(1, cores // max(1, int(workers) * max(1, int(threads_per_worker))))
+    for var in _THREAD_ENV_VARS:
+        os.environ.setdefault(var, str(per_worker))
+    os.environ.setdefault("TF_NUM_INTEROP_THREADS", "1")
+    return int(os.environ["TF_NUM_INTRAOP_THREADS"])
+
+
+def memory_usage():
+    """Return {'rss_mb', 'pss_mb'} for this process (pss only where /proc/self/smaps_rollup exists)."""
+    usage = {'rss_mb': None, 'pss_mb': None}
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    usage['rss_mb'] = int(line.split()[1]) / 1024.0
+                    break
+    except OSError:
+        import resource
+        rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        usage['rss_mb'] = rss / (1024.0 * 1024.0) if sys.platform == "darwin" else rss / 1024.0
+    try:
+        with open("/proc/self/smaps_rollup") as f:
+            for line in f:
+                if line.startswith("Pss:"):
+                    usage['pss_mb'] = int(line.split()[1]) / 1024.0
+                    break
+    except OSError:
+        pass
+    return usage
+
+
+def format_memory(usage):
+    parts = [f"rss={usage['rss_mb']:.1f}MB"] if usage.get('rss_mb') is not None else []
+    if usage.get('pss_mb') is not None:
+        parts.append(f"pss={usage['pss_mb']:.1f}MB")
+    return " ".join(parts) or "n/a"
+
+
+def main():
+    print("🔄 Preloading models...")
+    t0 = time.perf_counter()
+    import app  # loads, warms up and installs the model bundle
+    elapsed = time.perf_counter() - t0
+    if app.models is None:
+        print(f"❌ Preload failed after {elapsed:.2f}s: {app.MODEL_LOAD_ERROR}")
+        return 1
+    print(f"🎉 Preload finished in {elapsed:.2f}s ({format_memory(memory_usage())}) — models are ready.")
+    return 0
+
 
-# Paths to your models and preprocessors
-AUTOENCODER_MODEL_PATH = "phishing_autoencoder_model.keras"
-CLASSIFIER_MODEL_PATH = "phishing_classifier_model.keras"
-SCALER_PATH = "scaler.pkl"
-THRESHOLD_PATH = "autoencoder_threshold.txt"
-NODE_MAP_PATH = "post_node_map.json"
-GNN_PROBS_PATH = "gnn_probs.npy"
-
-print("🔄 Preloading models...")
-
-# --- Keras models ---
-try:
-    autoencoder = keras.models.load_model(AUTOENCODER_MODEL_PATH)
-    print("✅ Autoencoder loaded")
-except Exception as e:
-    print(f"⚠️ Failed to load autoencoder: {e}")
-
-try:
-    classifier = keras.models.load_model(CLASSIFIER_MODEL_PATH)
-    print("✅ Classifier loaded")
-except Exception as e:
-    print(f"⚠️ Failed to load classifier: {e}")
-
-# --- Scaler ---
-try:
-    scaler = joblib.load(SCALER_PATH)
-    print("✅ Scaler loaded")
-except Exception as e:
-    print(f"⚠️ Failed to load scaler: {e}")
-
-# --- Threshold ---
-try:
-    with open(THRESHOLD_PATH, "r") as f:
-        threshold = float(f.read().strip())
-    print(f"✅ Autoencoder threshold loaded: {threshold}")
-except Exception as e:
-    print(f"⚠️ Failed to load threshold: {e}")
-
-# --- Node map ---
-try:
-    with open(NODE_MAP_PATH, "r") as f:
-        node_map = json.load(f)
-    print("✅ Node map loaded")
-except Exception as e:
-    print(f"⚠️ Failed to load node map: {e}")
-
-# --- GNN probabilities (optional, just precomputed .npy) ---
-try:
-    if os.path.exists(GNN_PROBS_PATH):
-        gnn_probs = np.load(GNN_PROBS_PATH, allow_pickle=True)
-        print("✅ GNN probabilities loaded")
-except Exception as e:
-    print(f"⚠️ Failed to load GNN probabilities: {e}")
-
-print("🎉 Preload finished — models are ready.")
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,186 @@
+"""Convert the autoencoder to reduced-precision weights, gated on decision parity.
+
+    python quantize_autoencoder.py --precision int8                      # synthetic corpus
+    python quantize_autoencoder.py --precision float16 --corpus links.jsonl --min-agreement 0.999
+    python quantize_autoencoder.py --verify phishing_autoencoder_int8.npz --corpus labeled.csv
+
+The corpus (plain URL per line, NDJSON {url, label}, or CSV with url[,label] columns) goes
+through the serving feature builder and scaler, then through both the float32 reference
+(the exported NumPy weights, or --reference keras) and the quantized model. Reconstruction
+errors, content scores and is_phishing decisions (structural score held at 0.5, i.e. the
+decision the content model alone can flip) are compared, and the artifact is only written
+when decision agreement is at least --min-agreement and the p99 relative change in
+reconstruction error is within --max-rel-error. With labels, accuracy of both models is
+reported and the quantized one may not lose more than --max-accuracy-drop.
+
+Serve the result with AE_BACKEND=numpy-int8 (or numpy-float16). This shrinks the weights file
+(float16 to half, int8 to about a quarter); it does not lower serving memory or latency, as
+the backends expand kernels to float32 at load and run the same matmuls. Only the float16
+artifact is committed: int8 misses the default agreement gate on the synthetic corpus, so no
+int8 artifact or bundle ships.
+"""
+import argparse
+import contextlib
+import csv
+import json
+import os
+import sys
+import time
+
+import numpy as np
+
+from ae_backends import (DEFAULT_QUANTIZED_PATHS, DEFAULT_WEIGHTS_PATH, QUANTIZED_PRECISIONS, KerasAutoencoder,
+                         NumpyAutoencoder, QuantizedAutoencoder)
+
+_LABEL_KEYS = ("label", "is_phishing", "phishing")
+
+
+def _parse_label(value):
+    if value is None or value == "":
+        return None
+    if isinstance(value, str):
+        return value.strip().lower() in ("1", "true", "yes", "phishing")
+    return bool(value)
+
+
+def read_corpus(path):
+    """Return (urls, labels) from a URL list, NDJSON or CSV file; labels are None when absent."""
+    urls, labels = [], []
+    with open(path, "r", encoding="utf-8", errors="replace") as f:
+        if path.endswith(".csv"):
+            for row in csv.DictReader(f):
+                if row.get("url"):
+                    urls.append(row["url"])
+                    labels.append(_parse_label(next((row[k] for k in _LABEL_KEYS if k in row), None)))
+        else:
+            for line in f:
+                line = line.strip()
+                if not line:
+                    continue
+                if line.startswith("{"):
+                    rec = json.loads(line)
+                    if rec.get("url"):
+                        urls.append(rec["url"])
+                        labels.append(_parse_label(next((rec[k] for k in _LABEL_KEYS if k in rec), None)))
+                else:
+                    urls.append(line)
+                    labels.append(None)
+    if all(lbl is None for lbl in labels):
+        labels = None
+    return urls, labels
+
+
+def _decisions(errors, threshold, cutoff):
+    content = np.minimum(errors / (threshold * 2), 1.0)
+    return content, (0.6 * content + 0.4 * 0.5) > cutoff
+
+
+def gate(reference, candidate, scaled, threshold, cutoff, labels=None):
+    """Compare candidate against reference on scaled feature rows. Returns a report dict."""
+    t0 = time.perf_counter()
+    ref_err = np.mean(np.square(scaled - reference.predict(scaled, verbose=0)), axis=1).astype(np.float64)
+    t1 = time.perf_counter()
+    cand_err = np.mean(np.square(scaled - candidate.predict(scaled, verbose=0)), axis=1).astype(np.float64)
+    t2 = time.perf_counter()
+    ref_content, ref_pred = _decisions(ref_err, threshold, cutoff)
+    cand_content, cand_pred = _decisions(cand_err, threshold, cutoff)
+    rel = np.abs(cand_err - ref_err) / np.maximum(np.abs(ref_err), 1e-12)
+    report = {
+        "rows": int(len(ref_err)),
+        "decision_agreement": float(np.mean(ref_pred == cand_pred)),
+        "decision_flips": int(np.count_nonzero(ref_pred != cand_pred)),
+        "reference_flagged": int(np.count_nonzero(ref_pred)),
+        "p50_rel_error_diff": float(np.percentile(rel, 50)),
+        "p99_rel_error_diff": float(np.percentile(rel, 99)),
+        "max_abs_content_diff": float(np.max(np.abs(cand_content - ref_content))),
+        "reference_seconds": t1 - t0,
+        "candidate_seconds": t2 - t1,
+    }
+    if labels is not None:
+        known = np.array([lbl is not None for lbl in labels])
+        y = np.array([bool(lbl) for lbl in labels])[known]
+        report["labeled_rows"] = int(known.sum())
+        report["reference_accuracy"] = float(np.mean(ref_pred[known] == y)) if known.any() else None
+        report["candidate_accuracy"] = float(np.mean(cand_pred[known] == y)) if known.any() else None
+    return report
+
+
+def passes(report, min_agreement, max_rel_error, max_accuracy_drop):
+    failures = []
+    if report["decision_agreement"] < min_agreement:
+        failures.append(f"decision agreement {report['decision_agreement']:.5f} < {min_agreement}")
+    if report["p99_rel_error_diff"] > max_rel_error:
+        failures.append(f"p99 relative error change {report['p99_rel_error_diff']:.5f} > {max_rel_error}")
+    if report.get("reference_accuracy") is not None:
+        drop = report["reference_accuracy"] - report["candidate_accuracy"]
+        if drop > max_accuracy_drop:
+            failures.append(f"accuracy drop {drop:.5f} > {max_accuracy_drop}")
+    return failures
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Quantize the autoencoder and gate it on decision parity.")
+    parser.add_argument("--precision", choices=QUANTIZED_PRECISIONS, default="int8")
+    parser.add_argument("--weights", default=DEFAULT_WEIGHTS_PATH, help="float32 NumPy weights to quantize")
+    parser.add_argument("--reference", choices=("numpy", "keras"), default="numpy", help="float32 model to compare against")
+    parser.add_argument("--out", help="Artifact path (default: phishing_autoencoder_<precision>.npz)")
+    parser.add_argument("--verify", help="Gate an existing artifact instead of writing a new one")
+    parser.add_argument("--corpus", help="URL list / NDJSON / CSV; default is a synthetic corpus")
+    parser.add_argument("--rows", type=int, default=20000, help="Synthetic corpus size")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--min-agreement", type=float, default=0.999)
+    parser.add_argument("--max-rel-error", type=float, default=0.05)
+    parser.add_argument("--max-accuracy-drop", type=float, default=0.001)
+    args = parser.parse_args(argv)
+
+    # Features and scaler come from the serving code; keep its load messages off stdout
+    os.environ.setdefault("AE_BACKEND", "numpy")
+    with contextlib.redirect_stdout(sys.stderr):
+        import app
+    if app.models is None:
+        print(f"❌ Models not ready: {app.MODEL_LOAD_ERROR}", file=sys.stderr)
+        return 1
+
+    if args.corpus:
+        urls, labels = read_corpus(args.corpus)
+    else:
+        from benchmark import synthetic_urls
+        urls, labels = synthetic_urls(args.rows, seed=args.seed), None
+    if not urls:
+        print("❌ Empty corpus.", file=sys.stderr)
+        return 1
+    scaled = app.models.scaler.transform(app.extract_feature_matrix(urls)).astype(np.float32)
+
+    if args.reference == "keras":
+        reference = KerasAutoencoder.load()
+    else:
+        reference = NumpyAutoencoder.load(args.weights)
+    if args.verify:
+        candidate = QuantizedAutoencoder.load(args.verify)
+    else:
+        candidate = QuantizedAutoencoder.from_float(NumpyAutoencoder.load(args.weights), args.precision)
+
+    cutoff = float(os.environ.get("FINAL_SCORE_CUTOFF", "0.5"))
+    report = gate(reference, candidate, scaled, app.models.threshold, cutoff, labels)
+    report["precision"] = candidate.precision
+    report["stored_bytes"] = candidate.stored_bytes()
+    report["float32_bytes"] = int(sum(k.nbytes + b.nbytes for k, b, _ in reference.layers)) if args.reference == "numpy" else None
+    print(json.dumps(report, indent=2))
+
+    failures = passes(report, args.min_agreement, args.max_rel_error, args.max_accuracy_drop)
+    if failures:
+        print(f"❌ Accuracy gate failed: {'; '.join(failures)}", file=sys.stderr)
+        return 1
+    if args.verify:
+        print(f"✅ {args.verify} passes the accuracy gate.", file=sys.stderr)
+        return 0
+    out = args.out or DEFAULT_QUANTIZED_PATHS[args.precision]
+    tmp = f"{out}.tmp.npz"
+    candidate.save(tmp)
+    os.replace(tmp, out)
+    print(f"✅ Wrote {out} (serve with AE_BACKEND=numpy-{args.precision}).", file=sys.stderr)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,9 +1,15 @@
 #!/bin/sh
 set -e
 
-echo "🔄 Running preload_models.py..."
-python preload_models.py || echo "⚠️ Preload failed, continuing."
-
 PORT=${PORT:-80}  # Use Azure port if set, otherwise default to 80
+export PORT
+# TensorFlow-free autoencoder backend for the loose artifacts; lets gunicorn preload the models
+# in the master. A model bundle picks its own precision, so AE_BACKEND is left alone then
+# (setting AE_BACKEND=keras explicitly serves the loose Keras model instead of the bundle).
+if [ -z "$AE_BACKEND" ] && [ ! -f "${MODEL_BUNDLE_DIR-model_bundle}/manifest.json" ]; then
+    export AE_BACKEND=numpy
+fi
+# Models are loaded and warmed once in the gunicorn master (preload_app) and shared with
+# the forked workers; see gunicorn.conf.py for worker/thread settings.
 echo "🚀 Starting Gunicorn on port $PORT..."
-exec gunicorn --bind 0.0.0.0:$PORT app:app
+exec gunicorn -c gunicorn.conf.py app:app
@@ -0,0 +1,363 @@
+"""Incremental post/domain/user graph for scoring posts the GNN artifacts don't cover.
+
+Node IDs follow the schema background.js writes to Firestore: "post:<postId>",
+"domain:<hostname>" and "user:<userId>", joined by undirected "contains" (post -> domain),
+"view" (user -> post) and "click" (user -> domain) edges. Adjacency is a CSR (indptr /
+indices) plus an append-only overflow that is folded back in once it grows past a fraction
+of the CSR, so adding an edge is O(1) amortized and never re-scores the graph.
+
+Every node keeps a running (sum, count) of the precomputed GNN probabilities of the known
+posts next to it, updated as edges arrive. A post missing from the GNN index is scored by
+averaging its neighbours' means -- plus, when given, the existing domain nodes of the hosts
+it links to -- each weighted by its evidence (count / (count + prior_weight)), and shrunk
+toward 0.5 by prior_weight; with no informative neighbour its score is NaN and the caller
+keeps its default. Scoring never changes the graph.
+
+Growth is capped at max_nodes nodes and max_edges edges; past either cap new nodes/edges
+are dropped (and counted in stats()) rather than evicting anything.
+
+Workers share the graph through an append-only edge log of {src, dst, edgeType} lines:
+append() writes new edges to it, and refresh() reads the lines other processes appended
+since the last call (reloading the whole file if it was replaced or truncated), so every
+worker converges on the same graph. follow() sets the log up; the caller decides when to
+refresh (refresh_if_due() throttles it to once per refresh_interval).
+"""
+import json
+import os
+import threading
+import time
+
+import numpy as np
+
+POST, DOMAIN, USER, OTHER = 0, 1, 2, 3
+_NODE_TYPES = {"post": POST, "domain": DOMAIN, "user": USER}
+NEUTRAL_SCORE = 0.5
+
+
+def post_node(post_id):
+    return f"post:{post_id}"
+
+
+def domain_node(host):
+    return f"domain:{host.lower()}"
+
+
+def user_node(user_id):
+    return f"user:{user_id}"
+
+
+def _node_type(node_id):
+    return _NODE_TYPES.get(node_id.partition(":")[0], OTHER)
+
+
+def post_edges(post_id, hosts=(), user_id=None):
+    """(src, dst, edgeType) records for a post, the hosts it links to and the user who saw it."""
+    pnode = post_node(post_id)
+    edges = [(pnode, domain_node(h), "contains") for h in hosts if h]
+    if user_id:
+        edges.append((user_node(user_id), pnode, "view"))
+    return edges
+
+
+def _parse_edges(text):
+    """(src, dst) pairs from {src, dst, edgeType} lines; blank or malformed lines are skipped."""
+    edges = []
+    for line in text.splitlines():
+        if line.strip():
+            try:
+                rec = json.loads(line)
+            except ValueError:
+                continue
+            if isinstance(rec, dict) and rec.get("src") and rec.get("dst"):
+                edges.append((str(rec["src"]), str(rec["dst"])))
+    return edges
+
+
+class StructuralGraph:
+    def __init__(self, prob_lookup=None, prior_weight=1.0, max_nodes=1_000_000, max_edges=5_000_000, compact_ratio=0.25):
+        # prob_lookup(post_ids) -> GNN probabilities, NaN for posts it doesn't know
+        self.prob_lookup = prob_lookup
+        self.prior_weight = float(prior_weight)
+        self.max_nodes = int(max_nodes)
+        self.max_edges = int(max_edges)
+        self.compact_ratio = float(compact_ratio)
+        self._lock = threading.RLock()
+        self._tail_lock = threading.Lock()
+        self._clear()
+        # edge log state
+        self.path = None
+        self._file_id = None
+        self._offset = 0
+        self.refresh_interval = None
+        self.refreshed_at = None
+        self.refresh_errors = 0
+
+    def _clear(self):
+        self._ids = {}
+        self._names = []
+        cap = 1024
+        self._type = np.zeros(cap, dtype=np.int8)
+        self._prob = np.full(cap, np.nan, dtype=np.float64)  # known posts only
+        self._sum = np.zeros(cap, dtype=np.float64)  # sum of adjacent known-post probs
+        self._cnt = np.zeros(cap, dtype=np.float64)
+        # CSR over the first len(indptr) - 1 nodes, plus edges added since the last compaction
+        self._indptr = np.zeros(1, dtype=np.int64)
+        self._indices = np.zeros(0, dtype=np.int64)
+        self._overflow = {}
+        self._overflow_edges = 0
+        self._edges = set()  # undirected edges as lo * 2**32 + hi node indices
+        self.dropped_nodes = 0
+        self.dropped_edges = 0
+
+    def __len__(self):
+        return len(self._names)
+
+    # --- building ---
+
+    def _grow(self, need):
+        cap = len(self._type)
+        if need <= cap:
+            return
+        new_cap = max(need, cap * 2)
+        for name, fill in (("_type", 0), ("_prob", np.nan), ("_sum", 0.0), ("_cnt", 0.0)):
+            old = getattr(self, name)
+            arr = np.full(new_cap, fill, dtype=old.dtype)
+            arr[:cap] = old
+            setattr(self, name, arr)
+
+    def _node(self, node_id):
+        i = self._ids.get(node_id)
+        if i is not None:
+            return i
+        if len(self._names) >= self.max_nodes:
+            if not self.dropped_nodes:
+                print(f"⚠️ Structural graph reached max_nodes={self.max_nodes}; new nodes are dropped.")
+            self.dropped_nodes += 1
+            return None
+        i = len(self._names)
+        self._grow(i + 1)
+        self._ids[node_id] = i
+        self._names.append(node_id)
+        self._type[i] = _node_type(node_id)
+        if self._type[i] == POST and self.prob_lookup is not None:
+            self._prob[i] = float(self.prob_lookup([node_id.partition(":")[2]])[0])
+        return i
+
+    def _neighbors(self, i):
+        if i + 1 < len(self._indptr):
+            base = self._indices[self._indptr[i]:self._indptr[i + 1]]
+        else:
+            base = self._indices[:0]
+        extra = self._overflow.get(i)
+        return np.concatenate([base, np.asarray(extra, dtype=np.int64)]) if extra else base
+
+    def add_edges(self, edges):
+        """Add undirected (src_id, dst_id) edges; duplicates and self-loops are ignored. Returns edges added."""
+        added = 0
+        with self._lock:
+            for src, dst in edges:
+                if len(self._edges) >= self.max_edges:
+                    if not self.dropped_edges:
+                        print(f"⚠️ Structural graph reached max_edges={self.max_edges}; new edges are dropped.")
+                    self.dropped_edges += 1
+                    continue
+                a, b = self._node(src), self._node(dst)
+                if a is None or b is None or a == b:
+                    continue
+                key = (min(a, b) << 32) | max(a, b)
+                if key in self._edges:
+                    continue
+                self._edges.add(key)
+                for x, y in ((a, b), (b, a)):
+                    self._overflow.setdefault(x, []).append(y)
+                    p = self._prob[x]
+                    if p == p:  # known post: feed its probability to the neighbour
+                        self._sum[y] += p
+                        self._cnt[y] += 1
+                self._overflow_edges += 2
+                added += 1
+            if self._overflow_edges > max(4096, self.compact_ratio * len(self._indices)):
+                self._compact()
+        return added
+
+    def add_post(self, post_id, hosts=(), user_id=None):
+        """Record a post with the hosts it links to and, optionally, the user who saw it."""
+        return self.add_edges([(src, dst) for src, dst, _ in post_edges(post_id, hosts, user_id)])
+
+    def load_edges_jsonl(self, path):
+        """Add {src, dst, edgeType} records (the Firestore graph/edges document shape)."""
+        with open(path, "r", encoding="utf-8") as f:
+            return self.add_edges(_parse_edges(f.read()))
+
+    def _compact(self):
+        """Fold the overflow lists into a fresh CSR (one stable sort over all directed edges)."""
+        n = len(self._names)
+        old_n = len(self._indptr) - 1
+        src = [np.repeat(np.arange(old_n, dtype=np.int64), np.diff(self._indptr))]
+        dst = [self._indices]
+        for i, extra in self._overflow.items():
+            src.append(np.full(len(extra), i, dtype=np.int64))
+            dst.append(np.asarray(extra, dtype=np.int64))
+        src, dst = np.concatenate(src), np.concatenate(dst)
+        order = np.argsort(src, kind="stable")
+        self._indices = dst[order]
+        self._indptr = np.zeros(n + 1, dtype=np.int64)
+        np.cumsum(np.bincount(src, minlength=n), out=self._indptr[1:])
+        self._overflow, self._overflow_edges = {}, 0
+
+    def set_prob_lookup(self, prob_lookup):
+        """Switch to new GNN probabilities (e.g. after a model reload) and re-aggregate in one pass."""
+        with self._lock:
+            self.prob_lookup = prob_lookup
+            n = len(self._names)
+            self._prob[:] = np.nan
+            self._sum[:] = 0.0
+            self._cnt[:] = 0.0
+            posts = np.flatnonzero(self._type[:n] == POST)
+            if prob_lookup is not None and len(posts):
+                self._prob[posts] = prob_lookup([self._names[i].partition(":")[2] for i in posts.tolist()])
+            if not self._edges:
+                return
+            keys = np.fromiter(self._edges, dtype=np.int64, count=len(self._edges))
+            lo, hi = keys >> 32, keys & 0xFFFFFFFF
+            src = np.concatenate([lo, hi])
+            dst = np.concatenate([hi, lo])
+            p = self._prob[src]
+            known = ~np.isnan(p)
+            self._sum[:n] = np.bincount(dst[known], weights=p[known], minlength=n)
+            self._cnt[:n] = np.bincount(dst[known], minlength=n)
+
+    # --- edge log ---
+
+    def load(self, path):
+        """Replace the graph with the edges in the log at path. Returns edges loaded."""
+        with open(path, "rb") as f:
+            st = os.fstat(f.fileno())
+            data = f.read()
+        end = data.rfind(b"\n") + 1
+        edges = _parse_edges(data[:end].decode("utf-8", "replace"))
+        with self._lock:
+            self._clear()
+            added = self.add_edges(edges)
+            self.path, self._file_id, self._offset = path, (st.st_dev, st.st_ino), end
+            self.refreshed_at = time.time()
+        return added
+
+    def refresh(self):
+        """Add the edges appended to the log since the last load/refresh. Returns edges added."""
+        with self._tail_lock:
+            if self.path is None:
+                return 0
+            try:
+                st = os.stat(self.path)
+            except OSError:
+                return 0
+            if (st.st_dev, st.st_ino) != self._file_id or st.st_size < self._offset:
+                before = len(self._edges)
+                return self.load(self.path) - before
+            if st.st_size == self._offset:
+                self.refreshed_at = time.time()
+                return 0
+            with open(self.path, "rb") as f:
+                f.seek(self._offset)
+                data = f.read(st.st_size - self._offset)
+            end = data.rfind(b"\n") + 1  # leave a partially written last line for next time
+            added = self.add_edges(_parse_edges(data[:end].decode("utf-8", "replace")))
+            self._offset += end
+            self.refreshed_at = time.time()
+            return added
+
+    def refresh_if_due(self):
+        """refresh() at most once per refresh_interval seconds; errors are counted, not raised."""
+        if not self.refresh_interval or self.path is None:
+            return 0
+        if self.refreshed_at is not None and time.time() - self.refreshed_at < self.refresh_interval:
+            return 0
+        try:
+            return self.refresh()
+        except Exception as e:
+            self.refreshed_at = time.time()
+            self.refresh_errors += 1
+            print(f"⚠️ Structural graph refresh from {self.path} failed: {e}")
+            return 0
+
+    def follow(self, path, interval=2.0):
+        """Use path as the shared edge log: load it if it exists, then refresh_if_due() every interval seconds."""
+        self.path = path
+        self.refresh_interval = float(interval)
+        if os.path.exists(path):
+            return self.load(path)
+        return 0
+
+    def append(self, edges):
+        """Append (src, dst, edgeType) records to the edge log and pick them up. Returns edges new to this process."""
+        if self.path is None:
+            return self.add_edges([(src, dst) for src, dst, _ in edges])
+        data = "".join(json.dumps({"src": s, "dst": d, "edgeType": t}) + "\n" for s, d, t in edges)
+        if data:
+            # One O_APPEND write per request, so concurrent workers never interleave lines
+            fd = os.open(self.path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+            try:
+                os.write(fd, data.encode("utf-8"))
+            finally:
+                os.close(fd)
+        return self.refresh()
+
+    # --- scoring ---
+
+    def score(self, post_ids, hosts=None) -> np.ndarray:
+        """Neighbour-aggregated scores for post_ids (NaN where the graph has no evidence).
+
+        hosts, if given, holds one iterable of linked hostnames per post; the domain nodes
+        already in the graph for them count as neighbours too. Read-only.
+        """
+        out = np.full(len(post_ids), np.nan, dtype=np.float64)
+        with self._lock:
+            rows, nbrs = [], []
+            for r, pid in enumerate(post_ids):
+                i = self._ids.get(post_node(pid))
+                nb = self._neighbors(i) if i is not None else self._indices[:0]
+                if hosts is not None and hosts[r]:
+                    extra = [j for j in (self._ids.get(domain_node(h)) for h in hosts[r] if h) if j is not None]
+                    if extra:
+                        nb = np.union1d(nb, np.asarray(extra, dtype=np.int64))
+                if len(nb):
+                    rows.append(np.full(len(nb), r, dtype=np.int64))
+                    nbrs.append(nb)
+            if not nbrs:
+                return out
+            rows = np.concatenate(rows)
+            nbrs = np.concatenate(nbrs)
+            s, c, p = self._sum[nbrs], self._cnt[nbrs], self._prob[nbrs]
+        # A known-post neighbour also counts as one observation of its own probability
+        own = ~np.isnan(p)
+        s = s + np.where(own, p, 0.0)
+        c = c + own
+        informed = c > 0
+        rows, s, c = rows[informed], s[informed], c[informed]
+        weight = c / (c + self.prior_weight)
+        num = np.bincount(rows, weights=weight * (s / c), minlength=len(post_ids))
+        den = np.bincount(rows, weights=weight, minlength=len(post_ids))
+        has = den > 0
+        out[has] = (num[has] + self.prior_weight * NEUTRAL_SCORE) / (den[has] + self.prior_weight)
+        return out
+
+    def stats(self):
+        with self._lock:
+            n = len(self._names)
+            types = np.bincount(self._type[:n], minlength=4)
+            return {
+                'nodes': n,
+                'edges': len(self._edges),
+                'posts': int(types[POST]),
+                'domains': int(types[DOMAIN]),
+                'users': int(types[USER]),
+                'known_posts': int(np.count_nonzero(~np.isnan(self._prob[:n]))),
+                'max_nodes': self.max_nodes,
+                'dropped_nodes': self.dropped_nodes,
+                'max_edges': self.max_edges,
+                'dropped_edges': self.dropped_edges,
+                'path': self.path,
+                'refresh_interval': self.refresh_interval,
+                'refresh_errors': self.refresh_errors,
+            }
@@ -0,0 +1,29 @@
+import os
+import sys
+import tempfile
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+# app.py reads its configuration at import time; keep the suite off shared state
+_TMP = tempfile.mkdtemp(prefix="dakugumen-tests-")
+os.environ.setdefault("AE_BACKEND", "numpy")
+os.environ.setdefault("PREDICTION_LOG_SAMPLE_RATE", "0")
+os.environ.setdefault("KNOWN_BAD_PATH", os.path.join(_TMP, "known_bad_links.jsonl"))
+os.environ.setdefault("GRAPH_EDGES_PATH", os.path.join(_TMP, "graph_edges.jsonl"))
+os.environ.setdefault("MODEL_GENERATION_FILE", os.path.join(_TMP, "model-generation"))
+os.environ.setdefault("FIRESTORE_SPILL_PATH", os.path.join(_TMP, "spill.jsonl"))
+
+
+@pytest.fixture(scope="session")
+def app_module():
+    import app
+    assert app.models is not None, app.MODEL_LOAD_ERROR
+    return app
+
+
+@pytest.fixture
+def client(app_module):
+    return app_module.app.test_client()
@@ -0,0 +1,81 @@
+import threading
+import time
+
+import pytest
+
+from admission import AdmissionController
+
+ITEMS = [{"url": f"https://example.com/p/{i}", "post_id": f"post-{i}"} for i in range(3)]
+
+
+def test_admits_within_capacity_and_rejects_after_waiting():
+    ctl = AdmissionController(max_inflight_rows=10, max_wait=0.02)
+    assert ctl.acquire(6) and ctl.acquire(4)
+    t0 = time.monotonic()
+    assert not ctl.acquire(1)
+    assert time.monotonic() - t0 >= 0.02
+    ctl.release(4)
+    assert ctl.acquire(3)
+    assert ctl.stats()["rejected"] == 1 and ctl.stats()["peak_inflight_rows"] == 10
+
+
+def test_oversized_request_runs_alone():
+    ctl = AdmissionController(max_inflight_rows=10, max_wait=0.0)
+    assert ctl.acquire(50)  # nothing else in flight
+    assert not ctl.acquire(1)
+    ctl.release(50)
+    assert ctl.acquire(1)
+    assert not ctl.acquire(50)
+
+
+def test_waiter_is_admitted_when_capacity_frees_up():
+    ctl = AdmissionController(max_inflight_rows=4, max_wait=2.0)
+    assert ctl.acquire(4)
+    threading.Timer(0.05, ctl.release, args=(4,)).start()
+    with ctl.admit(2) as ok:
+        assert ok
+        assert ctl.inflight_rows == 2
+    assert ctl.inflight_rows == 0
+
+
+def test_disabled_controller_admits_everything():
+    ctl = AdmissionController(max_inflight_rows=0)
+    assert all(ctl.acquire(10_000) for _ in range(3))
+
+
+@pytest.fixture
+def saturated(app_module, monkeypatch):
+    ctl = AdmissionController(max_inflight_rows=1, max_wait=0.0)
+    monkeypatch.setattr(app_module, "admission", ctl)
+    assert ctl.acquire(1)
+    yield ctl
+    ctl.release(1)
+
+
+def test_too_many_items_is_413(app_module, client, monkeypatch):
+    monkeypatch.setattr(app_module, "MAX_BATCH_ITEMS", 2)
+    resp = client.post("/predict_batch", json={"items": ITEMS})
+    assert resp.status_code == 413 and resp.get_json()["max_items"] == 2
+    resp = client.post("/scan_posts", json={"posts": [{"post_id": "p", "links": [i["url"] for i in ITEMS]}]})
+    assert resp.status_code == 413
+
+
+def test_saturated_without_degraded_mode_is_503(app_module, client, monkeypatch, saturated):
+    monkeypatch.setattr(app_module, "DEGRADED_MODE", False)
+    resp = client.post("/predict_batch", json={"items": ITEMS})
+    assert resp.status_code == 503
+    assert resp.headers["Retry-After"] == str(app_module.RETRY_AFTER_SECONDS)
+
+
+def test_saturated_with_degraded_mode_answers_heuristically(app_module, client, monkeypatch, saturated):
+    monkeypatch.setattr(app_module, "DEGRADED_MODE", True)
+    body = client.post("/predict_batch", json={"items": ITEMS}).get_json()
+    assert body["degraded"] is True
+    assert all(p["degraded"] and p["score_source"] in ("cache", "heuristic") for p in body["predictions"])
+
+    body = client.post("/predict", json=ITEMS[0]).get_json()
+    assert body["degraded"] is True
+
+    body = client.post("/scan_posts", json={"posts": [{"post_id": "p", "links": [i["url"] for i in ITEMS]}]}).get_json()
+    assert body["degraded"] is True and body["results"][0]["degraded"] is True
+    assert saturated.inflight_rows == 1  # degraded answers never took capacity
@@ -0,0 +1,88 @@
+import io
+import json
+import os
+import zipfile
+
+import numpy as np
+import pytest
+
+from ae_backends import DEFAULT_KERAS_PATH, KerasAutoencoder, NumpyAutoencoder
+
+URLS = [
+    "https://bit.ly/fake-login-scam?fbclid=EXAMPLE",
+    "http://192.168.0.1/~user/a_b-c/index.php?id=1&x=%20#top",
+    "https://www.abs-cbn.com/news/regions/2025/8/20/flood-control-projects",
+    "http://xn--80ak6aa92e.com/login",
+    "https://secure-login.account-verify.com:8443/" + "a" * 500,
+    "",
+]
+
+
+def _decisions(errors, threshold):
+    # score_items() for a post without structural evidence (structural score 0.5)
+    content = np.minimum(errors / (threshold * 2), 1.0)
+    return 0.6 * content + 0.4 * 0.5 > float(os.environ.get("FINAL_SCORE_CUTOFF", "0.5"))
+
+
+def _errors(model, x):
+    return np.mean(np.square(x.astype(np.float64) - np.asarray(model.predict(x, verbose=0), dtype=np.float64)), axis=1)
+
+
+@pytest.fixture(scope="module")
+def corpus(app_module):
+    from benchmark import synthetic_urls
+    urls = URLS + synthetic_urls(2000, seed=7)
+    scaled = app_module.models.scaler.transform(app_module.extract_feature_matrix(urls)).astype(np.float32)
+    return scaled, app_module.models.threshold
+
+
+class _KerasArchiveReference:
+    """Float64 forward pass straight from the .keras archive's config and weights (no TensorFlow)."""
+
+    def __init__(self, path=DEFAULT_KERAS_PATH):
+        h5py = pytest.importorskip("h5py")
+        with zipfile.ZipFile(path) as z:
+            config = json.loads(z.read("config.json"))
+            weights = h5py.File(io.BytesIO(z.read("model.weights.h5")), "r")
+            self.layers = []
+            for layer in config["config"]["layers"]:
+                if layer["class_name"] != "Dense":
+                    continue
+                name = layer["config"]["name"]
+                kernel = np.asarray(weights[f"layers/{name}/vars/0"], dtype=np.float64)
+                bias = np.asarray(weights[f"layers/{name}/vars/1"], dtype=np.float64)
+                self.layers.append((kernel, bias, layer["config"]["activation"]))
+
+    def predict(self, x, verbose=0):
+        h = np.asarray(x, dtype=np.float64)
+        for kernel, bias, activation in self.layers:
+            h = h @ kernel + bias
+            if activation == "relu":
+                h = np.maximum(h, 0.0)
+            elif activation != "linear":
+                raise AssertionError(f"unexpected activation {activation}")
+        return h
+
+
+def _assert_parity(reference, candidate, corpus):
+    scaled, threshold = corpus
+    ref, got = _errors(reference, scaled), _errors(candidate, scaled)
+    np.testing.assert_allclose(got, ref, rtol=1e-5, atol=1e-9)
+    np.testing.assert_array_equal(_decisions(got, threshold), _decisions(ref, threshold))
+
+
+def test_numpy_weights_are_the_keras_weights():
+    reference, exported = _KerasArchiveReference(), NumpyAutoencoder.load()
+    assert [a for _, _, a in exported.layers] == [a for _, _, a in reference.layers]
+    for (k, b, _), (rk, rb, _) in zip(exported.layers, reference.layers):
+        np.testing.assert_array_equal(k, rk.astype(np.float32))
+        np.testing.assert_array_equal(b, rb.astype(np.float32))
+
+
+def test_numpy_backend_matches_the_keras_archive(corpus):
+    _assert_parity(_KerasArchiveReference(), NumpyAutoencoder.load(), corpus)
+
+
+def test_numpy_backend_matches_keras(corpus):
+    pytest.importorskip("tensorflow")
+    _assert_parity(KerasAutoencoder.load(), NumpyAutoencoder.load(), corpus)
@@ -0,0 +1,17 @@
+import json
+import os
+import subprocess
+import sys
+
+from conftest import ROOT
+
+
+def test_endpoint_sweep_runs_past_serving_limits(tmp_path):
+    # Sizes above MAX_BATCH_ITEMS / MAX_INFLIGHT_ROWS must be measured, not answered with 413s
+    report = tmp_path / "bench.json"
+    env = dict(os.environ, MAX_BATCH_ITEMS="50", MAX_INFLIGHT_ROWS="50")
+    subprocess.run([sys.executable, os.path.join(ROOT, "benchmark.py"), "--sizes", "1,120",
+                    "--stages", "endpoint_predict_batch", "--budget", "10", "-o", str(report)],
+                   check=True, env=env, cwd=ROOT, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    results = json.loads(report.read_text())["results"]
+    assert sorted(r["batch_size"] for r in results) == [1, 120]
@@ -0,0 +1,27 @@
+import json
+import os
+import subprocess
+import sys
+
+from conftest import ROOT
+
+
+def test_output_identical_across_worker_counts(tmp_path):
+    # Known posts link to a few domains; unknown posts are scored through the graph
+    edges = tmp_path / "edges.jsonl"
+    with open(os.path.join(ROOT, "post_node_map.json")) as f:
+        known = list(json.load(f))[:6]
+    edges.write_text("".join(json.dumps({"src": f"post:{p}", "dst": f"domain:d{i % 3}.com"}) + "\n" for i, p in enumerate(known)))
+    lines = tmp_path / "in.jsonl"
+    lines.write_text("".join(
+        json.dumps({"url": f"https://d{i % 4}.com/p/{i}?q={i % 7}", "post_id": f"post-{i % 13}"}) + "\n" for i in range(120)))
+    env = dict(os.environ, GRAPH_EDGES_PATH=str(edges), STRUCTURAL_GRAPH="1")
+    outputs = []
+    for workers in (1, 3):
+        out = tmp_path / f"out{workers}.jsonl"
+        subprocess.run([sys.executable, os.path.join(ROOT, "bulk_score.py"), str(lines), "-o", str(out),
+                        "--chunk-size", "10", "--workers", str(workers)], check=True, env=env, cwd=ROOT,
+                       stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        outputs.append(out.read_text())
+    assert outputs[0] == outputs[1]
+    assert len(outputs[0].splitlines()) == 120
@@ -0,0 +1,52 @@
+import pytest
+
+from domain_parser import DEFAULT_SNAPSHOT, DomainParser, host_of
+
+CASES = [
+    ("https://news.bbc.co.uk/a", ("news", "bbc", "co.uk")),
+    ("http://user:pw@www.Example.COM:8080/x", ("www", "Example", "COM")),
+    ("http://192.168.0.1/a", ("", "192.168.0.1", "")),
+    ("http://[::1]/x", ("", "[::1]", "")),
+    ("https://a.b.kawasaki.jp/", ("", "a", "b.kawasaki.jp")),  # wildcard rule
+    ("https://city.kawasaki.jp/", ("", "city", "kawasaki.jp")),  # exception rule
+    ("https://localhost/", ("", "localhost", "")),
+    ("https://foo.example.co.uk./x", ("foo", "example", "co.uk")),
+    ("example.com/path?q=1", ("", "example", "com")),
+    ("https://a。b。com/", ("a", "b", "com")),
+]
+
+
+@pytest.fixture(scope="module")
+def parser():
+    return DomainParser.from_snapshot(shorteners=["bit.ly"], memo_size=16)
+
+
+@pytest.mark.parametrize("url,expected", CASES)
+def test_parse(parser, url, expected):
+    assert tuple(parser.parse(url))[:3] == expected
+
+
+def test_shorteners_and_memo(parser):
+    assert parser.parse("https://bit.ly/x").shortened == 1
+    assert parser.parse("https://BIT.LY/y").shortened == 1
+    assert parser.parse("https://sub.example.com/").shortened == 0
+    before = parser.stats()["hits"]
+    parser.parse("https://bit.ly/z")
+    assert parser.stats()["hits"] == before + 1
+    assert parser.stats()["memo_size"] <= 16
+
+
+def test_host_of():
+    assert host_of("https://u@Host.example.com:443/p?q#f") == "Host.example.com"
+    assert host_of("//cdn.example.net/x") == "cdn.example.net"
+    assert host_of("http://[2001:db8::1]:80/") == "[2001:db8::1]"
+
+
+def test_matches_tldextract_on_the_same_snapshot():
+    tldextract = pytest.importorskip("tldextract")
+    from benchmark import synthetic_urls
+    ext = tldextract.TLDExtract(suffix_list_urls=["file://" + DEFAULT_SNAPSHOT], cache_dir=None, fallback_to_snapshot=False)
+    parser = DomainParser.from_snapshot()
+    for url in synthetic_urls(2000) + [u for u, _ in CASES]:
+        r = ext(url)
+        assert tuple(parser.parse(url))[:3] == (r.subdomain, r.domain, r.suffix), url
@@ -0,0 +1,126 @@
+import csv
+import json
+import os
+import sys
+
+import numpy as np
+import pytest
+
+from conftest import ROOT
+
+sys.path.insert(0, os.path.join(ROOT, "data_pipeline"))
+
+import export_feedback  # noqa: E402
+from local_firestore import LocalFirestoreClient  # noqa: E402
+
+APP = "test-app"
+
+
+def _seed(fs_dir, reports, flagged, client_ts=None, written=True):
+    """Reports are written one second apart; client_ts(i) overrides the client-side timestamp."""
+    db = LocalFirestoreClient(str(fs_dir))
+    client_ts = client_ts or (lambda i: f"2025-01-01T00:00:{i:02d}+00:00")
+    col = db.collection(export_feedback.COLLECTIONS["user_reports"][0].format(app_id=APP))
+    for i, (rtype, payload) in enumerate(reports):
+        doc = {"type": rtype, "payload": payload, "userId": "u", "timestamp": client_ts(i)}
+        if written:
+            doc[export_feedback.WRITE_TIME_FIELD] = f"2025-01-01T00:00:{i:02d}+00:00"
+        col.document(f"r{i:03d}").set(doc)
+    col = db.collection(export_feedback.COLLECTIONS["flagged_links"][0].format(app_id=APP))
+    for i, url in enumerate(flagged):
+        doc = {"url": url, "userId": "u", "timestamp": f"2025-01-01T00:01:{i:02d}+00:00"}
+        if written:
+            doc[export_feedback.WRITE_TIME_FIELD] = doc["timestamp"]
+        col.document(f"f{i:03d}").set(doc)
+
+
+def _run(tmp_path, fs_dir, *extra):
+    args = ["--app-id", APP, "--local-firestore", str(fs_dir), "--out-dir", str(tmp_path / "out"),
+            "--output", str(tmp_path / "labels.csv"), "--format", "csv", "--page-size", "2", *extra]
+    assert export_feedback.main(args) == 0
+
+
+def _urls(path):
+    with open(path) as f:
+        return [json.loads(line)["url"] for line in f]
+
+
+def _doc_ids(path):
+    with open(path) as f:
+        return sorted(r["doc_id"] for r in csv.DictReader(f))
+
+
+def test_known_bad_only_gets_user_confirmed_links(tmp_path):
+    fs_dir = tmp_path / "fs"
+    _seed(fs_dir, [
+        ("false_negative", {"url": "https://missed.example.com/a", "postId": "p1"}),
+        ("true_positive", {"links": ["https://confirmed.example.com/b"], "postId": "p2"}),
+        ("false_positive", {"links": ["https://fine.example.com/c"], "postId": "p3"}),
+        ("true_negative", {"links": ["https://ok.example.com/d"], "postId": "p4"}),
+    ], ["https://model-flagged.example.com/e", "https://confirmed.example.com/b"])
+    known_bad, candidates = tmp_path / "known_bad.jsonl", tmp_path / "candidates.jsonl"
+    _run(tmp_path, fs_dir, "--include-flagged", "--known-bad", str(known_bad), "--known-bad-candidates", str(candidates))
+
+    assert sorted(_urls(known_bad)) == ["https://confirmed.example.com/b", "https://missed.example.com/a"]
+    assert sorted(_urls(candidates)) == ["https://confirmed.example.com/b", "https://model-flagged.example.com/e"]
+
+
+def test_incremental_export_matches_full(tmp_path):
+    fs_dir = tmp_path / "fs"
+    reports = [("false_negative", {"url": f"https://x{i}.example.com/", "postId": f"p{i}"}) for i in range(5)]
+    _seed(fs_dir, reports, [])
+    _run(tmp_path, fs_dir)
+    more = reports + [("true_negative", {"links": [f"https://y{i}.example.com/"], "postId": f"q{i}"}) for i in range(5, 9)]
+    _seed(fs_dir, more, [])
+    _run(tmp_path, fs_dir)
+    incremental = _doc_ids(tmp_path / "labels.csv")
+
+    full_dir = tmp_path / "full"
+    full_dir.mkdir()
+    _run(full_dir, fs_dir)
+    full = _doc_ids(full_dir / "labels.csv")
+    assert incremental == full
+    assert len(full) == 9
+
+
+def test_checkpoint_follows_server_write_time_not_client_clock(tmp_path):
+    fs_dir = tmp_path / "fs"
+    reports = [("false_negative", {"url": f"https://x{i}.example.com/", "postId": f"p{i}"}) for i in range(3)]
+    _seed(fs_dir, reports, [])
+    _run(tmp_path, fs_dir)
+    # A client whose clock runs a day behind writes after the checkpoint
+    more = reports + [("true_positive", {"url": "https://late.example.com/", "postId": "p3"})]
+    _seed(fs_dir, more, [], client_ts=lambda i: f"2024-12-31T00:00:{i:02d}+00:00")
+    _run(tmp_path, fs_dir)
+    assert _doc_ids(tmp_path / "labels.csv") == ["r000", "r001", "r002", "r003"]
+
+
+def test_documents_without_write_time_are_exported_once(tmp_path):
+    fs_dir = tmp_path / "fs"
+    _seed(fs_dir, [("false_negative", {"url": "https://old.example.com/", "postId": "p0"})], [], written=False)
+    _run(tmp_path, fs_dir)
+    _run(tmp_path, fs_dir)
+    assert _doc_ids(tmp_path / "labels.csv") == ["r000"]
+
+
+def test_update_gnn_keeps_labels_out_of_gnn_probs(tmp_path):
+    fs_dir = tmp_path / "fs"
+    _seed(fs_dir, [("false_negative", {"url": "https://bad.example.com/", "postId": "p1"})], [])
+    db = LocalFirestoreClient(str(fs_dir))
+    edges = db.collection(export_feedback.COLLECTIONS["graph_edges"][0].format(app_id=APP))
+    for i, (src, dst) in enumerate([("post:p1", "domain:bad.example.com"), ("post:p2", "domain:bad.example.com")]):
+        edges.document(f"e{i}").set({"src": src, "dst": dst, "edgeType": "contains",
+                                     export_feedback.WRITE_TIME_FIELD: f"2025-01-01T00:02:{i:02d}+00:00"})
+    with pytest.raises(SystemExit):
+        _run(tmp_path, fs_dir, "--update-gnn")  # no implicit --gnn-dir
+
+    gnn_dir = tmp_path / "gnn"
+    gnn_dir.mkdir()
+    _run(tmp_path, fs_dir, "--full", "--update-gnn", "--gnn-dir", str(gnn_dir))
+    with open(tmp_path / "out" / export_feedback.POST_LABELS_FILE) as f:
+        assert json.load(f) == {"p1": 1}
+    with open(gnn_dir / "post_node_map.json") as f:
+        node_map = json.load(f)
+    assert list(node_map) == ["p2"]
+    probs = np.load(gnn_dir / "gnn_probs.npy")
+    assert len(probs) == 1 and 0.5 < probs[0] < 1.0
@@ -0,0 +1,199 @@
+import fcntl
+import json
+import os
+import subprocess
+import sys
+import threading
+import time
+from datetime import datetime, timezone
+
+import pytest
+
+from firestore_writer import CLIENT_TIMESTAMP_KEY, BatchedFirestoreWriter
+from local_firestore import SERVER_TIMESTAMP_MARKER, LocalFirestoreClient
+
+
+class FlakyClient(LocalFirestoreClient):
+    """LocalFirestoreClient whose commits raise `error` while it is set."""
+
+    def __init__(self, root):
+        super().__init__(root)
+        self.error = None
+
+    def batch(self):
+        batch = super().batch()
+        commit = batch.commit
+
+        def checked():
+            if self.error is not None:
+                raise self.error
+            commit()
+        batch.commit = checked
+        return batch
+
+
+def _dead_pid():
+    proc = subprocess.Popen([sys.executable, "-c", "pass"])
+    proc.wait()
+    return proc.pid
+
+
+def _docs(client, path="col"):
+    return sorted(d.to_dict()["n"] for d in client.collection(path).stream())
+
+
+def _write_spill(path, n):
+    with open(path, "w") as f:
+        for i in range(n):
+            f.write(json.dumps({"path": "col", "data": {"n": i}}) + "\n")
+
+
+@pytest.fixture
+def writer_for(tmp_path):
+    writers = []
+
+    def make(client, **kw):
+        w = BatchedFirestoreWriter(client, str(tmp_path / "spill.jsonl"), flush_interval=0.01, backoff_base=0.0, **kw)
+        writers.append(w)
+        return w
+    yield make
+    for w in writers:
+        w.close()
+
+
+def test_replay_commits_spill_of_exited_process(tmp_path, writer_for):
+    client = FlakyClient(str(tmp_path / "fs"))
+    w = writer_for(client, max_batch=3)
+    _write_spill(f"{w.spill_path}.{_dead_pid()}", 7)
+    w._replay_spill()
+    assert _docs(client) == list(range(7))
+    assert w._spill_files() == []
+    assert not any(".replaying." in p for p in os.listdir(tmp_path))
+
+
+def test_failed_replay_keeps_documents(tmp_path, writer_for):
+    client = FlakyClient(str(tmp_path / "fs"))
+    client.error = RuntimeError("unavailable")
+    w = writer_for(client, max_batch=3)
+    _write_spill(f"{w.spill_path}.{_dead_pid()}", 7)
+    w._replay_spill()
+    with open(w._own_spill_path()) as f:
+        assert sorted(json.loads(line)["data"]["n"] for line in f) == list(range(7))
+
+    client.error = None
+    w._replay_spill()
+    assert _docs(client) == list(range(7))
+
+
+def test_crash_during_replay_leaves_claimed_file(tmp_path, writer_for):
+    client = FlakyClient(str(tmp_path / "fs"))
+    client.error = KeyboardInterrupt()  # not retried: stands in for the process dying mid-commit
+    w = writer_for(client)
+    _write_spill(f"{w.spill_path}.{_dead_pid()}", 4)
+    with pytest.raises(KeyboardInterrupt):
+        w._replay_spill()
+    claimed = [p for p in os.listdir(tmp_path) if ".replaying." in p]
+    assert len(claimed) == 1
+    with open(tmp_path / claimed[0]) as f:
+        assert len(f.readlines()) == 4
+
+
+def test_restarted_thread_keeps_queued_documents(tmp_path, writer_for):
+    client = FlakyClient(str(tmp_path / "fs"))
+    w = writer_for(client)
+    dead = threading.Thread(target=lambda: None)
+    dead.start()
+    dead.join()
+    # Documents queued while the writer thread was dead in this process
+    w._pid, w._thread = os.getpid(), dead
+    for i in range(5):
+        w._pending += 1
+        w._queue.put_nowait(("col", {"n": i}))
+    w.enqueue("col", {"n": 5})
+    assert w.flush(timeout=5.0)
+    assert _docs(client) == list(range(6))
+
+
+def test_commit_failure_spills_and_recovers(tmp_path, writer_for):
+    client = FlakyClient(str(tmp_path / "fs"))
+    client.error = RuntimeError("unavailable")
+    w = writer_for(client, max_retries=0)
+    for i in range(3):
+        w.enqueue("col", {"n": i})
+    assert w.flush(timeout=5.0)
+    assert w.spilled == 3 and _docs(client) == []
+
+    client.error = None
+    w.enqueue("col", {"n": 3})
+    assert w.flush(timeout=5.0)
+    w.close()
+    assert _docs(client) == list(range(4))
+    assert not os.path.exists(w._own_spill_path())
+
+
+def _wait_for(cond, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while not cond() and time.monotonic() < deadline:
+        time.sleep(0.01)
+    return cond()
+
+
+def test_start_replays_leftover_spills_without_traffic(tmp_path, writer_for):
+    client = FlakyClient(str(tmp_path / "fs"))
+    w = writer_for(client)
+    _write_spill(f"{w.spill_path}.{_dead_pid()}", 3)
+    w.start()
+    assert _wait_for(lambda: _docs(client) == [0, 1, 2])
+    assert w.enqueued == 0
+
+
+def test_idle_writer_replays_on_a_timer(tmp_path, writer_for):
+    client = FlakyClient(str(tmp_path / "fs"))
+    client.error = RuntimeError("unavailable")
+    w = writer_for(client, max_retries=0, replay_interval=0.05)
+    for i in range(3):
+        w.enqueue("col", {"n": i})
+    assert w.flush(timeout=5.0) and w.spilled >= 3
+    client.error = None  # Firestore is back, but nothing new is enqueued
+    assert _wait_for(lambda: _docs(client) == [0, 1, 2])
+    assert _wait_for(lambda: not os.path.exists(w._own_spill_path()))
+
+
+def test_spilled_server_timestamps_keep_the_spill_time(tmp_path, writer_for):
+    client = FlakyClient(str(tmp_path / "fs"))
+    client.error = RuntimeError("unavailable")
+    w = writer_for(client, max_retries=0, replay_interval=3600, write_time_field="writtenAt")
+    before = datetime.now(timezone.utc)
+    w.enqueue("col", {"n": 0, "timestamp": SERVER_TIMESTAMP_MARKER})
+    assert w.flush(timeout=5.0)
+    with open(w._own_spill_path()) as f:
+        assert CLIENT_TIMESTAMP_KEY in f.read()
+    time.sleep(0.2)
+    client.error = None
+    replay_started = datetime.now(timezone.utc)
+    w._replay_spill()
+    (doc,) = [d.to_dict() for d in client.collection("col").stream()]
+    stamped = datetime.fromisoformat(str(doc["timestamp"]))
+    assert before <= stamped < replay_started
+    # The write time is when the replay actually reached Firestore
+    assert datetime.fromisoformat(doc["writtenAt"]) >= replay_started
+
+
+def test_spill_ownership_follows_the_lock_not_the_pid(tmp_path, writer_for):
+    w = writer_for(FlakyClient(str(tmp_path / "fs")))
+    w.start()
+    assert w._owner_alive(os.getpid())
+    # A live process whose pid matches a dead writer's leftover (unlocked) lock file
+    reused = os.getppid()
+    open(f"{w.spill_path}.{reused}.lock", "w").close()
+    assert not w._owner_alive(reused)
+    # A writer that still holds its lock counts as alive whatever its pid looks like
+    dead = _dead_pid()
+    fd = os.open(f"{w.spill_path}.{dead}.lock", os.O_RDWR | os.O_CREAT)
+    try:
+        fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        _write_spill(f"{w.spill_path}.{dead}", 2)
+        _write_spill(f"{w.spill_path}.{reused}", 2)
+        assert w._spill_files() == [f"{w.spill_path}.{reused}"]
+    finally:
+        os.close(fd)
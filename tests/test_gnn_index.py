@@ -0,0 +1,51 @@
+import json
+import os
+
+import numpy as np
+
+import gnn_index
+from conftest import ROOT
+from gnn_index import GnnScoreIndex, load_gnn_index
+
+
+def _write_sources(directory, post_node_map, probs):
+    with open(directory / "post_node_map.json", "w") as f:
+        json.dump(post_node_map, f)
+    np.save(directory / "gnn_probs.npy", np.asarray(probs, dtype=np.float32))
+
+
+def _build(directory):
+    assert gnn_index.main(["build", "--node-map", str(directory / "post_node_map.json"),
+                           "--probs", str(directory / "gnn_probs.npy"), "--out-dir", str(directory)]) == 0
+
+
+def test_staleness_follows_content_not_mtime(tmp_path):
+    _write_sources(tmp_path, {"a": 0, "b": 1}, [0.1, 0.9])
+    _build(tmp_path)
+    index_files = [tmp_path / n for n in (gnn_index.KEYS_FILE, gnn_index.PROBS_FILE)]
+
+    # Sources touched after the index (e.g. by a checkout) but unchanged: the index is kept
+    later = max(os.path.getmtime(p) for p in index_files) + 60
+    for name in ("post_node_map.json", "gnn_probs.npy"):
+        os.utime(tmp_path / name, (later, later))
+    assert isinstance(load_gnn_index(str(tmp_path)).keys, np.memmap)
+
+    # Sources changed but older than the index: rebuilt in memory from the sources
+    _write_sources(tmp_path, {"a": 0, "b": 1}, [0.1, 0.2])
+    earlier = min(os.path.getmtime(p) for p in index_files) - 60
+    for name in ("post_node_map.json", "gnn_probs.npy"):
+        os.utime(tmp_path / name, (earlier, earlier))
+    index = load_gnn_index(str(tmp_path))
+    assert not isinstance(index.keys, np.memmap)
+    np.testing.assert_allclose(index.lookup(["b"]), [0.2], rtol=1e-6)
+
+
+def test_index_without_fingerprints_is_rebuilt(tmp_path):
+    _write_sources(tmp_path, {"a": 0}, [0.7])
+    GnnScoreIndex.from_node_map({"a": 0}, [0.3]).save(str(tmp_path))
+    assert not os.path.exists(tmp_path / gnn_index.META_FILE)
+    np.testing.assert_allclose(load_gnn_index(str(tmp_path)).lookup(["a"]), [0.7], rtol=1e-6)
+
+
+def test_shipped_index_matches_its_sources():
+    assert gnn_index.index_is_current(ROOT, os.path.join(ROOT, "post_node_map.json"), os.path.join(ROOT, "gnn_probs.npy"))
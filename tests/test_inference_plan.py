@@ -0,0 +1,65 @@
+import numpy as np
+import pandas as pd
+import pytest
+from sklearn.preprocessing import RobustScaler, StandardScaler
+
+from ae_backends import NumpyAutoencoder
+from inference_plan import FoldedAutoencoderPlan
+
+
+def _reference_errors(scaler, model, full):
+    scaled = np.asarray(scaler.transform(full), dtype=np.float32)
+    recon = model.predict(scaled).astype(np.float64)
+    return np.mean(np.square(scaled.astype(np.float64) - recon), axis=1)
+
+
+@pytest.fixture(scope="module")
+def urls():
+    from benchmark import synthetic_urls
+    return ["", "http://192.168.0.1:8080/~a/b.php?x=1", "https://xn--80ak6aa92e.com/" + "z" * 300] + synthetic_urls(1500, seed=5)
+
+
+def test_live_plan_matches_scaler_and_full_model(app_module, urls):
+    bundle = app_module.models
+    assert bundle.inference_plan is not None
+    builder = bundle.feature_builder(np.float32)
+    expected = _reference_errors(bundle.scaler, bundle.autoencoder_model, builder.transform(urls))
+    got = bundle.inference_plan.reconstruction_errors(builder.transform(urls, active_only=True))
+    np.testing.assert_allclose(got, expected, rtol=1e-5, atol=1e-7)
+
+
+@pytest.mark.filterwarnings("ignore:X does not have valid feature names")
+def test_plan_with_nonzero_inactive_columns(app_module, urls):
+    # A mean-filling scaler: every column the builder doesn't compute holds a non-zero mean_
+    columns = app_module.models.feature_builder().columns
+    rng = np.random.default_rng(0)
+    train = pd.DataFrame(rng.gamma(2.0, 3.0, size=(500, len(columns))) + 1.0, columns=columns)
+    scaler = StandardScaler().fit(train)
+    builder = app_module.FeatureMatrixBuilder.for_scaler(scaler)
+    model = NumpyAutoencoder.load()
+    full = builder.transform(urls)
+    inactive = np.setdiff1d(np.arange(len(columns)), builder.active_columns)
+    assert len(inactive) and np.all(full[:, inactive] != 0)
+
+    plan = FoldedAutoencoderPlan.build(scaler, model, builder.active_columns, builder.base_row)
+    got = plan.reconstruction_errors(builder.transform(urls, active_only=True))
+    np.testing.assert_allclose(got, _reference_errors(scaler, model, full), rtol=1e-5, atol=1e-7)
+
+
+@pytest.mark.parametrize("scaler_cls", [StandardScaler, RobustScaler])
+def test_plan_matches_on_random_models(scaler_cls):
+    rng = np.random.default_rng(1)
+    n_features, n_active = 40, 13
+    dims = [n_features, 24, 8, 24, n_features]
+    acts = ["tanh", "relu", "sigmoid", "linear"]
+    model = NumpyAutoencoder([(rng.standard_normal((a, b)) * 0.3, rng.standard_normal(b) * 0.1, act)
+                              for a, b, act in zip(dims, dims[1:], acts)])
+    scaler = scaler_cls().fit(rng.normal(5.0, 2.0, size=(300, n_features)))
+    active = np.sort(rng.choice(n_features, n_active, replace=False))
+    base = rng.uniform(-3.0, 9.0, n_features)  # constant, non-zero inactive values
+    x_active = rng.normal(5.0, 4.0, size=(200, n_active))
+    full = np.tile(base, (len(x_active), 1))
+    full[:, active] = x_active
+
+    plan = FoldedAutoencoderPlan.build(scaler, model, active, base)
+    np.testing.assert_allclose(plan.reconstruction_errors(x_active), _reference_errors(scaler, model, full), rtol=1e-5, atol=1e-7)
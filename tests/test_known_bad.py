@@ -0,0 +1,89 @@
+import os
+import time
+
+import numpy as np
+
+from known_bad import BloomFilter, KnownBadIndex, _hash_keys
+
+
+def _index(**kwargs):
+    return KnownBadIndex(domains_of=lambda u: [u.split("/")[2]], **kwargs)
+
+
+def test_url_and_domain_matches():
+    idx = _index()
+    idx.add([("url", "https://evil.xyz/login"), ("domain", "Phish.COM.")])
+    assert idx.match(["https://evil.xyz/login", "https://phish.com/a", "https://ok.com/"]) == ["url", "domain", None]
+
+
+def test_missing_urls_never_match():
+    idx = _index()
+    idx.add([("url", "https://evil.xyz/login"), ("domain", "phish.com")])
+    assert idx.match([None, "", 42, "https://phish.com/x"]) == [None, None, None, "domain"]
+
+
+def test_merge_and_bloom_growth_keep_every_key():
+    idx = _index(merge_threshold=100)
+    urls = [f"https://h{i}.com/{i}" for i in range(5000)]
+    for start in range(0, len(urls), 700):
+        idx.add([("url", u) for u in urls[start:start + 700]])
+    assert len(idx) == 5000
+    assert idx.add([("url", urls[0])]) == 0
+    assert all(m == "url" for m in idx.match(urls))
+    assert not any(idx.match([f"https://n{i}.org/" for i in range(5000)]))
+
+
+def test_bloom_false_positive_rate():
+    bloom = BloomFilter(10000, error_rate=0.01)
+    bloom.add(_hash_keys([f"in{i}" for i in range(10000)]))
+    assert bloom.contains(_hash_keys([f"in{i}" for i in range(10000)])).all()
+    assert np.mean(bloom.contains(_hash_keys([f"out{i}" for i in range(20000)]))) < 0.03
+
+
+def test_refresh_reads_appended_lines_and_reloads_replaced_file(tmp_path):
+    path = tmp_path / "kb.jsonl"
+    path.write_text('https://a.com/x\n{"url": "https://b.com/y"}\n{"id": "1", "data": {"url": "https://c.com/z"}}\n{"url": "https://partial')
+    idx = _index()
+    assert idx.load(str(path)) == 3
+    with open(path, "a") as f:
+        f.write('/p"}\nd.com\n')
+    assert idx.refresh() == 2
+    assert idx.match(["https://partial/p", "https://d.com/q"]) == ["url", "domain"]
+    path.rename(tmp_path / "old.jsonl")
+    path.write_text("https://only.com/\n")
+    idx.refresh()
+    assert len(idx) == 1
+    assert idx.match(["https://only.com/", "https://a.com/x"]) == ["url", None]
+
+
+def test_follow_leaves_the_refresher_to_the_first_lookup(tmp_path):
+    # app.py calls follow() at import, i.e. in the gunicorn master under preload_app
+    path = tmp_path / "kb.jsonl"
+    path.write_text("https://a.com/x\n")
+    idx = _index()
+    idx.follow(str(path), interval=0.05)
+    assert idx._thread is None
+    assert idx.match(["https://a.com/x"]) == ["url"]
+    assert idx._thread.is_alive() and idx._pid == os.getpid()
+    with open(path, "a") as f:
+        f.write("https://b.com/y\n")
+    deadline = time.time() + 5
+    while len(idx) < 2 and time.time() < deadline:
+        time.sleep(0.02)
+    assert idx.match(["https://b.com/y"]) == ["url"]
+
+
+def test_predict_batch_with_missing_url_and_domain_entries(app_module, client, monkeypatch):
+    idx = KnownBadIndex(normalize=app_module._normalize_url, domains_of=app_module._host_and_parents)
+    idx.add([("domain", "phish.com"), ("url", "https://evil.xyz/login")])
+    monkeypatch.setattr(app_module, "known_bad_index", idx)
+    resp = client.post("/predict_batch", json={"items": [
+        {"post_id": "p1"},
+        {"url": "https://www.phish.com/a", "post_id": "p1"},
+        {"url": "https://example.com/", "post_id": "p2"},
+    ]})
+    assert resp.status_code == 200
+    preds = resp.get_json()["predictions"]
+    assert "known_bad" not in preds[0]
+    assert preds[1]["known_bad"] == "domain" and preds[1]["is_phishing"]
+    assert "known_bad" not in preds[2]
@@ -0,0 +1,87 @@
+import re
+import time
+
+import pytest
+
+from metrics import CONTENT_TYPE
+from microbatch import MicroBatcher
+
+_SAMPLE = re.compile(r'^(\w+)(?:\{(.*)\})? (\S+)$')
+
+
+def scrape(client):
+    r = client.get("/metrics")
+    assert r.status_code == 200 and r.headers["Content-Type"] == CONTENT_TYPE
+    samples, types = {}, {}
+    for line in r.get_data(as_text=True).splitlines():
+        if line.startswith("# TYPE "):
+            _, _, name, kind = line.split(" ")
+            types[name] = kind
+            continue
+        if line.startswith("#"):
+            continue
+        m = _SAMPLE.match(line)
+        assert m, line
+        labels = tuple(sorted(re.findall(r'(\w+)="([^"]*)"', m.group(2) or "")))
+        samples[(m.group(1), labels)] = float(m.group(3).replace("+Inf", "inf"))
+    return samples, types
+
+
+def value(samples, name, **labels):
+    return samples.get((name, tuple(sorted(labels.items()))), 0.0)
+
+
+@pytest.fixture
+def batcher(app_module, monkeypatch):
+    b = MicroBatcher(app_module._score_content_rows, max_wait=0.001)
+    monkeypatch.setattr(app_module, "predict_batcher", b)
+    return b
+
+
+def test_metrics_after_predict_and_predict_batch(client, batcher):
+    before, _ = scrape(client)
+    for i in range(3):
+        assert client.post("/predict", json={"url": f"https://metrics-{i}.example/login", "post_id": f"m{i}"}).status_code == 200
+    assert client.post("/predict", json={}).status_code == 400
+    items = [{"url": f"https://metrics-batch-{i}.example/a", "post_id": "mb"} for i in range(5)]
+    for _ in range(2):  # the second batch is served from the prediction cache
+        assert client.post("/predict_batch", json={"items": items}).status_code == 200
+    deadline = time.time() + 5
+    while batcher.items < 3 and time.time() < deadline:  # stats land just after the results
+        time.sleep(0.01)
+    after, types = scrape(client)
+
+    def delta(name, **labels):
+        return value(after, name, **labels) - value(before, name, **labels)
+
+    # Request counters by route and status
+    assert types["dakugumen_requests_total"] == "counter"
+    assert delta("dakugumen_requests_total", endpoint="/predict", status="200") == 3
+    assert delta("dakugumen_requests_total", endpoint="/predict", status="400") == 1
+    assert delta("dakugumen_requests_total", endpoint="/predict_batch", status="200") == 2
+
+    # Latency histogram: cumulative buckets ending in +Inf == _count
+    assert types["dakugumen_request_seconds"] == "histogram"
+    for endpoint, n in (("/predict", 4), ("/predict_batch", 2)):
+        assert delta("dakugumen_request_seconds_count", endpoint=endpoint) == n
+        buckets = sorted((float(dict(labels)["le"]), v) for (name, labels), v in after.items()
+                         if name == "dakugumen_request_seconds_bucket" and dict(labels)["endpoint"] == endpoint)
+        counts = [v for _, v in buckets]
+        assert buckets[-1][0] == float("inf") and counts == sorted(counts)
+        assert counts[-1] == value(after, "dakugumen_request_seconds_count", endpoint=endpoint)
+        assert value(after, "dakugumen_request_seconds_sum", endpoint=endpoint) > 0
+    assert delta("dakugumen_stage_seconds_count", stage="inference") >= 1
+    assert delta("dakugumen_batch_items_count", endpoint="predict_batch") == 2
+    assert delta("dakugumen_predictions_total", endpoint="predict_batch", decision="phishing") + \
+        delta("dakugumen_predictions_total", endpoint="predict_batch", decision="benign") == 10
+
+    # Cache hits and occupancy
+    assert delta("dakugumen_prediction_cache_total", result="hits") >= len(items)
+    assert types["dakugumen_prediction_cache_entries"] == "gauge"
+    assert value(after, "dakugumen_prediction_cache_entries", stat="size") >= len(items)
+
+    # Micro-batcher counters and gauges
+    assert value(after, "dakugumen_microbatch_total", result="items") == 3
+    assert value(after, "dakugumen_microbatch_total", result="batches") >= 1
+    assert types["dakugumen_microbatch_batch_size"] == "gauge"
+    assert value(after, "dakugumen_microbatch_batch_size", stat="largest_batch") >= 1
@@ -0,0 +1,78 @@
+import copy
+import threading
+
+import numpy as np
+import pytest
+
+from microbatch import MicroBatcher
+
+
+def _submit_concurrently(batcher, items):
+    results, errors = [None] * len(items), [None] * len(items)
+    start = threading.Barrier(len(items))
+
+    def call(i):
+        start.wait()
+        try:
+            results[i] = batcher.submit(items[i], timeout=5)
+        except Exception as e:
+            errors[i] = e
+    threads = [threading.Thread(target=call, args=(i,)) for i in range(len(items))]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    return results, errors
+
+
+def test_concurrent_calls_are_coalesced_in_order():
+    calls = []
+
+    def fn(items):
+        calls.append(list(items))
+        return [x * 10 for x in items]
+    batcher = MicroBatcher(fn, max_wait=0.2, max_items=8)
+    results, errors = _submit_concurrently(batcher, list(range(8)))
+    assert results == [x * 10 for x in range(8)] and errors == [None] * 8
+    assert sum(len(c) for c in calls) == 8
+    assert batcher.largest_batch > 1
+    assert batcher.stats()['items'] == 8
+
+
+def test_every_caller_gets_the_batch_exception():
+    def fn(items):
+        raise ValueError("boom")
+    batcher = MicroBatcher(fn, max_wait=0.05, max_items=4)
+    _, errors = _submit_concurrently(batcher, [1, 2, 3])
+    assert all(isinstance(e, ValueError) for e in errors)
+
+
+def test_wrong_result_count_is_an_error():
+    batcher = MicroBatcher(lambda items: [], max_wait=0.0)
+    with pytest.raises(RuntimeError):
+        batcher.submit("x", timeout=5)
+
+
+def test_rows_are_scored_with_their_own_bundle(app_module):
+    live = app_module.models
+    other = copy.copy(live)
+    other.effective_autoencoder_threshold = live.threshold * 3
+    other.loaded_at = live.loaded_at + "-other"  # its own prediction cache version
+    urls = ["https://example.com/a", "http://192.168.0.1/login.php?verify=1", "https://bit.ly/x"]
+    items = [(live, urls[0]), (other, urls[1]), (live, urls[2]), (other, urls[0])]
+
+    rows = app_module._score_content_rows(items)
+    for (bundle, url), (err, csc) in zip(items, rows):
+        ref_err, ref_csc = app_module.score_content([url], bundle=bundle, use_cache=False)
+        assert err == pytest.approx(float(ref_err[0]))
+        assert csc == pytest.approx(float(ref_csc[0]))
+    assert rows[0][1] != pytest.approx(rows[3][1])  # same URL, different thresholds
+
+
+def test_predict_through_the_microbatcher(app_module, client, monkeypatch):
+    monkeypatch.setattr(app_module, "predict_batcher", MicroBatcher(app_module._score_content_rows, max_wait=0.001))
+    body = client.post("/predict", json={"url": "https://example.com/login", "post_id": "p1"}).get_json()
+    _, ref = app_module.score_content(["https://example.com/login"], bundle=app_module.models, use_cache=False)
+    assert body["ae_threshold_used"] == app_module.models.threshold
+    assert body["content_score"] == pytest.approx(float(ref[0]))
+    assert np.isfinite(body["final_score"])
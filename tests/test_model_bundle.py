@@ -0,0 +1,87 @@
+import json
+import os
+import shutil
+
+import numpy as np
+import pytest
+
+import model_bundle
+from conftest import ROOT
+
+
+@pytest.fixture(scope="module")
+def bundles(tmp_path_factory):
+    base = tmp_path_factory.mktemp("bundles")
+    out = {}
+    for precision in ("float32", "float16"):
+        out[precision] = str(base / precision)
+        model_bundle.build(out[precision], version="test", precision=precision, source_dir=ROOT)
+    return out
+
+
+def test_build_verifies_and_hash_is_reproducible(bundles, tmp_path):
+    manifest = model_bundle.verify(bundles["float32"])
+    again = model_bundle.build(str(tmp_path / "again"), version="other", precision="float32", source_dir=ROOT)
+    assert again["content_hash"] == manifest["content_hash"]
+    assert model_bundle.read_manifest(bundles["float16"])["content_hash"] != manifest["content_hash"]
+
+
+def test_verify_rejects_tampered_files(bundles, tmp_path):
+    bad = str(tmp_path / "bad")
+    shutil.copytree(bundles["float32"], bad)
+    arr = np.load(os.path.join(bad, "ae_bias_0.npy"))
+    arr[0] += 1.0
+    np.save(os.path.join(bad, "ae_bias_0.npy"), arr, allow_pickle=False)
+    with pytest.raises(model_bundle.BundleError):
+        model_bundle.verify(bad)
+    with pytest.raises(model_bundle.BundleError):
+        model_bundle.load(bad)
+    model_bundle.load(bad, check_hashes=False)  # explicitly unchecked loads still open
+
+    shutil.copytree(bundles["float32"], str(tmp_path / "edited"))
+    path = os.path.join(str(tmp_path / "edited"), model_bundle.MANIFEST)
+    with open(path) as f:
+        manifest = json.load(f)
+    manifest["model"]["autoencoder_threshold"] *= 2
+    with open(path, "w") as f:
+        json.dump(manifest, f)
+    with pytest.raises(model_bundle.BundleError):
+        model_bundle.verify(str(tmp_path / "edited"))
+
+
+def test_loaded_bundle_matches_loose_artifacts(bundles, app_module):
+    packaged = model_bundle.load(bundles["float32"])
+    urls = ["https://example.com/", "http://192.168.0.1/login.php?verify=1", "https://bit.ly/x"]
+    feats = app_module.extract_feature_matrix(urls)
+    reference = app_module.models
+    np.testing.assert_allclose(packaged.scaler.transform(feats), reference.scaler.transform(feats), rtol=1e-6, atol=1e-6)
+    assert packaged.autoencoder_threshold == reference.autoencoder_threshold
+
+
+def test_ae_backend_must_agree_with_bundle_precision(bundles, app_module, monkeypatch):
+    monkeypatch.setattr(app_module, "MODEL_BUNDLE_DIR", bundles["float32"])
+    monkeypatch.setattr(app_module, "ae_backend", "numpy-float16")
+    monkeypatch.setenv("AE_BACKEND", "numpy-float16")
+    with pytest.raises(RuntimeError, match="float16"):
+        app_module._load_bundle()
+
+    monkeypatch.setattr(app_module, "MODEL_BUNDLE_DIR", bundles["float16"])
+    bundle = app_module._load_bundle()
+    assert bundle.bundle_info["precision"] == "float16"
+    assert getattr(bundle.autoencoder_model, "precision", None) == "float16"
+
+    monkeypatch.delenv("AE_BACKEND")  # unset: the bundle decides
+    monkeypatch.setattr(app_module, "ae_backend", "keras")
+    assert app_module._load_bundle().bundle_info["precision"] == "float16"
+
+
+def test_explicit_keras_backend_wins_over_the_bundle(bundles, app_module, monkeypatch, capsys):
+    from ae_backends import NumpyAutoencoder
+    requested = []
+    monkeypatch.setattr(app_module, "load_autoencoder", lambda backend, **kw: requested.append(backend) or NumpyAutoencoder.load())
+    monkeypatch.setattr(app_module, "MODEL_BUNDLE_DIR", bundles["float32"])
+    monkeypatch.setattr(app_module, "ae_backend", "keras")
+    monkeypatch.setenv("AE_BACKEND", "keras")
+    bundle = app_module._load_bundle()
+    assert requested == ["keras"] and bundle.bundle_info is None
+    assert "AE_BACKEND=keras is set" in capsys.readouterr().out
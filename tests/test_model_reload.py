@@ -0,0 +1,88 @@
+import os
+import threading
+import time
+
+import pytest
+
+
+@pytest.fixture
+def live_bundle(app_module):
+    # Whatever a test installs, the session's bundle is live again afterwards
+    bundle = app_module.models
+    yield bundle
+    app_module._install(bundle)
+
+
+def _variant(app_module, bundle, tag, threshold_scale=2.0):
+    """A distinguishable copy of bundle sharing its (already warm) artifacts."""
+    return app_module.ModelBundle(
+        bundle.autoencoder_model, bundle.scaler, bundle.autoencoder_threshold,
+        bundle.threshold * threshold_scale, bundle.gnn_index, bundle.inference_plan,
+        f"{bundle.loaded_at}-{tag}", bundle_info=bundle.bundle_info)
+
+
+ITEMS = [{"url": "https://bit.ly/fake-login-scam", "post_id": "reload-1"},
+         {"url": "https://www.abs-cbn.com/news", "post_id": "reload-2"}]
+
+
+@pytest.mark.parametrize("stage", ["_load_bundle", "_warm_up"])
+def test_old_bundle_keeps_serving_when_reload_fails(app_module, client, live_bundle, monkeypatch, stage):
+    def broken(*args, **kwargs):
+        raise RuntimeError(f"{stage} exploded")
+    monkeypatch.setattr(app_module, stage, broken)
+    monkeypatch.setattr(app_module, "MODEL_LOAD_ERROR", None)
+    monkeypatch.setattr(app_module, "ADMIN_TOKEN", None)
+    before = client.post("/predict_batch", json={"items": ITEMS}).get_json()
+
+    r = client.post("/reload_models")
+    assert r.status_code == 500
+    assert f"{stage} exploded" in r.get_json()["message"]
+    assert app_module.models is live_bundle
+    assert app_module.MODEL_LOAD_ERROR == f"{stage} exploded"
+    assert client.post("/predict_batch", json={"items": ITEMS}).get_json() == before
+
+
+def test_generation_marker_is_picked_up_by_other_workers(app_module, client, live_bundle, monkeypatch):
+    fresh = _variant(app_module, live_bundle, "other-worker")
+    monkeypatch.setattr(app_module, "_load_bundle", lambda: fresh)
+    monkeypatch.setattr(app_module, "_generation_checked_at", float("-inf"))
+    # Another worker handled /reload_models and replaced the marker file
+    path = app_module.MODEL_GENERATION_FILE
+    with open(path + ".other", "w") as f:
+        f.write(fresh.loaded_at)
+    os.replace(path + ".other", path)
+
+    client.get("/ready")
+    deadline = time.time() + 10
+    while app_module.models is not fresh and time.time() < deadline:
+        time.sleep(0.01)
+    assert app_module.models is fresh
+    pred = client.post("/predict_batch", json={"items": ITEMS}).get_json()["predictions"]
+    assert all(p["ae_threshold_used"] == fresh.threshold for p in pred)
+
+
+def test_in_flight_requests_finish_on_their_starting_bundle(app_module, client, live_bundle, monkeypatch):
+    swapped = _variant(app_module, live_bundle, "mid-request", threshold_scale=0.5)
+    original = app_module.content_scores_for
+    entered, release = threading.Event(), threading.Event()
+
+    def slow_content_scores(*args, **kwargs):
+        entered.set()
+        assert release.wait(10)
+        return original(*args, **kwargs)
+    monkeypatch.setattr(app_module, "content_scores_for", slow_content_scores)
+
+    result = {}
+    worker = threading.Thread(target=lambda: result.update(
+        r=app_module.app.test_client().post("/predict_batch", json={"items": ITEMS})))
+    worker.start()
+    assert entered.wait(10)
+    app_module._install(swapped)  # a reload lands while the request is half way through
+    release.set()
+    worker.join(10)
+
+    pred = result["r"].get_json()["predictions"]
+    assert all(p["ae_threshold_used"] == live_bundle.threshold for p in pred)
+    monkeypatch.setattr(app_module, "content_scores_for", original)
+    pred = client.post("/predict_batch", json={"items": ITEMS}).get_json()["predictions"]
+    assert all(p["ae_threshold_used"] == swapped.threshold for p in pred)
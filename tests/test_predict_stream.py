@@ -0,0 +1,50 @@
+import json
+
+import pytest
+
+
+def _stream(client, lines, chunk_size=None):
+    url = "/predict_stream" + (f"?chunk_size={chunk_size}" if chunk_size is not None else "")
+    r = client.post(url, data="".join(line + "\n" for line in lines), content_type="application/x-ndjson")
+    assert r.status_code == 200, r.get_data(as_text=True)
+    return [json.loads(line) for line in r.get_data(as_text=True).splitlines()]
+
+
+def _same_prediction(got, expected):
+    assert set(got) == set(expected) | {"line"}
+    for key, value in expected.items():
+        if isinstance(value, float):
+            assert got[key] == pytest.approx(value, rel=1e-6), key
+        else:
+            assert got[key] == value, key
+
+
+def test_stream_matches_predict_batch(client):
+    from benchmark import synthetic_urls
+    items = [{"url": u, "post_id": f"stream-{i % 4}"} for i, u in enumerate(synthetic_urls(23, seed=4))]
+    expected = client.post("/predict_batch", json={"items": items}).get_json()["predictions"]
+    got = _stream(client, [json.dumps(it) for it in items], chunk_size=5)
+    assert [r["line"] for r in got] == list(range(1, len(items) + 1))
+    for g, e in zip(got, expected):
+        _same_prediction(g, e)
+
+
+def test_malformed_lines_get_per_line_errors_without_aborting(client):
+    good = {"url": "https://stream-ok.example/a", "post_id": "s1"}
+    lines = [json.dumps(good), "not json", "[1, 2]", json.dumps({"url": 123}), json.dumps({"post_id": "x"}),
+             "", json.dumps({"url": "https://stream-ok.example/b"})]
+    got = _stream(client, lines, chunk_size=2)
+    assert [r["line"] for r in got] == [1, 2, 3, 4, 5, 7]
+    assert [("error" in r) for r in got] == [False, True, True, True, True, False]
+    assert got[1]["error"].startswith("Invalid JSON")
+    assert got[3]["error"] == '"url" must be a string'
+    assert got[5]["url"] == "https://stream-ok.example/b" and got[5]["post_id"] is None
+    expected = client.post("/predict_batch", json={"items": [good]}).get_json()["predictions"][0]
+    _same_prediction(got[0], expected)
+
+
+@pytest.mark.parametrize("chunk_size", ["abc", "1.5", ""])
+def test_bad_chunk_size_is_400(client, chunk_size):
+    r = client.post(f"/predict_stream?chunk_size={chunk_size}", data='{"url": "https://a.example/"}\n')
+    assert r.status_code == 400
+    assert "chunk_size" in r.get_json()["error"]
@@ -0,0 +1,56 @@
+from prediction_cache import PredictionCache
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def _cache(**kw):
+    clock = FakeClock()
+    cache = PredictionCache(clock=clock, **kw)
+    cache.get("warm", "v1")  # adopt version v1
+    return cache, clock
+
+
+def test_entries_expire_after_ttl():
+    cache, clock = _cache(maxsize=10, ttl=5.0)
+    cache.put("a", (0.1, 1.0), "v1")
+    clock.now = 4.9
+    assert cache.get("a", "v1") == (0.1, 1.0)
+    clock.now = 5.0
+    assert cache.get("a", "v1") is None
+    assert cache.stats()["expirations"] == 1
+
+
+def test_least_recently_used_is_evicted():
+    cache, _ = _cache(maxsize=2, ttl=60.0)
+    cache.put("a", 1, "v1")
+    cache.put("b", 2, "v1")
+    assert cache.get("a", "v1") == 1  # a is now more recent than b
+    cache.put("c", 3, "v1")
+    assert cache.get("b", "v1") is None
+    assert cache.get("a", "v1") == 1 and cache.get("c", "v1") == 3
+    assert cache.stats()["evictions"] == 1
+
+
+def test_new_model_version_invalidates_and_stale_puts_are_dropped():
+    cache, _ = _cache(maxsize=10, ttl=60.0)
+    cache.put("a", 1, "v1")
+    assert cache.get("a", "v2") is None
+    assert cache.stats()["invalidations"] == 1
+    cache.put("b", 2, "v1")  # computed by the replaced models
+    assert cache.get("b", "v2") is None
+    cache.put("b", 3, "v2")
+    assert cache.get("b", "v2") == 3
+
+
+def test_disabled_cache_stores_nothing():
+    for kw in ({"maxsize": 0, "ttl": 60.0}, {"maxsize": 10, "ttl": 0}):
+        cache, _ = _cache(**kw)
+        cache.put("a", 1, "v1")
+        assert cache.get("a", "v1") is None
+        assert not cache.stats()["enabled"]
@@ -0,0 +1,74 @@
+import numpy as np
+import pytest
+
+from ae_backends import NumpyAutoencoder, QuantizedAutoencoder, dequantize_kernel, quantize_kernel
+from quantize_autoencoder import gate, passes
+
+GATE = dict(min_agreement=0.999, max_rel_error=0.05, max_accuracy_drop=0.001)
+
+
+@pytest.fixture(scope="module")
+def corpus(app_module):
+    from benchmark import synthetic_urls
+    urls = synthetic_urls(3000, seed=3)
+    scaled = app_module.models.scaler.transform(app_module.extract_feature_matrix(urls)).astype(np.float32)
+    return scaled, app_module.models.threshold
+
+
+@pytest.fixture(scope="module")
+def reference():
+    return NumpyAutoencoder.load()
+
+
+def test_float16_passes_the_gate(reference, corpus):
+    scaled, threshold = corpus
+    candidate = QuantizedAutoencoder.from_float(reference, "float16")
+    report = gate(reference, candidate, scaled, threshold, 0.5)
+    assert passes(report, **GATE) == []
+    assert report["rows"] == len(scaled)
+
+
+def test_int8_report_is_consistent(reference, corpus):
+    # int8 isn't guaranteed to pass on every corpus (that's what the gate is for)
+    scaled, threshold = corpus
+    report = gate(reference, QuantizedAutoencoder.from_float(reference, "int8"), scaled, threshold, 0.5)
+    assert report["decision_flips"] == round((1 - report["decision_agreement"]) * report["rows"])
+    assert 0 <= report["p50_rel_error_diff"] <= report["p99_rel_error_diff"]
+
+
+def test_gate_rejects_a_drifted_model(reference, corpus):
+    scaled, threshold = corpus
+    drifted = NumpyAutoencoder([(k * 0.5, b, a) for k, b, a in reference.layers])
+    labels = [True] * len(scaled)
+    report = gate(reference, drifted, scaled, threshold, 0.5, labels)
+    failures = passes(report, **GATE)
+    assert any("relative error" in f for f in failures)
+    assert report["labeled_rows"] == len(scaled)
+
+
+def test_saved_artifact_round_trips(reference, corpus, tmp_path):
+    scaled, _ = corpus
+    candidate = QuantizedAutoencoder.from_float(reference, "float16")
+    path = str(tmp_path / "ae_float16.npz")
+    candidate.save(path)
+    loaded = QuantizedAutoencoder.load(path)
+    assert loaded.precision == "float16"
+    np.testing.assert_array_equal(loaded.predict(scaled[:256], verbose=0), candidate.predict(scaled[:256], verbose=0))
+
+
+def test_only_the_artifact_shrinks(reference):
+    float32_bytes = sum(k.nbytes + b.nbytes for k, b, _ in reference.layers)
+    for precision, max_ratio in (("float16", 0.55), ("int8", 0.3)):
+        candidate = QuantizedAutoencoder.from_float(reference, precision)
+        assert candidate.stored_bytes() <= max_ratio * float32_bytes
+        # Serving runs on the expanded float32 kernels, as documented
+        assert all(k.dtype == np.float32 for k, _, _ in candidate.layers)
+
+
+def test_int8_kernel_error_is_within_half_a_step():
+    kernel = np.random.default_rng(0).normal(size=(64, 32)).astype(np.float32)
+    qk = quantize_kernel(kernel, "int8")
+    err = np.abs(dequantize_kernel(qk["q"], qk["scale"]) - kernel)
+    assert np.all(err <= qk["scale"] / 2 + 1e-6)
+    with pytest.raises(ValueError):
+        quantize_kernel(kernel, "int4")
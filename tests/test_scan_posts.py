@@ -0,0 +1,32 @@
+X = "https://a-scan.example/x"
+
+
+def test_links_are_scored_once_across_posts_by_normalized_url(app_module, client, monkeypatch):
+    seen = []
+    original = app_module.content_scores_for
+
+    def recording(urls, **kwargs):
+        seen.append(list(urls))
+        return original(urls, **kwargs)
+    monkeypatch.setattr(app_module, "content_scores_for", recording)
+
+    posts = [
+        {"post_id": "a", "links": [X, "https://b-scan.example/y"]},
+        {"post_id": "b", "links": [X + "?fbclid=IwAR1", "https://c-scan.example/z?utm_source=fb&id=2"]},
+        {"post_id": "c", "links": [X, X + "?utm_medium=social"]},
+    ]
+    body = client.post("/scan_posts", json={"posts": posts}).get_json()
+    assert seen == [[X, "https://b-scan.example/y", "https://c-scan.example/z?id=2"]]
+    assert body["unique_urls"] == 3
+    assert [r["links_scored"] for r in body["results"]] == [2, 2, 1]
+
+
+def test_flagged_links_are_reported_once_in_normalized_form(client, monkeypatch):
+    monkeypatch.setenv("FINAL_SCORE_CUTOFF", "-1")  # flag every link
+    posts = [{"post_id": "p", "links": [X, X + "?fbclid=1", X + "?utm_source=a&fbclid=2"]},
+             {"post_id": "q", "links": [X + "?fbclid=3"]}]
+    body = client.post("/scan_posts", json={"posts": posts}).get_json()
+    assert body["unique_urls"] == 1
+    assert [r["flagged_links"] for r in body["results"]] == [[X], [X]]
+    single = client.post("/predict_batch", json={"items": [{"url": X, "post_id": "p"}]}).get_json()["predictions"][0]
+    assert body["results"][0]["final_score"] == single["final_score"]
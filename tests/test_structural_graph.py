@@ -0,0 +1,129 @@
+import json
+import os
+
+import numpy as np
+
+from structural_graph import StructuralGraph, domain_node, post_node, user_node
+
+KNOWN = {"k1": 0.9, "k2": 0.8, "k3": 0.1}
+
+
+def _lookup(post_ids):
+    return np.array([KNOWN.get(p, np.nan) for p in post_ids], dtype=np.float64)
+
+
+def _random_edges(n, seed=0):
+    rng = np.random.default_rng(seed)
+    posts = [f"p{i}" for i in range(40)] + list(KNOWN)
+    return [(post_node(posts[rng.integers(len(posts))]), domain_node(f"d{rng.integers(15)}.com")) for _ in range(n)]
+
+
+def test_incremental_matches_rebuild_and_compaction():
+    edges = _random_edges(3000)
+    inc = StructuralGraph(prob_lookup=_lookup, compact_ratio=0.01)
+    for start in range(0, len(edges), 97):
+        inc.add_edges(edges[start:start + 97])
+    bulk = StructuralGraph(prob_lookup=None)
+    bulk.add_edges(edges)
+    bulk.set_prob_lookup(_lookup)
+    ids = [f"p{i}" for i in range(40)] + ["unseen"]
+    np.testing.assert_allclose(inc.score(ids), bulk.score(ids), equal_nan=True)
+    for node in ("domain:d3.com", "post:p7"):
+        i = inc._ids[node]
+        expected = sorted({inc._ids[b] for a, b in edges if a == node} | {inc._ids[a] for a, b in edges if b == node})
+        assert sorted(inc._neighbors(i).tolist()) == expected
+
+
+def test_scoring_is_read_only_and_uses_linked_domains():
+    g = StructuralGraph(prob_lookup=_lookup)
+    g.add_post("k1", ["bad.com"])
+    g.add_post("k2", ["bad.com"])
+    before = g.stats()
+    first = g.score(["new"], hosts=[{"bad.com", "unknown.com"}])
+    assert first[0] > 0.5
+    assert np.isnan(g.score(["new"])[0])
+    assert g.stats() == before
+    np.testing.assert_array_equal(g.score(["new"], hosts=[{"bad.com"}]), first)
+
+
+def test_edge_and_node_caps():
+    g = StructuralGraph(max_nodes=10, max_edges=4)
+    g.add_edges([(user_node("u"), domain_node(f"d{i}.com")) for i in range(8)])
+    stats = g.stats()
+    assert stats["edges"] == 4 and stats["dropped_edges"] == 4
+    assert stats["nodes"] <= 10
+
+
+def test_load_edges_jsonl(tmp_path):
+    path = tmp_path / "edges.jsonl"
+    path.write_text("\n".join(json.dumps({"src": "post:k1", "dst": "domain:x.com", "edgeType": "contains"}) for _ in range(3)) + "\n")
+    g = StructuralGraph(prob_lookup=_lookup)
+    assert g.load_edges_jsonl(str(path)) == 1
+    assert g.score(["p"], hosts=[{"x.com"}])[0] > 0.5
+
+
+def test_scoring_requests_do_not_change_the_app_graph(app_module, client):
+    graph = app_module.structural_graph
+    before = graph.stats()
+    items = [{"url": f"https://site{i}.com/a", "post_id": f"fresh-{i}"} for i in range(5)]
+    first = client.post("/predict_batch", json={"items": items}).get_json()
+    client.post("/scan_posts", json={"posts": [{"post_id": "fresh-x", "links": ["https://site1.com/"]}]})
+    assert graph.stats() == before
+    assert client.post("/predict_batch", json={"items": items}).get_json() == first
+
+
+def test_workers_share_the_edge_log(tmp_path):
+    path = str(tmp_path / "edges.jsonl")
+    a, b = StructuralGraph(prob_lookup=_lookup), StructuralGraph(prob_lookup=_lookup)
+    assert a.follow(path) == 0 and b.follow(path) == 0
+    assert a.append([(post_node("k1"), domain_node("bad.com"), "contains")]) == 1
+    assert np.isnan(b.score(["new"], hosts=[{"bad.com"}])[0])
+    assert b.refresh() == 1
+    assert b.score(["new"], hosts=[{"bad.com"}])[0] > 0.5
+    # A torn last line waits for the rest of it; malformed lines are skipped
+    with open(path, "a") as f:
+        f.write("not json\n" + json.dumps({"src": "post:k3", "dst": "domain:ok.com"})[:10])
+    assert b.refresh() == 0
+    with open(path, "a") as f:
+        f.write(json.dumps({"src": "post:k3", "dst": "domain:ok.com"})[10:] + "\n")
+    assert b.refresh() == 1
+    # A replaced log is reloaded from scratch
+    with open(path + ".new", "w") as f:
+        f.write(json.dumps({"src": "post:k2", "dst": "domain:other.com"}) + "\n")
+    os.replace(path + ".new", path)
+    b.refresh()
+    assert b.stats()["edges"] == 1
+    assert np.isnan(b.score(["new"], hosts=[{"bad.com"}])[0])
+
+
+def test_graph_endpoints_need_admin_token_and_typed_bodies(app_module, client, monkeypatch):
+    body = {"postId": "graph-endpoint-post", "domains": ["graph-endpoint.com"], "userId": "u1"}
+    monkeypatch.setattr(app_module, "ADMIN_TOKEN", None)
+    assert client.post("/graph_ingest", json=body).status_code == 403
+    assert client.post("/graph_click", json={"domain": "a.com", "userId": "u1"}).status_code == 403
+
+    monkeypatch.setattr(app_module, "ADMIN_TOKEN", "s3cret")
+    assert client.post("/graph_ingest", json=body, headers={"Authorization": "Bearer nope"}).status_code == 401
+    auth = {"Authorization": "Bearer s3cret"}
+    for bad in ({"domains": "abc"}, {"domains": ["a.com", 3]}, {"links": {"u": 1}}, {"userId": ["u"]}, {"postId": ["p"]}):
+        assert client.post("/graph_ingest", json=dict(body, **bad), headers=auth).status_code == 400, bad
+    for bad in ({"domain": ["a.com"], "userId": "u1"}, {"domain": "a.com", "userId": {"id": 1}}):
+        assert client.post("/graph_click", json=bad, headers=auth).status_code == 400, bad
+
+    r = client.post("/graph_ingest", json=body, headers=auth)
+    assert r.status_code == 200 and r.get_json()["edges_added"] == 2
+    assert client.post("/graph_click", json={"domain": "graph-endpoint.com", "userId": "u1"}, headers=auth).get_json()["edges_added"] == 1
+    # The edges went to the shared log, so a fresh process following it sees them too
+    other = StructuralGraph()
+    assert other.follow(app_module.structural_graph.path) >= 3
+    assert other._ids.get(post_node("graph-endpoint-post")) is not None
+
+
+def test_unhashable_post_ids_are_scored_not_500(client):
+    items = [{"url": "https://a.com/x", "post_id": ["p", 1]}, {"url": "https://b.com/y", "post_id": {"id": 2}},
+             {"url": "https://c.com/z", "post_id": ["p", 1]}, {"url": "https://d.com/w", "post_id": "['p', 1]"}]
+    r = client.post("/predict_batch", json={"items": items})
+    assert r.status_code == 200, r.get_data(as_text=True)
+    preds = r.get_json()["predictions"]
+    assert [p["post_id"] for p in preds] == [it["post_id"] for it in items]
+    assert client.post("/predict", json={"url": "https://a.com/x", "post_id": {"id": 2}}).status_code == 200